@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""端到端压测：在本地启动应用和模拟的上游接口，按给定并发压测各接口
+
+每个数据规模依次：
+1. 用 catalog_generator.py 生成合成餐厅数据（列式文件，写在临时目录，不改动 data/ 下的文件）；
+2. 启动模拟上游进程：豆包 /chat/completions 和 ipapi.co /{ip}/json/，延迟和错误率可配置；
+3. 启动 uvicorn 应用进程，指向模拟上游和合成数据；
+4. 依次压测 /api/recommend、/api/chat、/api/restaurants，记录延迟分位数、RPS、错误数和应用进程的RSS。
+
+结果以JSON输出（--output 写入文件），可用 --baseline 与之前的结果对比。请求参数由 --seed 决定，
+同一提交、同一参数的多次运行发送相同的请求序列。
+
+用法：
+    python benchmarks/http_load.py --rows 1000,100000 --concurrency 16 --requests 500
+    python benchmarks/http_load.py --rows 1000000 --endpoints recommend,restaurants --output after.json --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from catalog_generator import generate_catalog  # noqa: E402
+
+ENDPOINTS = ("recommend", "chat", "restaurants")
+
+# 合成数据和模拟定位使用的城市中心
+CITY = {"city": "上海", "region": "上海", "country_name": "中国", "latitude": 31.23, "longitude": 121.47}
+
+CHAT_TEMPLATES = [
+    "想吃{cuisine}", "人均{price}左右的{cuisine}有推荐吗", "有没有好吃的烧烤", "来点清淡的",
+    "想吃辣的，{price}块以内", "配送快一点的{cuisine}", "推荐一家评分高的店", "今天想吃面",
+]
+
+
+# ---------------------------------------------------------------- 模拟上游
+
+def create_fake_upstream(latency: float, jitter: float, error_rate: float, geo_latency: float, geo_error_rate: float, seed: int):
+    """模拟的豆包和ipapi.co接口（同一个应用，不同路径）"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    rng = random.Random(seed)
+    name_pattern = re.compile(r"^\d+\|([^|\n]+)\|", re.M)
+
+    def reply_for(messages: List[Dict]) -> str:
+        prompt = messages[-1].get("content", "") if messages else ""
+        ids = re.findall(r"\[id=([^\]]+)\]", prompt)
+        if ids:
+            return json.dumps({i: "口味地道，性价比高，配送及时" for i in ids}, ensure_ascii=False)
+        names = name_pattern.findall(messages[0].get("content", "")) if messages else []
+        if names:
+            return f"明白啦！根据您的需求，推荐您试试{names[0]}，口味地道，评分也很高，配送很快。"
+        return "口味地道，性价比高，配送及时，值得一试"
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(latency + rng.random() * jitter)
+        if rng.random() < error_rate:
+            return JSONResponse({"error": {"message": "模拟的上游错误"}}, status_code=500)
+        content = reply_for(payload.get("messages") or [])
+        prompt_tokens = sum(len(m.get("content", "")) for m in payload.get("messages") or [])
+        if not payload.get("stream"):
+            return {
+                "choices": [{"message": {"content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content)},
+            }
+
+        async def events():
+            for i in range(0, len(content), 8):
+                yield "data: " + json.dumps({"choices": [{"delta": {"content": content[i:i + 8]}}]}, ensure_ascii=False) + "\n\n"
+            yield "data: " + json.dumps({"choices": [], "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content)}}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/{ip}/json/")
+    async def locate(ip: str):
+        await asyncio.sleep(geo_latency)
+        if rng.random() < geo_error_rate:
+            return {"error": True, "reason": "RateLimited"}
+        # 同一个IP总是定位到同一个点
+        offset = (zlib.crc32(ip.encode()) % 1000) / 10000
+        return dict(CITY, latitude=CITY["latitude"] + offset, longitude=CITY["longitude"] - offset)
+
+    return app
+
+
+def serve_upstream(args):
+    import uvicorn
+
+    app = create_fake_upstream(args.latency, args.jitter, args.error_rate, args.geo_latency, args.geo_error_rate, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# ---------------------------------------------------------------- 进程管理
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"进程已退出（返回码 {process.returncode}）: {url}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise TimeoutError(f"等待启动超时: {url}")
+
+
+def memory_mb(pid: int) -> Dict[str, Optional[float]]:
+    """进程当前和峰值常驻内存（MB，读取 /proc，非Linux返回None）"""
+    values = {"rss_mb": None, "rss_peak_mb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    values["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    values["rss_peak_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return values
+
+
+def stop(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ---------------------------------------------------------------- 请求生成
+
+class RequestFactory:
+    """按种子生成可复现的请求序列"""
+
+    def __init__(self, seed: int, rows: int, cuisines: List[str], distinct_ips: int, page_size: int):
+        self.rng = random.Random(seed)
+        self.rows = rows
+        self.cuisines = cuisines
+        self.page_size = page_size
+        # 公网IP池（决定定位缓存的命中率）
+        self.ips = [f"{self.rng.randint(11, 99)}.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+                    for _ in range(max(1, distinct_ips))]
+
+    def headers(self) -> Dict[str, str]:
+        return {"X-Forwarded-For": self.rng.choice(self.ips)}
+
+    def make(self, endpoint: str) -> Dict:
+        rng = self.rng
+        if endpoint == "recommend":
+            body = {"limit": 20, "max_price": rng.choice([None, 40, 60, 100])}
+            if rng.random() < 0.7:
+                body["cuisine"] = rng.choice(self.cuisines)
+            if rng.random() < 0.3:
+                body["keyword"] = rng.choice(["辣", "面", "烤 肉", "鸡|鱼"])
+            if rng.random() < 0.3:
+                body["sort"] = "score"
+            return {"method": "POST", "url": "/api/recommend", "json": body, "headers": self.headers()}
+        if endpoint == "chat":
+            message = rng.choice(CHAT_TEMPLATES).format(cuisine=rng.choice(self.cuisines), price=rng.choice([30, 50, 80]))
+            history = []
+            for i in range(rng.choice([0, 0, 2, 4, 8])):
+                history.append({"role": "user" if i % 2 == 0 else "assistant", "content": rng.choice(CHAT_TEMPLATES).format(cuisine="川菜", price=50)})
+            return {"method": "POST", "url": "/api/chat", "json": {"message": message, "conversation_history": history}, "headers": self.headers()}
+        if self.page_size <= 0:
+            return {"method": "GET", "url": "/api/restaurants"}
+        cursor = rng.randrange(0, max(1, self.rows - self.page_size))
+        return {"method": "GET", "url": f"/api/restaurants?limit={self.page_size}&cursor={cursor}"}
+
+
+# ---------------------------------------------------------------- 压测
+
+async def drive(base_url: str, requests: List[Dict], concurrency: int, timeout: float) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    position = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal position
+            while position < len(requests):
+                request = requests[position]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.request(**request)
+                    await response.aread()
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    values = np.array(latencies)
+    return {
+        "requests": len(requests),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "status": statuses,
+        "rps": round(len(requests) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(float(np.percentile(values, 50)), 2),
+            "p95": round(float(np.percentile(values, 95)), 2),
+            "p99": round(float(np.percentile(values, 99)), 2),
+            "mean": round(float(values.mean()), 2),
+            "max": round(float(values.max()), 2),
+        },
+    }
+
+
+def bench_rows(args, rows: int, workdir: str) -> Dict:
+    catalog_path = os.path.join(workdir, f"restaurants-{rows}.rcat")
+    started = time.perf_counter()
+    generate_catalog(catalog_path, rows, args.seed, coordinates=True, center=(CITY["latitude"], CITY["longitude"]))
+    generate_seconds = time.perf_counter() - started
+
+    upstream_port, app_port = free_port(), free_port()
+    upstream = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve-upstream", "--port", str(upstream_port),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+        "--geo-latency", str(args.geo_latency), "--geo-error-rate", str(args.geo_error_rate), "--seed", str(args.seed),
+    ])
+    env = dict(
+        os.environ,
+        DOUBAO_API_KEY="benchmark",
+        DOUBAO_API_URL=f"http://127.0.0.1:{upstream_port}",
+        IPAPI_URL=f"http://127.0.0.1:{upstream_port}",
+        GEOIP_MODE="online",
+        CATALOG_BINARY_PATH=catalog_path,
+        CATALOG_CHANGELOG_PATH=os.path.join(workdir, f"restaurants-{rows}.changes.jsonl"),
+        CATALOG_WATCH_INTERVAL="0",
+        LLM_CACHE_ENABLED="true" if args.llm_cache else "false",
+    )
+    app = None
+    try:
+        wait_ready(f"http://127.0.0.1:{upstream_port}/docs", upstream, 30)
+        started = time.perf_counter()
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+            stdout=None if args.verbose else subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{app_port}"
+        wait_ready(f"{base_url}/api/cuisines", app, args.startup_timeout)
+        result = {"rows": rows, "generate_seconds": round(generate_seconds, 2),
+                  "startup_seconds": round(time.perf_counter() - started, 2), **memory_mb(app.pid), "endpoints": {}}
+        cuisines = httpx.get(f"{base_url}/api/cuisines", timeout=30).json()["data"] or ["川菜"]
+
+        for endpoint in args.endpoints:
+            # 每个接口使用独立的随机序列，增减接口不影响其他接口的请求
+            factory = RequestFactory(args.seed + ENDPOINTS.index(endpoint), rows, cuisines, args.distinct_ips, args.page_size)
+            if args.warmup:
+                asyncio.run(drive(base_url, [factory.make(endpoint) for _ in range(args.warmup)], args.concurrency, args.timeout))
+            stats = asyncio.run(drive(base_url, [factory.make(endpoint) for _ in range(args.requests)], args.concurrency, args.timeout))
+            stats.update(memory_mb(app.pid))
+            result["endpoints"][endpoint] = stats
+            print(f"[{rows} 行] {endpoint}: {stats['rps']} req/s, p50 {stats['latency_ms']['p50']}ms, "
+                  f"p99 {stats['latency_ms']['p99']}ms, 错误 {stats['errors']}, RSS {stats['rss_mb']}MB", file=sys.stderr)
+        return result
+    finally:
+        if app is not None:
+            stop(app)
+        stop(upstream)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result: Dict, baseline: Dict) -> List[Dict]:
+    """与之前的结果逐项对比（相同数据规模和接口），返回变化百分比"""
+    previous = {(run["rows"], name): stats for run in baseline.get("runs", []) for name, stats in run["endpoints"].items()}
+    changes = []
+    for run in result["runs"]:
+        for name, stats in run["endpoints"].items():
+            old = previous.get((run["rows"], name))
+            if old is None:
+                continue
+            change = {"rows": run["rows"], "endpoint": name}
+            for key, new_value, old_value in [
+                ("rps", stats["rps"], old["rps"]),
+                ("p50", stats["latency_ms"]["p50"], old["latency_ms"]["p50"]),
+                ("p99", stats["latency_ms"]["p99"], old["latency_ms"]["p99"]),
+                ("rss_mb", stats.get("rss_mb"), old.get("rss_mb")),
+            ]:
+                if new_value is not None and old_value:
+                    change[f"{key}_change_pct"] = round((new_value - old_value) / old_value * 100, 1)
+            changes.append(change)
+    return changes
+
+
+def main(args):
+    unknown = [endpoint for endpoint in args.endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"不支持的接口: {', '.join(unknown)}（可选 {', '.join(ENDPOINTS)}）")
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "upstream": {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+                         "geo_latency": args.geo_latency, "geo_error_rate": args.geo_error_rate},
+            "llm_cache": args.llm_cache,
+            "distinct_ips": args.distinct_ips,
+        },
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="ai-food-bench-") as workdir:
+        for rows in args.rows:
+            result["runs"].append(bench_rows(args, rows, workdir))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            result["comparison"] = compare(result, json.load(f))
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(float(part)) for part in value.split(",") if part.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=_int_list, default=[1000], help="合成数据的餐厅数，逗号分隔可测多个规模（如 1000,100000,1e6）")
+    parser.add_argument("--endpoints", type=lambda value: [part.strip() for part in value.split(",") if part.strip()], default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=300, help="每个接口的请求数")
+    parser.add_argument("--warmup", type=int, default=20, help="每个接口正式计时前的预热请求数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求的超时时间（秒）")
+    parser.add_argument("--page-size", type=int, default=50, help="/api/restaurants 每页条数，0 表示请求全部餐厅")
+    parser.add_argument("--distinct-ips", type=int, default=1000, help="客户端IP池大小（影响定位缓存命中率）")
+    parser.add_argument("--latency", type=float, default=0.3, help="模拟豆包接口的基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="模拟豆包接口延迟的随机抖动上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟豆包接口返回500的比例")
+    parser.add_argument("--geo-latency", type=float, default=0.05, help="模拟ipapi.co的延迟（秒）")
+    parser.add_argument("--geo-error-rate", type=float, default=0.0, help="模拟ipapi.co返回错误的比例")
+    parser.add_argument("--llm-cache", action="store_true", help="启用大模型回复缓存（默认关闭，每次都调用模拟接口）")
+    parser.add_argument("--startup-timeout", type=float, default=600.0, help="等待应用启动（加载和索引数据）的超时时间（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="把JSON结果写入文件")
+    parser.add_argument("--baseline", help="之前的JSON结果，输出中附带对比")
+    parser.add_argument("--verbose", action="store_true", help="显示应用进程的输出")
+    parser.add_argument("--serve-upstream", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve_upstream:
+        serve_upstream(args)
+    else:
+        main(args)
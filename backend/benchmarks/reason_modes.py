@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""对比推荐理由的两种生成模式（fanout 逐店并发 vs batch 单次批量）的延迟和token用量
+
+默认使用本地模拟的豆包接口（延迟 = 基础延迟 + 输出token数 × 每token耗时，
+token数按字符数估算）；设置 DOUBAO_API_KEY 并加 --live 参数时调用真实接口。
+
+用法：
+    python benchmarks/reason_modes.py --runs 20 --restaurants 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client  # noqa: E402
+from doubao_api import DoubaoAPI  # noqa: E402
+from recommendation import RecommendationEngine  # noqa: E402
+
+
+def fake_doubao_transport(base_latency: float, per_token_latency: float) -> httpx.MockTransport:
+    """模拟豆包 chat/completions：批量提示词返回按id的JSON，否则返回单条理由"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        prompt = payload["messages"][-1]["content"]
+        ids = re.findall(r"\[id=([^\]]+)\]", prompt)
+        if ids:
+            content = json.dumps({i: "口味地道，性价比高，配送及时，值得一试" for i in ids}, ensure_ascii=False)
+        else:
+            content = "口味地道，性价比高，配送及时，值得一试"
+        await asyncio.sleep(base_latency + len(content) * per_token_latency)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content)},
+        })
+    return httpx.MockTransport(handler)
+
+
+async def bench_mode(engine: RecommendationEngine, mode: str, restaurants, runs: int) -> dict:
+    engine.reason_mode = mode
+    engine.doubao_api = DoubaoAPI()
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await engine.generate_recommendations(restaurants)
+        latencies.append((time.perf_counter() - started) * 1000)
+    usage = engine.doubao_api.usage
+    return {
+        "mode": mode,
+        "runs": runs,
+        "restaurants": len(restaurants),
+        "latency_ms_p50": round(statistics.median(latencies), 2),
+        "latency_ms_mean": round(statistics.fmean(latencies), 2),
+        "latency_ms_max": round(max(latencies), 2),
+        "upstream_calls_per_request": usage["calls"] / runs,
+        "prompt_tokens_per_request": usage["prompt_tokens"] / runs,
+        "completion_tokens_per_request": usage["completion_tokens"] / runs,
+    }
+
+
+async def main(args):
+    if not args.live:
+        os.environ.setdefault("DOUBAO_API_KEY", "benchmark")
+        http_client.init_http_client(fake_doubao_transport(args.base_latency, args.per_token_latency))
+    else:
+        http_client.init_http_client()
+
+    engine = RecommendationEngine()
+    restaurants = engine.filter_restaurants()[:args.restaurants]
+    try:
+        for mode in ("fanout", "batch"):
+            print(json.dumps(await bench_mode(engine, mode, restaurants, args.runs), ensure_ascii=False))
+    finally:
+        await http_client.close_http_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--restaurants", type=int, default=5)
+    parser.add_argument("--base-latency", type=float, default=0.3, help="模拟接口的基础延迟（秒）")
+    parser.add_argument("--per-token-latency", type=float, default=0.01, help="模拟接口每个输出token的耗时（秒）")
+    parser.add_argument("--live", action="store_true", help="调用真实的豆包接口")
+    asyncio.run(main(parser.parse_args()))
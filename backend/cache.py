@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+
+class TTLCache:
+    """进程内LRU缓存，带过期时间（秒）和容量上限"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[object, tuple]" = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """基于本地SQLite文件的共享缓存（同一台机器上的多个worker共用）
+
+    sqlite3是阻塞调用（多个worker写入冲突时最多等待 timeout 秒），全部放到专用的单线程中执行，不阻塞事件循环；
+    写入时定期删除过期记录，并把记录数限制在 max_rows 以内（先删最早过期的）。
+    """
+
+    def __init__(self, path: str, max_rows: int = 100000, cleanup_interval: float = 300):
+        self.path = path
+        self.max_rows = max_rows
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-cache")
+        self._conn = sqlite3.connect(path, timeout=1.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_expires_at ON completions (expires_at)")
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM completions WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO completions (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl)
+        )
+        if now - self._last_cleanup >= self.cleanup_interval:
+            self._last_cleanup = now
+            self.cleanup(now)
+
+    def cleanup(self, now: Optional[float] = None):
+        """删除过期记录，超过 max_rows 时删除最早过期的记录"""
+        self._conn.execute("DELETE FROM completions WHERE expires_at <= ?", (time.time() if now is None else now,))
+        (rows,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+        if rows > self.max_rows:
+            self._conn.execute(
+                "DELETE FROM completions WHERE rowid IN (SELECT rowid FROM completions ORDER BY expires_at LIMIT ?)",
+                (rows - self.max_rows,)
+            )
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._run(self._set, key, value, ttl)
+
+    async def close(self):
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=False)
+
+
+class RedisCacheBackend:
+    """最小的Redis协议（RESP）客户端，只用到 GET / SET EX，可对接Redis或任何兼容的本地服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, prefix: str = "llm:"):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis连接已关闭")
+        kind, payload = line[:1], line[1:-2]
+        if kind in (b"+", b":"):
+            return payload.decode()
+        if kind == b"-":
+            raise RuntimeError(payload.decode())
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8")
+        raise RuntimeError(f"不支持的Redis响应: {line!r}")
+
+    async def _command(self, *args):
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                    if self.db:
+                        self._writer.write(self._encode("SELECT", self.db))
+                        await self._read_reply()
+                self._writer.write(self._encode(*args))
+                await self._writer.drain()
+                return await self._read_reply()
+            except Exception:
+                # 连接异常时丢弃连接，下次重新建立
+                await self._close_connection()
+                raise
+
+    async def _close_connection(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._command("GET", self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._command("SET", self.prefix + key, value, "EX", max(1, int(ttl)))
+
+    async def close(self):
+        async with self._lock:
+            await self._close_connection()
+
+
+def _normalize_text(text: str) -> str:
+    """合并空白字符，使仅空格不同的消息命中同一缓存"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CompletionCache:
+    """大模型回复缓存：进程内LRU+TTL，可选SQLite/Redis共享后端"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, backend=None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, ttl)
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.backend_hits = 0
+        self.backend_errors = 0
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], temperature: float, max_tokens: int) -> str:
+        """按 (模型, 规范化后的消息, temperature, max_tokens) 计算缓存键（请求中影响回复的参数都要参与）"""
+        normalized = {
+            "model": model,
+            "messages": [
+                {"role": m.get("role", ""), "content": _normalize_text(str(m.get("content", "")))}
+                for m in messages
+            ],
+            "temperature": round(float(temperature), 3),
+            "max_tokens": int(max_tokens),
+        }
+        payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is None and self.backend is not None:
+            try:
+                value = await self.backend.get(key)
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"读取共享缓存失败: {e}")
+                value = None
+            if value is not None:
+                self.backend_hits += 1
+                self.local.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        self.local.set(key, value)
+        if self.backend is not None:
+            try:
+                await self.backend.set(key, value, self.ttl)
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"写入共享缓存失败: {e}")
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "backend_hits": self.backend_hits,
+            "backend_errors": self.backend_errors,
+            "size": len(self.local),
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+        }
+
+
+def create_cache_backend(url: str):
+    """根据URL创建共享后端：sqlite:///path/to/cache.db 或 redis://host:port/db"""
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteCacheBackend(
+            url[len("sqlite:///"):] if url.startswith("sqlite:///") else parsed.path,
+            max_rows=int(os.getenv("LLM_CACHE_MAX_ROWS", "100000"))
+        )
+    if parsed.scheme == "redis":
+        db = int(parsed.path.strip("/") or 0)
+        return RedisCacheBackend(parsed.hostname or "127.0.0.1", parsed.port or 6379, db)
+    raise ValueError(f"不支持的缓存后端: {url}")
+
+
+_completion_cache: Optional[CompletionCache] = None
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """进程内共享的大模型回复缓存（LLM_CACHE_ENABLED=false 时返回None）"""
+    global _completion_cache
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _completion_cache is None:
+        backend_url = os.getenv("LLM_CACHE_BACKEND", "")
+        _completion_cache = CompletionCache(
+            maxsize=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+            backend=create_cache_backend(backend_url) if backend_url else None,
+        )
+    return _completion_cache
+
+
+async def close_completion_cache():
+    """关闭共享后端（SQLite线程、Redis连接），应用退出时调用"""
+    global _completion_cache
+    if _completion_cache is not None:
+        if _completion_cache.backend is not None:
+            await _completion_cache.backend.close()
+        _completion_cache = None
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""生成任意规模的合成餐厅数据，用于在大数据量下测试索引、筛选和加载
+
+字段与示例数据相同（id, name, cuisine, price, rating, delivery_time, description,
+signature_dish, reviews, image1, image2），可选附加 latitude/longitude。
+文本取自示例数据和招牌菜图片关键词表：每个菜系使用本菜系的店名、描述短语、招牌菜和评价短语，
+菜系按示例数据中的占比抽样，价格按菜系对数正态分布，评分与价格弱相关，配送时间右偏。
+
+按数据块生成并立即写出，内存占用只与块大小有关。输出格式由扩展名决定：
+.csv 写CSV，其他（如 .rcat）写二进制列式文件（见 catalog_store.py）。
+
+用法：
+    python catalog_generator.py 1000000 data/restaurants.rcat
+    python catalog_generator.py 100000 /tmp/restaurants.csv --seed 7 --coordinates
+"""
+import argparse
+import os
+import re
+import time
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import DEFAULT_CHUNK_SIZE, write_catalog
+from dish_images import DISH_KEYWORD_MAPPING, DishImageResolver
+from sample_data import create_sample_data
+
+COLUMNS = ["id", "name", "cuisine", "price", "rating", "delivery_time", "description",
+           "signature_dish", "reviews", "image1", "image2"]
+
+# 店名的修饰：同一品牌的分店加区域后缀，独立店铺用"老字号"式前缀加菜系词加店铺后缀
+NAME_PREFIXES = ["老", "小", "阿", "大", "张记", "李记", "王家", "刘家", "陈记", "赵家", "胖哥", "老街", "巷口", "好味"]
+NAME_SUFFIXES = ["小厨", "馆", "轩", "坊", "食堂", "餐厅", "小馆", "饭庄", "屋", "铺", "大排档", "私房菜"]
+BRANCHES = ["朝阳", "海淀", "徐汇", "浦东", "天河", "南山", "武侯", "江汉", "西湖", "鼓楼", "雁塔", "和平", "中山", "解放"]
+
+# 连锁品牌（示例数据中的店名）的占比，其余为独立店铺
+CHAIN_RATIO = 0.3
+# 招牌菜中来自全局关键词表（不限菜系）的比例
+GLOBAL_DISH_RATIO = 0.1
+
+
+def _phrases(texts, separator: str) -> np.ndarray:
+    """把一组文本按分隔符拆成去重的短语"""
+    phrases = (phrase.strip() for text in texts for phrase in re.split(separator, str(text)))
+    return np.array(list(dict.fromkeys(phrase for phrase in phrases if phrase)), dtype=object)
+
+
+class CatalogGenerator:
+    """按菜系建立词表和数值分布，按块生成 DataFrame"""
+
+    def __init__(self, seed: int = 42, coordinates: bool = False, center=(31.23, 121.47), spread_km: float = 15.0):
+        sample = create_sample_data()
+        self.rng = np.random.default_rng(seed)
+        self.coordinates = coordinates
+        self.center = center
+        self.spread_degrees = spread_km / 111.0
+        self.image_resolver = DishImageResolver()
+        self._images: Dict[str, tuple] = {}
+
+        counts = sample["cuisine"].value_counts()
+        self.cuisines = np.array(counts.index, dtype=object)
+        self.cuisine_weights = (counts / counts.sum()).to_numpy()
+        self.global_dishes = np.array(list(DISH_KEYWORD_MAPPING), dtype=object)
+        self.vocab = {}
+        for cuisine, group in sample.groupby("cuisine"):
+            descriptions = [str(d).split("，") for d in group["description"]]
+            dishes = _phrases(group["signature_dish"], "[、,，]")
+            self.vocab[cuisine] = {
+                "chains": np.array(group["name"].tolist(), dtype=object),
+                # 独立店铺名中的菜系词：菜系名或本菜系的招牌菜
+                "stems": np.concatenate([np.array([cuisine], dtype=object), dishes]),
+                "heads": _phrases([d[0] for d in descriptions], "，"),
+                "tails": _phrases([d[-1] for d in descriptions], "，"),
+                "dishes": dishes,
+                "reviews": _phrases(group["reviews"], r"\|"),
+                "log_price": float(np.log(group["price"]).mean()),
+                "rating": float(group["rating"].mean()),
+            }
+
+    def _pick(self, pool: np.ndarray, count: int) -> np.ndarray:
+        return pool[self.rng.integers(0, len(pool), count)]
+
+    def _distinct(self, pool: np.ndarray, count: int, k: int) -> List[np.ndarray]:
+        """每行从 pool 中取 k 个互不相同的元素（k 不超过 pool 大小），返回 k 列"""
+        k = min(k, len(pool))
+        order = self.rng.random((count, len(pool))).argpartition(k - 1, axis=1)[:, :k]
+        return [pool[order[:, i]] for i in range(k)]
+
+    def _join(self, columns: List[np.ndarray], separator: str) -> np.ndarray:
+        """逐行用分隔符连接各列，跳过空字符串"""
+        result = columns[0].astype(object)
+        for column in columns[1:]:
+            result = np.where(column != "", result + separator + column.astype(object), result)
+        return result
+
+    def _names(self, cuisine: str, count: int) -> np.ndarray:
+        vocab = self.vocab[cuisine]
+        chain = self.rng.random(count) < CHAIN_RATIO
+        independent = self._pick(np.array(NAME_PREFIXES, dtype=object), count) + self._pick(vocab["stems"], count) \
+            + self._pick(np.array(NAME_SUFFIXES, dtype=object), count)
+        branch = self._pick(vocab["chains"], count) + "（" + self._pick(np.array(BRANCHES, dtype=object), count) + "店）"
+        return np.where(chain, branch, independent)
+
+    def _cuisine_block(self, cuisine: str, count: int) -> Dict[str, np.ndarray]:
+        vocab = self.vocab[cuisine]
+        rng = self.rng
+        log_price = vocab["log_price"] + rng.normal(0, 0.35, count)
+        price = np.clip(np.round(np.exp(log_price)), 8, 600).astype(np.int64)
+        # 评分：菜系均值附近，贵的店略高
+        rating = vocab["rating"] + 0.15 * (log_price - vocab["log_price"]) + rng.normal(0, 0.25, count)
+        rating = np.round(np.clip(rating, 2.5, 5.0), 1)
+        delivery = np.clip(np.round(12 + rng.gamma(4.0, 6.5, count)), 10, 120).astype(np.int64)
+
+        # 招牌菜2~3道（本菜系不重复），一部分店的最后一道换成全局关键词表中的菜
+        dishes = self._distinct(vocab["dishes"], count, 3)
+        if len(dishes) == 3:
+            extra = self._pick(self.global_dishes, count)
+            replace = (rng.random(count) < GLOBAL_DISH_RATIO) & (extra != dishes[0]) & (extra != dishes[1])
+            dishes[2] = np.where(rng.random(count) < 1 / 3, "", np.where(replace, extra, dishes[2]))
+        reviews = self._distinct(vocab["reviews"], count, 3)
+        return {
+            "name": self._names(cuisine, count),
+            "price": price,
+            "rating": rating,
+            "delivery_time": delivery,
+            "description": self._pick(vocab["heads"], count) + "，" + self._pick(vocab["tails"], count),
+            "signature_dish": self._join(dishes, "、"),
+            "reviews": self._join(reviews, "|"),
+        }
+
+    def _image_columns(self, signature_dishes: np.ndarray):
+        """按招牌菜解析两张图片（相同招牌菜只解析一次）"""
+        codes, uniques = pd.factorize(signature_dishes)
+        pairs = []
+        for dish in uniques:
+            images = self._images.get(dish)
+            if images is None:
+                images = self._images[dish] = tuple(self.image_resolver.images_for(dish))
+            pairs.append(images)
+        pairs = np.array(pairs, dtype=object).reshape(len(uniques), 2)
+        return pairs[codes, 0], pairs[codes, 1]
+
+    def chunk(self, start_id: int, count: int) -> pd.DataFrame:
+        """生成 id 从 start_id 开始的 count 行"""
+        cuisine_codes = self.rng.choice(len(self.cuisines), size=count, p=self.cuisine_weights)
+        columns = {name: np.empty(count, dtype=object) for name in ("name", "description", "signature_dish", "reviews")}
+        columns.update(price=np.empty(count, dtype=np.int64), rating=np.empty(count), delivery_time=np.empty(count, dtype=np.int64))
+        for code in np.unique(cuisine_codes):
+            rows = np.flatnonzero(cuisine_codes == code)
+            for name, values in self._cuisine_block(self.cuisines[code], len(rows)).items():
+                columns[name][rows] = values
+        image1, image2 = self._image_columns(columns["signature_dish"])
+        df = pd.DataFrame({
+            "id": np.arange(start_id, start_id + count, dtype=np.int64),
+            "name": columns["name"],
+            "cuisine": self.cuisines[cuisine_codes],
+            "price": columns["price"],
+            "rating": columns["rating"],
+            "delivery_time": columns["delivery_time"],
+            "description": columns["description"],
+            "signature_dish": columns["signature_dish"],
+            "reviews": columns["reviews"],
+            "image1": image1,
+            "image2": image2,
+        })
+        if self.coordinates:
+            df["latitude"] = np.round(self.center[0] + self.rng.normal(0, self.spread_degrees / 2, count), 6)
+            df["longitude"] = np.round(self.center[1] + self.rng.normal(0, self.spread_degrees / 2, count), 6)
+        return df
+
+    def chunks(self, rows: int, chunk_rows: int = DEFAULT_CHUNK_SIZE, start_id: int = 1) -> Iterator[pd.DataFrame]:
+        for offset in range(0, rows, chunk_rows):
+            yield self.chunk(start_id + offset, min(chunk_rows, rows - offset))
+
+
+def generate_catalog(
+    path: str,
+    rows: int,
+    seed: int = 42,
+    chunk_rows: int = DEFAULT_CHUNK_SIZE,
+    coordinates: bool = False,
+    center=(31.23, 121.47),
+    spread_km: float = 15.0
+) -> int:
+    """生成 rows 行合成数据并流式写入 path（.csv 为CSV，否则为列式文件），返回行数"""
+    chunks = CatalogGenerator(seed, coordinates, center, spread_km).chunks(rows, chunk_rows)
+    if not path.lower().endswith(".csv"):
+        return write_catalog(chunks, path)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    written = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+            for chunk in chunks:
+                chunk.to_csv(f, index=False, header=written == 0)
+                written += len(chunk)
+            if written == 0:
+                f.write(",".join(COLUMNS + (["latitude", "longitude"] if coordinates else [])) + "\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return written
+
+
+def _parse_center(value: str):
+    latitude, longitude = (float(part) for part in value.split(","))
+    return latitude, longitude
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rows", type=lambda value: int(float(value)), help="餐厅数（可写作 1e6）")
+    parser.add_argument("output_path", help=".csv 输出CSV，其他扩展名输出列式文件")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE, help="每块生成的行数")
+    parser.add_argument("--coordinates", action="store_true", help="附加 latitude/longitude 列")
+    parser.add_argument("--center", type=_parse_center, default=(31.23, 121.47), help="坐标中心 纬度,经度")
+    parser.add_argument("--spread-km", type=float, default=15.0, help="坐标分布范围（公里）")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    rows = generate_catalog(args.output_path, args.rows, args.seed, args.chunksize, args.coordinates, args.center, args.spread_km)
+    print(f"已生成 {rows} 行（{time.perf_counter() - started:.1f}s）: {args.output_path}")
@@ -0,0 +1,349 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from scoring import budget_from_range, score_rows, top_k
+from semantic_index import SemanticIndex
+from spatial_index import GridIndex
+from text_search import TextIndex
+
+
+class CatalogIndex:
+    """餐厅数据的列式内存索引（启动时构建一次，查询时不复制DataFrame）"""
+
+    # 支持范围查询的数值列
+    RANGE_COLUMNS = ("price", "rating", "delivery_time")
+    # 结果排序方式：rating 为默认的评分排序，relevance 按关键词匹配度（BM25）排序，
+    # score 按评分、价格与预算的距离、配送时间、关键词匹配度的加权综合得分排序
+    SORT_OPTIONS = ("rating", "relevance", "score")
+    # 可选的坐标列，数据中有这两列时构建空间索引，支持按配送半径筛选
+    GEO_COLUMNS = ("latitude", "longitude")
+
+    def __init__(self, df: pd.DataFrame):
+        self.size = len(df)
+        self.records = df.to_dict(orient="records")
+
+        # 数值列 + 按值排序的行号（NaN排在最后，不参与范围查询）
+        self.columns: Dict[str, np.ndarray] = {}
+        self.sorted_rows: Dict[str, np.ndarray] = {}
+        self.sorted_values: Dict[str, np.ndarray] = {}
+        self.valid_counts: Dict[str, int] = {}
+        for column in self.RANGE_COLUMNS:
+            values = df[column].to_numpy(dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            self.columns[column] = values
+            self.sorted_rows[column] = order
+            self.sorted_values[column] = values[order]
+            self.valid_counts[column] = int(np.count_nonzero(~np.isnan(values)))
+
+        # 菜系 -> 行号位图
+        codes, cuisines = pd.factorize(df["cuisine"])
+        self.cuisine_bitmaps: Dict[str, np.ndarray] = {
+            cuisine: codes == i for i, cuisine in enumerate(cuisines)
+        }
+
+        # 默认排序：评分降序、价格升序（与原 sort_values 一致，稳定排序）
+        self.rank_order = np.lexsort((self.columns["price"], -self.columns["rating"]))
+        self.rank_position = np.empty(self.size, dtype=np.int64)
+        self.rank_position[self.rank_order] = np.arange(self.size)
+
+        # 关键词搜索用的倒排索引
+        self.text_index = TextIndex.from_records(self.records)
+        # 聊天候选召回用的TF-IDF向量索引
+        self.semantic_index = SemanticIndex(self.records)
+
+        # 坐标列 + 网格空间索引（数据没有坐标时为None，不按距离筛选）
+        self.coordinates: Optional[Dict[str, np.ndarray]] = None
+        self.spatial_index: Optional[GridIndex] = None
+        if all(column in df.columns for column in self.GEO_COLUMNS):
+            self.coordinates = {column: df[column].to_numpy(dtype=np.float64) for column in self.GEO_COLUMNS}
+            self.spatial_index = GridIndex(self.coordinates["latitude"], self.coordinates["longitude"])
+
+    def _range_rows(self, column: str, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        """二分查找返回值落在 [low, high] 内的行号切片（视图，不复制）"""
+        values = self.sorted_values[column][:self.valid_counts[column]]
+        start = 0 if low is None else int(np.searchsorted(values, low, side="left"))
+        stop = len(values) if high is None else int(np.searchsorted(values, high, side="right"))
+        return self.sorted_rows[column][start:stop]
+
+    def query(
+        self,
+        cuisine: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        max_delivery_time: Optional[int] = None,
+        keyword: Optional[str] = None,
+        sort: Optional[str] = None,
+        budget: Optional[float] = None,
+        limit: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None
+    ) -> np.ndarray:
+        """返回满足条件的行号，默认按（评分降序，价格升序）排好
+
+        keyword 支持多个词：空白分隔表示都要出现，"|" 或 "OR" 分隔表示任一组出现即可；
+        sort="relevance" 时按关键词匹配度降序排列，匹配度相同的仍按评分排序；
+        sort="score" 时按综合得分排序（budget 默认取价格区间，weights 为各项权重），
+        给出 limit 时只选出前 limit 行，不对全部结果排序。
+        同时给出 latitude、longitude、radius_km 且数据带坐标时，只保留配送半径内的餐厅（没有坐标的餐厅不在其中）。
+        """
+        if sort not in (None,) + self.SORT_OPTIONS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        keyword = keyword.strip() if keyword else None
+        bounds = {}
+        if min_price is not None or max_price is not None:
+            bounds["price"] = (min_price, max_price)
+        if min_rating is not None:
+            bounds["rating"] = (min_rating, None)
+        if max_delivery_time is not None:
+            bounds["delivery_time"] = (None, max_delivery_time)
+
+        bitmap = None
+        if cuisine:
+            bitmap = self.cuisine_bitmaps.get(cuisine)
+            if bitmap is None:
+                return np.empty(0, dtype=np.int64)
+
+        # 关键词和配送半径先通过倒排索引、空间索引取出候选行，其余条件直接在列上校验
+        candidates, scores = None, None
+        if keyword:
+            candidates, scores = self.text_index.search(keyword)
+        nearby = self.nearby_rows(latitude, longitude, radius_km)
+        if nearby is not None:
+            if candidates is None:
+                candidates = nearby
+            else:
+                keep = np.isin(candidates, nearby, assume_unique=True)
+                candidates, scores = candidates[keep], scores[keep]
+
+        if candidates is None and not bounds and bitmap is None:
+            rows = self.rank_order
+            if sort != "score":
+                return rows[:limit]
+        elif candidates is not None:
+            rows = candidates
+            for column, (low, high) in bounds.items():
+                values = self.columns[column][rows]
+                keep = ~np.isnan(values)
+                if low is not None:
+                    keep &= values >= low
+                if high is not None:
+                    keep &= values <= high
+                rows = rows[keep]
+                scores = None if scores is None else scores[keep]
+            if bitmap is not None:
+                keep = bitmap[rows]
+                rows = rows[keep]
+                scores = None if scores is None else scores[keep]
+        elif bounds:
+            # 取最短的范围切片作为候选集，其余条件直接在列上校验
+            slices = {column: self._range_rows(column, *bound) for column, bound in bounds.items()}
+            driver = min(slices, key=lambda column: len(slices[column]))
+            rows = slices[driver]
+            for column, (low, high) in bounds.items():
+                if column == driver or len(rows) == 0:
+                    continue
+                values = self.columns[column][rows]
+                keep = ~np.isnan(values)
+                if low is not None:
+                    keep &= values >= low
+                if high is not None:
+                    keep &= values <= high
+                rows = rows[keep]
+            if bitmap is not None:
+                rows = rows[bitmap[rows]]
+        else:
+            rows = np.flatnonzero(bitmap)
+
+        ranks = self.rank_position[rows]
+        if sort == "score":
+            if budget is None:
+                budget = budget_from_range(min_price, max_price)
+            return rows[top_k(score_rows(self.columns, rows, budget, scores, weights), limit, ranks)]
+        if sort == "relevance" and scores is not None:
+            return rows[top_k(scores, limit, ranks)]
+        return rows[top_k(-ranks, limit)]
+
+    def nearby_rows(
+        self,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        radius_km: Optional[float]
+    ) -> Optional[np.ndarray]:
+        """配送半径内的行号（升序）；数据没有坐标或未给出位置时返回None，表示不按距离筛选"""
+        if self.spatial_index is None or latitude is None or longitude is None or not radius_km or radius_km <= 0:
+            return None
+        rows, _ = self.spatial_index.within(latitude, longitude, radius_km)
+        return rows
+
+    def patched(self, records: List[Dict], removed: np.ndarray, changed: np.ndarray) -> "CatalogIndex":
+        """增量更新：返回反映行级变更的新索引，未受影响的列、位图和文本与旧索引共享（写时复制）
+
+        records 是变更后的完整记录列表；removed 是被删除的旧行号，
+        changed 是被修改或新增的行在新记录列表中的行号。
+        只修改已有行时行号不变，排序结构只删除/插入受影响的位置；有删除或新增时按新行号重排。
+        """
+        changed = np.unique(np.asarray(changed, dtype=np.int64))
+        removed = np.asarray(removed, dtype=np.int64)
+        structural = len(removed) > 0 or len(records) != self.size
+        if structural:
+            keep = np.ones(self.size, dtype=bool)
+            keep[removed] = False
+            kept = self.size - len(removed)
+            remap = np.cumsum(keep) - 1
+            # 旧行号中需要从排序结构里移除的行（被删除或被修改）
+            stale = ~keep
+            updated = changed[changed < kept]
+            stale[np.flatnonzero(keep)[updated]] = True
+        else:
+            updated = changed
+
+        index = object.__new__(CatalogIndex)
+        index.size = len(records)
+        index.records = records
+        index.columns, index.sorted_rows, index.sorted_values, index.valid_counts = {}, {}, {}, {}
+        for column in self.RANGE_COLUMNS:
+            old_values = self.columns[column]
+            new_changed = np.array([records[row].get(column) for row in changed], dtype=np.float64)
+            if not structural and np.array_equal(old_values[updated], new_changed, equal_nan=True):
+                # 该列没有变化，直接共享
+                index.columns[column] = old_values
+                index.sorted_rows[column] = self.sorted_rows[column]
+                index.sorted_values[column] = self.sorted_values[column]
+                index.valid_counts[column] = self.valid_counts[column]
+                continue
+            if structural:
+                values = np.empty(index.size, dtype=np.float64)
+                values[:kept] = old_values[keep]
+                values[changed] = new_changed
+                rows = self.sorted_rows[column]
+                rows = remap[rows[~stale[rows]]]
+                sorted_values = values[rows]
+            else:
+                values = old_values.copy()
+                values[changed] = new_changed
+                positions = _sorted_positions(self.sorted_rows[column], self.sorted_values[column], changed, old_values[changed])
+                rows = np.delete(self.sorted_rows[column], positions)
+                sorted_values = np.delete(self.sorted_values[column], positions)
+            inserted = changed[np.argsort(values[changed], kind="stable")]
+            positions = np.searchsorted(sorted_values, values[inserted], side="right")
+            index.columns[column] = values
+            index.sorted_rows[column] = np.insert(rows, positions, inserted)
+            index.sorted_values[column] = np.insert(sorted_values, positions, values[inserted])
+            index.valid_counts[column] = int(np.count_nonzero(~np.isnan(values)))
+
+        # 菜系位图：结构变化时全部重排，否则只复制受影响的菜系
+        if structural:
+            bitmaps = {
+                cuisine: np.concatenate([bitmap[keep], np.zeros(index.size - kept, dtype=bool)])
+                for cuisine, bitmap in self.cuisine_bitmaps.items()
+            }
+            copied = set(bitmaps)
+        else:
+            bitmaps = dict(self.cuisine_bitmaps)
+            copied = set()
+        for row in changed:
+            cuisine = records[row].get("cuisine")
+            for name, bitmap in list(bitmaps.items()):
+                if bitmap[row] and name != cuisine:
+                    if name not in copied:
+                        bitmap = bitmaps[name] = bitmap.copy()
+                        copied.add(name)
+                    bitmap[row] = False
+            if cuisine is None or cuisine != cuisine:
+                continue
+            if cuisine not in bitmaps:
+                bitmaps[cuisine] = np.zeros(index.size, dtype=bool)
+                copied.add(cuisine)
+            elif cuisine not in copied:
+                bitmaps[cuisine] = bitmaps[cuisine].copy()
+                copied.add(cuisine)
+            bitmaps[cuisine][row] = True
+        index.cuisine_bitmaps = {cuisine: bitmap for cuisine, bitmap in bitmaps.items() if bitmap.any()}
+
+        # 默认排序：从旧顺序中去掉受影响的行，再按 (评分降序, 价格升序, 行号) 二分插回
+        rating, price = index.columns["rating"], index.columns["price"]
+        if structural:
+            order = self.rank_order
+            order = remap[order[~stale[order]]]
+        elif rating is self.columns["rating"] and price is self.columns["price"]:
+            order = None
+        else:
+            order = np.delete(self.rank_order, self.rank_position[changed])
+        if order is None:
+            # 评分和价格都没变，排序不变
+            index.rank_order, index.rank_position = self.rank_order, self.rank_position
+        else:
+            inserted = changed[np.lexsort((changed, price[changed], -rating[changed]))]
+            positions = np.array([
+                _rank_insert_position(order, rating, price, row) for row in inserted
+            ], dtype=np.int64)
+            index.rank_order = np.insert(order, positions, inserted)
+            if structural:
+                index.rank_position = np.empty(index.size, dtype=np.int64)
+                index.rank_position[index.rank_order] = np.arange(index.size)
+            else:
+                # 只有新旧位置之间的一段排名发生移动
+                moved = np.concatenate([self.rank_position[changed], positions + np.arange(len(positions))])
+                low, high = int(moved.min()), int(moved.max()) + 1
+                index.rank_position = self.rank_position.copy()
+                index.rank_position[index.rank_order[low:high]] = np.arange(low, high)
+
+        # 关键词倒排索引：共享旧的倒排表，变化的行单独检查
+        index.text_index = self.text_index.patched(records, removed, changed, structural)
+        index.semantic_index = self.semantic_index.patched(records, removed, changed, structural)
+
+        # 坐标没有变化时共享空间索引，否则按新坐标重建网格（只有一次排序）
+        index.coordinates, index.spatial_index = self.coordinates, self.spatial_index
+        if self.coordinates is not None:
+            coordinates = {}
+            for column in self.GEO_COLUMNS:
+                old_values = self.coordinates[column]
+                new_changed = np.array([records[row].get(column) for row in changed], dtype=np.float64)
+                if not structural and np.array_equal(old_values[changed], new_changed, equal_nan=True):
+                    coordinates[column] = old_values
+                    continue
+                values = np.empty(index.size, dtype=np.float64)
+                values[:len(old_values) - len(removed)] = np.delete(old_values, removed)
+                values[changed] = new_changed
+                coordinates[column] = values
+            if any(coordinates[column] is not self.coordinates[column] for column in self.GEO_COLUMNS):
+                index.coordinates = coordinates
+                index.spatial_index = GridIndex(coordinates["latitude"], coordinates["longitude"], self.spatial_index.cell)
+        return index
+
+    def materialize(self, rows: np.ndarray) -> List[Dict]:
+        """按行号取出餐厅记录（浅拷贝，调用方可安全修改）"""
+        return [dict(self.records[row]) for row in rows]
+
+
+def _rank_key(rating: np.ndarray, price: np.ndarray, row: int) -> tuple:
+    """默认排序的比较键：评分降序、价格升序、行号升序，NaN排在最后（与lexsort一致）"""
+    r, p = rating[row], price[row]
+    return (r != r, 0.0 if r != r else -r, p != p, 0.0 if p != p else p, row)
+
+
+def _rank_insert_position(order: np.ndarray, rating: np.ndarray, price: np.ndarray, row: int) -> int:
+    """在已排好的行号序列中二分查找插入位置（逐个比较键，不需要按排序聚集整列）"""
+    key = _rank_key(rating, price, row)
+    low, high = 0, len(order)
+    while low < high:
+        mid = (low + high) // 2
+        if _rank_key(rating, price, int(order[mid])) < key:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def _sorted_positions(sorted_rows: np.ndarray, sorted_values: np.ndarray, rows: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """二分查找行在按值排序的数组中的位置（只扫描值相等的一段）"""
+    positions = np.empty(len(rows), dtype=np.int64)
+    for i, (row, value) in enumerate(zip(rows, values)):
+        low = int(np.searchsorted(sorted_values, value, side="left"))
+        high = int(np.searchsorted(sorted_values, value, side="right"))
+        positions[i] = low + int(np.flatnonzero(sorted_rows[low:high] == row)[0])
+    return positions
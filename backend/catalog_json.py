@@ -0,0 +1,114 @@
+import gzip
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只提供gzip
+    brotli = None
+
+
+def dumps(data) -> bytes:
+    """序列化为紧凑的UTF-8 JSON字节"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class CatalogJSONSnapshot:
+    """餐厅列表的预序列化JSON快照：每个数据版本构建一次，请求时直接返回字节"""
+
+    def __init__(self, records: List[Dict], fields: Sequence[str]):
+        self.records = records
+        self.fields = list(fields)
+        # 按需构建的列（引用records中的同一批对象，字段投影时使用）
+        self._columns: Dict[str, list] = {}
+        self._field_keys = {field: dumps(field) + b":" for field in self.fields}
+
+        rows = [dumps(record) for record in records]
+        # 所有行用逗号拼接成一块，记录每行的起止位置，分页时直接切片
+        lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+        self.row_ends = np.cumsum(lengths + 1) - 1
+        self.row_starts = self.row_ends - lengths
+        self.rows = b",".join(rows)
+        self.size = len(rows)
+
+        self.body = b'{"data":[' + self.rows + b']}'
+        digest = hashlib.sha256(self.body).hexdigest()
+        self.digest = digest[:32]
+        self.etag = f'"{self.digest}"'
+        # 预压缩版本
+        self.encoded: Dict[str, bytes] = {"gzip": gzip.compress(self.body, compresslevel=6)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body)
+
+    def _column(self, field: str) -> list:
+        column = self._columns.get(field)
+        if column is None:
+            column = self._columns[field] = [record.get(field) for record in self.records]
+        return column
+
+    def encode_rows(self, rows: Iterable[int], fields: Optional[Sequence[str]] = None) -> bytes:
+        """按行号拼接JSON对象（不含外层方括号）：全部字段时直接切片预序列化的行，
+        指定字段时只序列化这些列的这些行，不为每行构建字典"""
+        if fields is None:
+            starts, ends, data = self.row_starts, self.row_ends, self.rows
+            return b",".join(data[starts[row]:ends[row]] for row in rows)
+        keys = [self._field_keys[field] for field in fields]
+        columns = [self._column(field) for field in fields]
+        return b",".join(
+            b"{" + b",".join(key + dumps(column[row]) for key, column in zip(keys, columns)) + b"}"
+            for row in rows
+        )
+
+    def page(self, start: int, limit: int, fields: Optional[Sequence[str]] = None) -> bytes:
+        """返回 [start, start+limit) 行组成的响应体（含 next_cursor），只拼接已序列化好的字节"""
+        start = max(0, min(start, self.size))
+        stop = min(start + limit, self.size)
+        if fields is not None:
+            rows = self.encode_rows(range(start, stop), fields)
+        else:
+            rows = self.rows[self.row_starts[start]:self.row_ends[stop - 1]] if stop > start else b""
+        next_cursor = b'"%d"' % stop if stop < self.size else b"null"
+        return b'{"data":[' + rows + b'],"next_cursor":' + next_cursor + b'}'
+
+    def page_etag(self, start: int, limit: int, fields: Optional[Sequence[str]] = None) -> str:
+        projection = "-" + ",".join(fields) if fields is not None else ""
+        return f'"{self.digest}-{start}-{limit}{projection}"'
+
+
+def choose_encoding(accept_encoding: str, available: Dict[str, bytes]) -> Optional[str]:
+    """按 Accept-Encoding 选择预压缩版本（优先br，其次gzip）"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中当前ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""餐厅数据的二进制列式存储：CSV一次性编译成列式文件，各worker进程用mmap加载
+
+只省去CSV解析：字符串列加载时仍要解码成Python字符串，CatalogIndex（记录、文本索引、语义索引等）
+也仍在加载后重新构建，数据量大时启动耗时主要在这部分。
+
+文件布局（所有数据块按8字节对齐）：
+    魔数 b"RCATLG01" | 头部长度(uint64) | 头部JSON | 各列数据块
+数值列（int64 / float64 / bool）直接存原始数组，加载时零拷贝映射，多个进程共享页缓存；
+字符串列存为 空值位图(uint8) + 以NUL分隔的UTF-8字符串堆，加载时一次解码、一次split。
+
+用法：
+    python catalog_store.py data/restaurants.csv data/restaurants.rcat
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"RCATLG01"
+# 分块读取CSV的默认行数，编译大文件时内存占用只与块大小有关
+DEFAULT_CHUNK_SIZE = 100000
+
+_NUMERIC_KINDS = {"int64": np.int64, "float64": np.float64, "bool": np.bool_}
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int64"
+    if pd.api.types.is_float_dtype(series):
+        return "float64"
+    return "str"
+
+
+class _ColumnSpill:
+    """编译时单列的临时文件：数值列追加原始字节，字符串列分别追加空值位图和字符串堆"""
+
+    def __init__(self, directory: str, index: int, kind: str):
+        self.kind = kind
+        self.data = open(os.path.join(directory, f"{index}.data"), "w+b")
+        self.nulls = open(os.path.join(directory, f"{index}.nulls"), "w+b") if kind == "str" else None
+        self.rows = 0
+        # 已写入的值是否全为空：全空的块（如稀疏的 reviews、image2）读出来是float64，之后遇到字符串时可转成字符串列
+        self.all_null = True
+
+    def append(self, series: pd.Series):
+        kind = _column_kind(series)
+        null_chunk = bool(series.isna().all())
+        if kind != self.kind:
+            if self.kind == "int64" and (kind == "float64" or null_chunk):
+                self._promote_to_float()
+            elif self.kind == "float64" and kind == "str" and self.all_null:
+                self._promote_to_str()
+            elif not (self.kind == "str" or (self.kind == "float64" and (kind == "int64" or null_chunk))):
+                raise ValueError(f"列 {series.name} 的类型在不同数据块中不一致: {self.kind} / {kind}")
+        self.all_null = self.all_null and null_chunk
+
+        if self.kind == "str":
+            nulls = series.isna().to_numpy()
+            values = series.where(~nulls, "").astype(str).tolist()
+            if any("\0" in value for value in values):
+                raise ValueError(f"列 {series.name} 包含NUL字符，无法写入字符串堆")
+            if self.rows:
+                self.data.write(b"\0")
+            self.data.write("\0".join(values).encode("utf-8"))
+            self.nulls.write(nulls.astype(np.uint8).tobytes())
+        elif self.kind == "float64":
+            self.data.write(pd.to_numeric(series).to_numpy(dtype=np.float64, na_value=np.nan).tobytes())
+        else:
+            self.data.write(series.to_numpy(dtype=_NUMERIC_KINDS[self.kind]).tobytes())
+        self.rows += len(series)
+
+    def _promote_to_float(self):
+        """前面的块是整数、后面的块出现空值时，把已写入的数据整体转成float64"""
+        self.data.seek(0)
+        values = np.frombuffer(self.data.read(), dtype=np.int64).astype(np.float64)
+        self.data.seek(0)
+        self.data.truncate()
+        self.data.write(values.tobytes())
+        self.kind = "float64"
+
+    def _promote_to_str(self):
+        """前面的块全为空值（推断为float64）、后面的块出现字符串时，改写为全空的字符串列"""
+        self.data.seek(0)
+        self.data.truncate()
+        self.data.write(b"\0" * max(self.rows - 1, 0))
+        self.nulls = open(self.data.name[:-len(".data")] + ".nulls", "w+b")
+        self.nulls.write(b"\1" * self.rows)
+        self.kind = "str"
+
+    def blocks(self) -> List:
+        return [self.nulls, self.data] if self.kind == "str" else [self.data]
+
+    def close(self):
+        for f in self.blocks():
+            f.close()
+
+
+def write_catalog(chunks, path: str) -> int:
+    """把DataFrame数据块流式写入列式文件（先写临时文件，完成后原子替换），返回总行数"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    spills: Dict[str, _ColumnSpill] = {}
+    rows = 0
+    with tempfile.TemporaryDirectory(dir=directory) as spill_dir:
+        try:
+            for chunk in chunks:
+                if not spills:
+                    for i, column in enumerate(chunk.columns):
+                        spills[column] = _ColumnSpill(spill_dir, i, _column_kind(chunk[column]))
+                elif list(chunk.columns) != list(spills):
+                    raise ValueError("数据块的列不一致")
+                for column, spill in spills.items():
+                    spill.append(chunk[column])
+                rows += len(chunk)
+
+            # 数据块位置相对于头部之后的数据区起点，先算好位置写入头部，再依次拷贝
+            header = {"rows": rows, "columns": []}
+            offset = 0
+            for column, spill in spills.items():
+                blocks = []
+                for f in spill.blocks():
+                    size = f.seek(0, os.SEEK_END)
+                    blocks.append([offset, size])
+                    offset = _align(offset + size)
+                header["columns"].append({"name": column, "kind": spill.kind, "blocks": blocks})
+            header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+            data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    out.write(MAGIC)
+                    out.write(struct.pack("<Q", len(header_bytes)))
+                    out.write(header_bytes)
+                    for column, meta in zip(spills.values(), header["columns"]):
+                        for f, (block_offset, _) in zip(column.blocks(), meta["blocks"]):
+                            out.write(b"\0" * (data_start + block_offset - out.tell()))
+                            f.seek(0)
+                            shutil.copyfileobj(f, out)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        finally:
+            for spill in spills.values():
+                spill.close()
+    return rows
+
+
+def compile_csv(csv_path: str, path: str, chunksize: int = DEFAULT_CHUNK_SIZE) -> int:
+    """把CSV编译成列式文件，返回行数"""
+    return write_catalog(pd.read_csv(csv_path, encoding="utf-8-sig", chunksize=chunksize), path)
+
+
+def load_catalog(path: str) -> pd.DataFrame:
+    """mmap加载列式文件：数值列是只读的零拷贝视图，字符串列解码为Python字符串"""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"不是有效的餐厅数据文件: {path}")
+    (header_length,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header = json.loads(bytes(buffer[header_start:header_start + header_length]).decode("utf-8"))
+    rows = header["rows"]
+    data_start = _align(header_start + header_length)
+
+    columns = {}
+    for meta in header["columns"]:
+        if meta["kind"] == "str":
+            (nulls_offset, _), (data_offset, data_size) = meta["blocks"]
+            nulls_offset += data_start
+            data_offset += data_start
+            values = bytes(buffer[data_offset:data_offset + data_size]).decode("utf-8").split("\0") if rows else []
+            column = np.array(values, dtype=object)
+            nulls = np.frombuffer(buffer, dtype=np.bool_, count=rows, offset=nulls_offset)
+            if nulls.any():
+                column[nulls] = np.nan
+        else:
+            ((data_offset, _),) = meta["blocks"]
+            column = np.frombuffer(buffer, dtype=_NUMERIC_KINDS[meta["kind"]], count=rows, offset=data_start + data_offset)
+        columns[meta["name"]] = column
+    return pd.DataFrame(columns, copy=False)
+
+
+def catalog_is_fresh(path: str, csv_path: Optional[str]) -> bool:
+    """列式文件存在且不比CSV旧"""
+    if not os.path.exists(path):
+        return False
+    return csv_path is None or not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path")
+    parser.add_argument("output_path")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE, help="每次读取的CSV行数")
+    args = parser.parse_args()
+    print(f"已写入 {compile_csv(args.csv_path, args.output_path, args.chunksize)} 行: {args.output_path}")
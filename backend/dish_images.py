@@ -0,0 +1,251 @@
+from typing import Dict, List, Tuple
+
+from matcher import AhoCorasick, DISH_SEPARATOR
+
+# 招牌菜关键词 -> 英文图片搜索词
+DISH_KEYWORD_MAPPING = {
+    # 火锅相关
+    '火锅': 'hotpot',
+    '毛肚': 'hotpot',
+    '虾滑': 'hotpot',
+    '牛肉片': 'hotpot',
+    '海底捞': 'hotpot',
+    '小龙坎': 'hotpot',
+    '大龙燚': 'hotpot',
+    '呷哺呷哺': 'hotpot',
+    '小肥羊': 'hotpot',
+    '麻辣牛肉': 'hotpot',
+    '鸭肠': 'hotpot',
+    '脑花': 'hotpot',
+    '黄喉': 'hotpot',
+    '肥牛': 'hotpot',
+    '蔬菜拼盘': 'hotpot',
+    '羊肉片': 'hotpot',
+    '羊蝎子': 'hotpot',
+    '手切羊肉': 'hotpot',
+    
+    # 烧烤相关
+    '烧烤': 'barbecue',
+    '烤肉': 'barbecue',
+    '烤串': 'barbecue',
+    '韩式烤肉': 'korean-barbecue',
+    '羊肉串': 'barbecue',
+    '烤': 'barbecue',
+    '石锅拌饭': 'korean-food',
+    '泡菜汤': 'korean-food',
+    
+    # 烤鸭相关
+    '烤鸭': 'peking-duck',
+    '北京烤鸭': 'peking-duck',
+    '焖炉烤鸭': 'peking-duck',
+    '鸭架汤': 'peking-duck',
+    '京酱肉丝': 'chinese-food',
+    
+    # 川菜
+    '麻婆豆腐': 'mapo-tofu',
+    '水煮鱼': 'sichuan-fish',
+    '宫保鸡丁': 'kung-pao-chicken',
+    '麻辣香锅': 'spicy-hot-pot',
+    '麻辣烫': 'spicy-soup',
+    '干锅牛蛙': 'spicy-food',
+    
+    # 面食
+    '拉面': 'ramen',
+    '牛肉拉面': 'beef-noodles',
+    '羊肉拉面': 'lamb-noodles',
+    '重庆小面': 'chongqing-noodles',
+    '豌杂面': 'noodles',
+    '红油抄手': 'wonton',
+    '米线': 'rice-noodles',
+    '过桥米线': 'rice-noodles',
+    '酸辣米线': 'spicy-noodles',
+    '凉拌牛肉': 'beef',
+    
+    # 饺子包子
+    '饺子': 'dumplings',
+    '包子': 'steamed-buns',
+    '小笼包': 'xiaolongbao',
+    '生煎包': 'pan-fried-buns',
+    '扁肉': 'wonton',
+    '拌面': 'noodles',
+    '蒸饺': 'dumplings',
+    
+    # 西餐
+    '披萨': 'pizza',
+    '牛排': 'steak',
+    '意面': 'pasta',
+    '意大利面': 'pasta',
+    '提拉米苏': 'tiramisu',
+    '玛格丽特披萨': 'pizza',
+    '意式肉酱面': 'pasta',
+    '意式香肠披萨': 'pizza',
+    
+    # 日式
+    '日式': 'japanese-food',
+    '寿司': 'sushi',
+    '乌冬面': 'udon',
+    '豚骨拉面': 'ramen',
+    '味增拉面': 'ramen',
+    '日式炸鸡': 'japanese-fried-chicken',
+    '天妇罗': 'tempura',
+    '牛肉饭': 'beef-rice',
+    '照烧鸡排饭': 'teriyaki-chicken',
+    '牛丼饭': 'gyudon',
+    '咖喱饭': 'curry-rice',
+    '日式套餐': 'japanese-bento',
+    '味增汤': 'miso-soup',
+    
+    # 粤菜
+    '虾饺': 'shrimp-dumplings',
+    '烧卖': 'shumai',
+    '叉烧包': 'char-siu-bao',
+    '茶点': 'dim-sum',
+    
+    # 其他
+    '黄焖鸡': 'braised-chicken',
+    '黄焖排骨': 'braised-pork',
+    '大盘鸡': 'xinjiang-chicken',
+    '手抓饭': 'pilaf',
+    '剁椒鱼头': 'fish-head',
+    '口味虾': 'spicy-shrimp',
+    '小炒肉': 'stir-fried-pork',
+    '锅包肉': 'sweet-sour-pork',
+    '地三鲜': 'three-delicacies',
+    '西湖醋鱼': 'west-lake-fish',
+    '东坡肉': 'dongpo-pork',
+    '龙井虾仁': 'shrimp',
+    '糖醋里脊': 'sweet-sour-pork',
+    '白切鸡': 'white-cut-chicken',
+    '鸭血粉丝汤': 'duck-blood-soup',
+    '盐水鸭': 'salted-duck',
+    '豆汁': 'beijing-food',
+    '焦圈': 'beijing-food',
+    '驴打滚': 'beijing-snack',
+    '卤肉饭': 'braised-pork-rice',
+    '豆浆': 'soy-milk',
+    '油条': 'youtiao',
+    '莜面': 'noodles',
+    '凉皮': 'liangpi',
+    '鸡汤': 'chicken-soup',
+    '蒸蛋': 'steamed-egg',
+    '小菜': 'side-dish',
+    '蒸排骨': 'steamed-ribs',
+    '蒸鸡': 'steamed-chicken',
+}
+
+# 搜索词 -> 图片URL（同一搜索词有多张时按偏移量轮换）
+QUALITY_IMAGE_MAP = {
+    'hotpot': [
+        'https://picsum.photos/seed/hotpot1/400/300',
+        'https://picsum.photos/seed/hotpot2/400/300',
+        'https://picsum.photos/seed/hotpot3/400/300'
+    ],
+    'barbecue': [
+        'https://picsum.photos/seed/barbecue1/400/300',
+        'https://picsum.photos/seed/barbecue2/400/300',
+        'https://picsum.photos/seed/barbecue3/400/300'
+    ],
+    'korean-barbecue': [
+        'https://picsum.photos/seed/korean1/400/300',
+        'https://picsum.photos/seed/korean2/400/300'
+    ],
+    'peking-duck': [
+        'https://picsum.photos/seed/duck1/400/300',
+        'https://picsum.photos/seed/duck2/400/300'
+    ],
+    'ramen': [
+        'https://picsum.photos/seed/ramen1/400/300',
+        'https://picsum.photos/seed/ramen2/400/300'
+    ],
+    'dumplings': [
+        'https://picsum.photos/seed/dumpling1/400/300',
+        'https://picsum.photos/seed/dumpling2/400/300'
+    ],
+    'pizza': [
+        'https://picsum.photos/seed/pizza1/400/300',
+        'https://picsum.photos/seed/pizza2/400/300'
+    ],
+    'steak': [
+        'https://picsum.photos/seed/steak1/400/300',
+        'https://picsum.photos/seed/steak2/400/300'
+    ],
+    'pasta': [
+        'https://picsum.photos/seed/pasta1/400/300',
+        'https://picsum.photos/seed/pasta2/400/300'
+    ],
+    'sushi': [
+        'https://picsum.photos/seed/sushi1/400/300',
+        'https://picsum.photos/seed/sushi2/400/300'
+    ],
+    'dim-sum': [
+        'https://picsum.photos/seed/dimsum1/400/300',
+        'https://picsum.photos/seed/dimsum2/400/300'
+    ],
+    'food': [
+        'https://picsum.photos/seed/food1/400/300',
+        'https://picsum.photos/seed/food2/400/300',
+        'https://picsum.photos/seed/food3/400/300',
+        'https://picsum.photos/seed/food4/400/300'
+    ],
+}
+
+
+def extract_dish_keywords(signature_dish: str) -> List[str]:
+    """从招牌菜字符串中提取关键词"""
+    if not signature_dish or not isinstance(signature_dish, str):
+        return ['food']
+
+    # 移除标点符号，按逗号、顿号、空格分割
+    dishes = DISH_SEPARATOR.split(signature_dish)
+    # 过滤空字符串，取前2个
+    keywords = [d.strip() for d in dishes if d.strip()][:2]
+    return keywords if keywords else ['food']
+
+
+class DishImageResolver:
+    """招牌菜 -> 图片URL 解析器，匹配结构在构建时一次性生成"""
+
+    def __init__(self, mapping: Dict[str, str] = DISH_KEYWORD_MAPPING,
+                 image_map: Dict[str, List[str]] = QUALITY_IMAGE_MAP):
+        self.mapping = mapping
+        self.image_map = image_map
+        self._keys = list(mapping)
+        self._order = {key: i for i, key in enumerate(self._keys)}
+        # 部分匹配的两个方向：映射词出现在关键词中（自动机），关键词是映射词的子串（子串索引）
+        self._automaton = AhoCorasick(self._keys)
+        self._substring_index: Dict[str, int] = {}
+        for i, key in enumerate(self._keys):
+            for start in range(len(key) + 1):
+                for end in range(start, len(key) + 1):
+                    self._substring_index.setdefault(key[start:end], i)
+        self._search_keywords: Dict[str, str] = {}
+
+    def search_keyword(self, keyword: str) -> str:
+        """关键词 -> 英文搜索词：先完全匹配，再取映射表中最靠前的部分匹配项"""
+        keyword_lower = keyword.lower()
+        cached = self._search_keywords.get(keyword_lower)
+        if cached is not None:
+            return cached
+
+        if keyword_lower in self.mapping:
+            search_keyword = self.mapping[keyword_lower]
+        else:
+            candidates = [self._order[key] for key in self._automaton.find(keyword_lower)]
+            if keyword_lower in self._substring_index:
+                candidates.append(self._substring_index[keyword_lower])
+            search_keyword = self.mapping[self._keys[min(candidates)]] if candidates else 'food'
+
+        self._search_keywords[keyword_lower] = search_keyword
+        return search_keyword
+
+    def image_url(self, keyword: str, offset: int = 0) -> str:
+        """根据关键词获取美食图片URL"""
+        img_urls = self.image_map.get(self.search_keyword(keyword)) or self.image_map['food']
+        return img_urls[offset % len(img_urls)]
+
+    def images_for(self, signature_dish: str) -> Tuple[str, str]:
+        """根据招牌菜返回两张图片：两个招牌菜各一张，只有一个时取同一菜品的不同图片"""
+        dish_keywords = extract_dish_keywords(signature_dish)
+        if len(dish_keywords) >= 2:
+            return self.image_url(dish_keywords[0], 0), self.image_url(dish_keywords[1], 0)
+        return self.image_url(dish_keywords[0], 0), self.image_url(dish_keywords[0], 1)
@@ -1,15 +1,171 @@
+import asyncio
 import httpx
+import json
 import os
-from typing import List, Dict
+from typing import AsyncIterator, Callable, List, Dict, Optional
+from http_client import get_http_client
+from cache import CompletionCache, get_completion_cache
+from metrics import FALLBACKS, track_upstream
+
+# 用户配置的模型ID
+DOUBAO_MODEL = "ep-20251103145219-hzndr"
+
+class DoubaoAPIError(Exception):
+    """豆包API返回非200状态码"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def _error_detail(response: httpx.Response) -> str:
+    """从错误响应中提取错误信息"""
+    try:
+        error_body = response.json()
+        return error_body.get("error", {}).get("message", f"API返回错误: {response.status_code}")
+    except Exception:
+        return f"API返回错误: {response.status_code} - {response.text[:200]}"
+
+def _parse_batched_reasons(content: str) -> Dict[str, str]:
+    """解析批量推荐理由的JSON回复（容忍代码块等多余文本），只保留非空字符串"""
+    start = content.find("{")
+    end = content.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(content[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {
+        str(key).strip(): value.strip()
+        for key, value in data.items()
+        if isinstance(value, str) and value.strip()
+    }
 
 class DoubaoAPI:
     def __init__(self):
         self.api_key = os.getenv("DOUBAO_API_KEY")
         self.api_url = os.getenv("DOUBAO_API_URL", "https://ark.cn-beijing.volces.com/api/v3")
+        # 推荐理由并发生成：最大并发数和单个餐厅的超时时间（秒）
+        self.max_concurrency = max(1, int(os.getenv("DOUBAO_MAX_CONCURRENCY", "5")))
+        self.reason_timeout = float(os.getenv("DOUBAO_REASON_TIMEOUT", "10"))
+        # 批量模式（一次请求生成全部推荐理由）的超时时间（秒）
+        self.batch_timeout = float(os.getenv("DOUBAO_BATCH_TIMEOUT", "20"))
+        # 累计调用次数和token用量
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        # 回复缓存（相同模型、消息、temperature和max_tokens直接返回缓存结果）
+        self.cache = get_completion_cache()
         
         if not self.api_key:
             raise ValueError("请在.env文件中配置DOUBAO_API_KEY。如果没有API密钥，系统将使用默认推荐理由。")
     
+    async def chat_completions(self, messages: List[Dict], max_tokens: int, temperature: float = 0.7) -> httpx.Response:
+        """通过共享连接池调用豆包 chat/completions 接口"""
+        client = get_http_client()
+        with track_upstream("doubao") as call:
+            response = await client.post(
+                f"{self.api_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": DOUBAO_MODEL,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens
+                },
+                timeout=30.0
+            )
+            call["status"] = response.status_code
+        return response
+    
+    async def complete(self, messages: List[Dict], max_tokens: int, temperature: float = 0.7) -> str:
+        """调用豆包并返回回复文本（优先读缓存），非200时抛出DoubaoAPIError"""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = CompletionCache.make_key(DOUBAO_MODEL, messages, temperature, max_tokens)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        response = await self.chat_completions(messages, max_tokens, temperature)
+        if response.status_code != 200:
+            raise DoubaoAPIError(response.status_code, _error_detail(response))
+        
+        result = response.json()
+        usage = result.get("usage") or {}
+        self.usage["calls"] += 1
+        self.usage["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        self.usage["completion_tokens"] += usage.get("completion_tokens", 0)
+        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+        
+        if cache_key is not None and content:
+            await self.cache.set(cache_key, content)
+        return content
+    
+    async def stream_complete(self, messages: List[Dict], max_tokens: int, temperature: float = 0.7) -> AsyncIterator[str]:
+        """以流式方式调用豆包（stream: true），逐段返回回复文本；非200时抛出DoubaoAPIError"""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = CompletionCache.make_key(DOUBAO_MODEL, messages, temperature, max_tokens)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                # 命中缓存时一次性返回完整回复
+                yield cached
+                return
+        
+        parts = []
+        client = get_http_client()
+        # 耗时包含接收完整个流的时间
+        with track_upstream("doubao") as call:
+            async with client.stream(
+                "POST",
+                f"{self.api_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": DOUBAO_MODEL,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "stream": True
+                },
+                timeout=30.0
+            ) as response:
+                call["status"] = response.status_code
+                if response.status_code != 200:
+                    await response.aread()
+                    raise DoubaoAPIError(response.status_code, _error_detail(response))
+                
+                self.usage["calls"] += 1
+                async for line in response.aiter_lines():
+                    # SSE格式：每行 "data: {...}"，以 "data: [DONE]" 结束
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    usage = chunk.get("usage") or {}
+                    self.usage["prompt_tokens"] += usage.get("prompt_tokens", 0)
+                    self.usage["completion_tokens"] += usage.get("completion_tokens", 0)
+                    for choice in chunk.get("choices") or []:
+                        content = (choice.get("delta") or {}).get("content")
+                        if content:
+                            parts.append(content)
+                            yield content
+        
+        # 完整接收后才写入缓存，避免缓存被截断的回复
+        if cache_key is not None and parts:
+            await self.cache.set(cache_key, "".join(parts))
+    
     async def generate_recommendation(self, restaurants: List[Dict]) -> str:
         """使用豆包API生成推荐理由"""
         try:
@@ -26,41 +182,16 @@ class DoubaoAPI:
 请从口味、性价比、配送速度等角度给出推荐理由。"""
             
             # 调用豆包API
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.api_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "ep-20251103145219-hzndr",  # 用户配置的模型ID
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 200
-                    },
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("choices", [{}])[0].get("message", {}).get("content", "推荐这些美食，希望能满足您的需求！")
-                else:
-                    return "根据您的筛选条件，为您推荐以下美食！"
+            content = await self.complete([{"role": "user", "content": prompt}], max_tokens=200)
+            return content or "推荐这些美食，希望能满足您的需求！"
                     
         except Exception as e:
             print(f"豆包API调用错误: {e}")
             return "根据您的筛选条件，为您推荐以下美食！"
     
-    async def generate_recommendations(self, restaurants: List[Dict]) -> List[Dict]:
-        """为每个餐厅生成个性化推荐理由"""
-        recommendations = []
-        
-        for restaurant in restaurants:
-            try:
-                prompt = f"""你是一个专业的外卖推荐助手。为以下餐厅生成一段简洁的推荐理由（30字以内）：
+    async def _generate_reason(self, restaurant: Dict) -> Optional[str]:
+        """为单个餐厅生成推荐理由，失败时返回None"""
+        prompt = f"""你是一个专业的外卖推荐助手。为以下餐厅生成一段简洁的推荐理由（30字以内）：
 
 餐厅：{restaurant['name']}
 菜系：{restaurant['cuisine']}
@@ -70,47 +201,91 @@ class DoubaoAPI:
 特色：{restaurant.get('description', '')}
 
 请给出推荐理由："""
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{self.api_url}/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": "ep-20251103145219-hzndr",  # 用户配置的模型ID
-                            "messages": [
-                                {"role": "user", "content": prompt}
-                            ],
-                            "temperature": 0.7,
-                            "max_tokens": 100
-                        },
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        reason = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                        recommendations.append({
-                            "restaurant_id": restaurant.get("id"),
-                            "name": restaurant.get("name"),
-                            "reason": reason
-                        })
-                    else:
-                        recommendations.append({
-                            "restaurant_id": restaurant.get("id"),
-                            "name": restaurant.get("name"),
-                            "reason": f"{restaurant['name']}评分高，配送快，值得一试！"
-                        })
-                        
+        
+        try:
+            reason = await self.complete([{"role": "user", "content": prompt}], max_tokens=100)
+        except DoubaoAPIError:
+            return None
+        return reason or None
+    
+    async def generate_recommendations(
+        self,
+        restaurants: List[Dict],
+        fallback_reason: Optional[Callable[[Dict], str]] = None
+    ) -> List[Dict]:
+        """为每个餐厅并发生成个性化推荐理由（总耗时取决于最慢的单次调用）"""
+        if fallback_reason is None:
+            fallback_reason = lambda r: f"{r['name']}评分高，配送快，值得一试！"
+        
+        # 限制同时发往豆包的请求数
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def limited(restaurant: Dict) -> Optional[str]:
+            async with semaphore:
+                return await self._generate_reason(restaurant)
+        
+        async def recommend(restaurant: Dict) -> Dict:
+            # 每个餐厅单独计时（包含排队时间），超时则使用默认理由
+            try:
+                reason = await asyncio.wait_for(limited(restaurant), timeout=self.reason_timeout)
+            except asyncio.TimeoutError:
+                print(f"生成推荐理由超时: {restaurant.get('name')}")
+                reason = None
             except Exception as e:
                 print(f"生成推荐理由错误: {e}")
-                recommendations.append({
-                    "restaurant_id": restaurant.get("id"),
-                    "name": restaurant.get("name"),
-                    "reason": f"{restaurant['name']}评分高，配送快，值得一试！"
-                })
+                reason = None
+            
+            if reason is None:
+                FALLBACKS.inc("recommend", "default_reason")
+                reason = fallback_reason(restaurant)
+            return {
+                "restaurant_id": restaurant.get("id"),
+                "name": restaurant.get("name"),
+                "reason": reason
+            }
         
-        return recommendations
+        return list(await asyncio.gather(*(recommend(r) for r in restaurants)))
+    
+    async def generate_recommendations_batched(
+        self,
+        restaurants: List[Dict],
+        fallback_reason: Optional[Callable[[Dict], str]] = None
+    ) -> List[Dict]:
+        """一次请求生成全部餐厅的推荐理由（JSON按餐厅id返回），缺失或解析失败的使用默认理由"""
+        if fallback_reason is None:
+            fallback_reason = lambda r: f"{r['name']}评分高，配送快，值得一试！"
+        
+        restaurant_info = "\n".join(
+            f"[id={r.get('id')}] {r['name']}｜{r['cuisine']}｜{r['price']}元｜评分{r['rating']}｜"
+            f"配送{r['delivery_time']}分钟｜{r.get('description', '')}"
+            for r in restaurants
+        )
+        prompt = f"""你是一个专业的外卖推荐助手。为以下每家餐厅分别生成一段简洁的推荐理由（每条30字以内）：
+
+{restaurant_info}
 
+只返回一个JSON对象，键为餐厅id（字符串），值为推荐理由，例如：{{"1": "推荐理由"}}。不要输出其他内容。"""
+        
+        reasons: Dict[str, str] = {}
+        try:
+            content = await asyncio.wait_for(
+                self.complete([{"role": "user", "content": prompt}], max_tokens=60 * len(restaurants) + 50),
+                timeout=self.batch_timeout
+            )
+            reasons = _parse_batched_reasons(content)
+        except asyncio.TimeoutError:
+            print("批量生成推荐理由超时")
+        except Exception as e:
+            print(f"批量生成推荐理由错误: {e}")
+        
+        missing = sum(1 for r in restaurants if not reasons.get(str(r.get("id"))))
+        if missing:
+            FALLBACKS.inc("recommend", "default_reason", amount=missing)
+        return [
+            {
+                "restaurant_id": r.get("id"),
+                "name": r.get("name"),
+                "reason": reasons.get(str(r.get("id"))) or fallback_reason(r)
+            }
+            for r in restaurants
+        ]
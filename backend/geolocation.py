@@ -0,0 +1,212 @@
+import asyncio
+import bisect
+import csv
+import ipaddress
+import os
+from typing import Dict, List, Optional, Tuple
+
+from cache import TTLCache
+from http_client import get_http_client
+from metrics import track_upstream
+
+# 定位失败或本地IP时使用的默认城市
+DEFAULT_LOCATION = {
+    "city": "北京",
+    "region": "北京",
+    "country": "中国"
+}
+
+# 负缓存标记：定位失败的IP在短时间内不再重复请求
+_FAILED = object()
+
+
+def _coordinates(latitude, longitude) -> Dict:
+    """解析经纬度，缺失或无效时返回空字典"""
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return {}
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return {}
+    return {"latitude": latitude, "longitude": longitude}
+
+
+def _ip_to_int(ip: str) -> Tuple[int, int]:
+    """IP地址 -> (版本号, 整数值)"""
+    address = ipaddress.ip_address(ip.strip())
+    return address.version, int(address)
+
+
+class GeoIPDatabase:
+    """本地IP段数据库：按起始IP排序的数组，二分查找所属IP段"""
+
+    def __init__(self, ranges: List[Tuple[str, str, Dict]]):
+        # IPv4 和 IPv6 分开存放，避免整数值范围重叠
+        self._tables: Dict[int, Tuple[List[int], List[int], List[Dict]]] = {}
+        parsed = []
+        for start, end, location in ranges:
+            version, start_int = _ip_to_int(start)
+            end_version, end_int = _ip_to_int(end)
+            if version != end_version or end_int < start_int:
+                continue
+            parsed.append((version, start_int, end_int, location))
+        parsed.sort(key=lambda item: (item[0], item[1]))
+        for version, start_int, end_int, location in parsed:
+            starts, ends, locations = self._tables.setdefault(version, ([], [], []))
+            starts.append(start_int)
+            ends.append(end_int)
+            locations.append(location)
+
+    @classmethod
+    def load(cls, path: str) -> "GeoIPDatabase":
+        """从CSV加载（列：start_ip,end_ip,city,region,country，可选 latitude,longitude）"""
+        ranges = []
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                location = {
+                    "city": row.get("city") or "未知",
+                    "region": row.get("region") or "未知",
+                    "country": row.get("country") or "未知"
+                }
+                location.update(_coordinates(row.get("latitude"), row.get("longitude")))
+                ranges.append((row["start_ip"], row["end_ip"], location))
+        return cls(ranges)
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts, _, _ in self._tables.values())
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        try:
+            version, value = _ip_to_int(ip)
+        except ValueError:
+            return None
+        table = self._tables.get(version)
+        if table is None:
+            return None
+        starts, ends, locations = table
+        i = bisect.bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return dict(locations[i])
+        return None
+
+
+class GeoLocator:
+    """IP -> 城市定位：LRU+TTL缓存（含失败的负缓存），可选离线数据库，在线查询ipapi.co"""
+
+    def __init__(
+        self,
+        cache_size: int = 10000,
+        ttl: float = 86400,
+        negative_ttl: float = 300,
+        database: Optional[GeoIPDatabase] = None,
+        online: bool = True,
+        api_url: str = "https://ipapi.co"
+    ):
+        self.cache = TTLCache(cache_size, ttl)
+        self.negative_ttl = negative_ttl
+        self.database = database
+        self.online = online
+        self.api_url = api_url.rstrip("/")
+        # 同一IP的并发请求共用一次查询
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "GeoLocator":
+        """GEOIP_MODE: online（默认，只查ipapi.co）/ offline（只查本地库）/ hybrid（先查本地库再在线查询）"""
+        mode = os.getenv("GEOIP_MODE", "online").lower()
+        database = None
+        db_path = os.getenv("GEOIP_DB_PATH")
+        if mode in ("offline", "hybrid") and db_path:
+            try:
+                database = GeoIPDatabase.load(db_path)
+            except Exception as e:
+                print(f"加载IP地址库失败 ({db_path}): {e}")
+        return cls(
+            cache_size=int(os.getenv("GEO_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("GEO_CACHE_TTL", "86400")),
+            negative_ttl=float(os.getenv("GEO_NEGATIVE_TTL", "300")),
+            database=database,
+            online=mode != "offline",
+            api_url=os.getenv("IPAPI_URL", "https://ipapi.co")
+        )
+
+    @staticmethod
+    def _is_local(ip: str) -> bool:
+        if ip in ["127.0.0.1", "localhost", "::1", "unknown"] or ip.startswith("192.168.") or ip.startswith("10."):
+            return True
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return True
+        return address.is_private or address.is_loopback
+
+    async def locate(self, ip: str) -> Dict:
+        """根据IP地址获取地理位置，失败时返回默认城市"""
+        # 如果是本地IP，跳过查询
+        if self._is_local(ip):
+            return dict(DEFAULT_LOCATION)
+
+        cached = self.cache.get(ip)
+        if cached is not None:
+            self.hits += 1
+            return dict(DEFAULT_LOCATION) if cached is _FAILED else dict(cached)
+        self.misses += 1
+
+        pending = self._pending.get(ip)
+        if pending is None:
+            pending = asyncio.ensure_future(self._resolve(ip))
+            self._pending[ip] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(ip, None))
+        location = await asyncio.shield(pending)
+        return dict(DEFAULT_LOCATION) if location is None else dict(location)
+
+    async def _resolve(self, ip: str) -> Optional[Dict]:
+        if self.database is not None:
+            location = self.database.lookup(ip)
+            if location is not None:
+                self.cache.set(ip, location)
+                return location
+
+        location = await self._query_online(ip) if self.online else None
+        if location is None:
+            self.cache.set(ip, _FAILED, ttl=self.negative_ttl)
+        else:
+            self.cache.set(ip, location)
+        return location
+
+    async def _query_online(self, ip: str) -> Optional[Dict]:
+        try:
+            # 使用ipapi.co免费API（无需密钥）
+            client = get_http_client()
+            with track_upstream("ipapi") as call:
+                response = await client.get(f"{self.api_url}/{ip}/json/", timeout=5.0)
+                call["status"] = response.status_code
+            if response.status_code == 200:
+                data = response.json()
+                # 检查是否有错误
+                if "error" in data:
+                    raise Exception(data.get("reason", "API返回错误"))
+                location = {
+                    "city": data.get("city", "未知"),
+                    "region": data.get("region", "未知"),
+                    "country": data.get("country_name", "未知")
+                }
+                # 坐标用于按配送半径筛选餐厅
+                location.update(_coordinates(data.get("latitude"), data.get("longitude")))
+                return location
+            raise Exception(f"API返回错误: {response.status_code}")
+        except Exception as e:
+            print(f"获取IP地理位置失败 ({ip}): {e}")
+        return None
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self.cache),
+            "database_ranges": len(self.database) if self.database is not None else 0,
+        }
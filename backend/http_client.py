@@ -0,0 +1,95 @@
+import os
+import httpx
+from typing import Dict, Optional
+
+# pool_stats 读取的 httpcore 内部属性按此版本验证，升级 httpcore 时需同步检查（见 test_http_client.py）
+HTTPCORE_VERSION = "1.0"
+
+# 应用级共享的HTTP客户端（复用TCP/TLS连接），由FastAPI lifespan创建和关闭
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要安装 h2（httpx[http2]），未安装时退回 HTTP/1.1"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _pool_limits() -> httpx.Limits:
+    """从环境变量读取连接池配置"""
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def create_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """创建带连接池、keep-alive 和 HTTP/2 的客户端"""
+    http2 = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes") and _http2_available()
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=_pool_limits(),
+        timeout=30.0,
+        transport=transport,
+    )
+
+
+def init_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """初始化共享客户端（应用启动时调用）"""
+    global _client
+    _client = create_http_client(transport)
+    return _client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享客户端；未经lifespan启动（如脚本、测试）时延迟创建"""
+    if _client is None or _client.is_closed:
+        return init_http_client()
+    return _client
+
+
+async def close_http_client():
+    """关闭共享客户端（应用退出时调用）"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _read_pool(read):
+    """读取 httpcore 连接池的内部状态；版本升级后属性变化或使用自定义transport时返回None"""
+    try:
+        return read(_client._transport._pool)
+    except Exception:
+        return None
+
+
+def pool_stats() -> Dict:
+    """连接池占用情况，用于根据请求量调整连接池大小（取不到的项为None）"""
+    limits = _pool_limits()
+    stats = {
+        "max_connections": limits.max_connections,
+        "max_keepalive_connections": limits.max_keepalive_connections,
+        "connections": 0,
+        "active": 0,
+        "idle": 0,
+        "http2": 0,
+        "queued_requests": 0,
+    }
+    if _client is None:
+        return stats
+
+    # httpcore 连接池没有公开的统计接口，这里读取其内部属性（按 HTTPCORE_VERSION 验证）
+    stats["connections"] = _read_pool(lambda pool: len(pool.connections))
+    stats["idle"] = _read_pool(lambda pool: sum(1 for connection in pool.connections if connection.is_idle()))
+    stats["active"] = (
+        stats["connections"] - stats["idle"]
+        if stats["connections"] is not None and stats["idle"] is not None else None
+    )
+    stats["http2"] = _read_pool(lambda pool: sum(1 for connection in pool.connections if "HTTP/2" in connection.info()))
+    stats["queued_requests"] = _read_pool(lambda pool: sum(1 for request in pool._requests if request.is_queued()))
+    return stats
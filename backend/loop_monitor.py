@@ -0,0 +1,73 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class EventLoopLagMonitor:
+    """事件循环延迟监控：定时休眠，实际唤醒时间比计划晚多少就是事件循环被阻塞的时长"""
+
+    def __init__(self, interval: float = 0.5, warn_threshold: float = 0.1, window: int = 240, log_interval: float = 60):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        # 阻塞日志最多每 log_interval 秒打印一次（持续阻塞时不刷屏），期间的次数和最大值合并到下一条；完整统计见 slow 计数和 /metrics
+        self.log_interval = log_interval
+        self._last_log: Optional[float] = None
+        self._unlogged = 0
+        self._unlogged_max = 0.0
+        # 最近的采样，用于计算分位数
+        self.recent: deque = deque(maxlen=window)
+        self.samples = 0
+        self.slow = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, lag: float):
+        self.samples += 1
+        self.total += lag
+        self.last = lag
+        self.max = max(self.max, lag)
+        self.recent.append(lag)
+        if lag >= self.warn_threshold:
+            self.slow += 1
+            self._unlogged += 1
+            self._unlogged_max = max(self._unlogged_max, lag)
+            now = time.monotonic()
+            if self._last_log is None or now - self._last_log >= self.log_interval:
+                if self._unlogged > 1:
+                    print(f"事件循环阻塞 {self._unlogged} 次，最长 {self._unlogged_max * 1000:.1f}ms")
+                else:
+                    print(f"事件循环阻塞 {lag * 1000:.1f}ms")
+                self._last_log = now
+                self._unlogged = 0
+                self._unlogged_max = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - expected))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        recent = sorted(self.recent)
+        p99 = recent[min(len(recent) - 1, int(len(recent) * 0.99))] if recent else 0.0
+        return {
+            "samples": self.samples,
+            "slow": self.slow,
+            "last_ms": round(self.last * 1000, 2),
+            "mean_ms": round(self.total / self.samples * 1000, 2) if self.samples else 0.0,
+            "p99_ms": round(p99 * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
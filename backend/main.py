@@ -1,17 +1,45 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+from contextlib import asynccontextmanager
 import pandas as pd
+import asyncio
+import hmac
+import json
 import os
 from dotenv import load_dotenv
 from doubao_api import DoubaoAPI
-from recommendation import RecommendationEngine
-import httpx
+from recommendation import RecommendationEngine, RestaurantNotFoundError
+from http_client import init_http_client, close_http_client, pool_stats
+from cache import close_completion_cache, get_completion_cache
+from geolocation import GeoLocator
+from catalog_json import choose_encoding, dumps, etag_matches
+from loop_monitor import EventLoopLagMonitor
+from metrics import REGISTRY, REQUEST_SECONDS, STAGE_SECONDS, RequestTimer, cache_family
 
 load_dotenv()
 
-app = FastAPI(title="AI外卖推荐助手")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：创建/关闭共享的HTTP连接池和回复缓存后端，启动事件循环延迟监控，按需启动数据文件监控"""
+    init_http_client()
+    loop_monitor.start()
+    watch_interval = float(os.getenv("CATALOG_WATCH_INTERVAL", "0"))
+    watcher = asyncio.create_task(recommendation_engine.watch_catalog(watch_interval)) if watch_interval > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    loop_monitor.stop()
+    recommendation_engine.close()
+    await close_completion_cache()
+    await close_http_client()
+
+app = FastAPI(title="AI外卖推荐助手", lifespan=lifespan)
+
+# 按路由记录请求耗时（纯ASGI中间件，不包装请求/响应对象）
+app.add_middleware(RequestTimer, histogram=REQUEST_SECONDS)
 
 # 配置CORS
 app.add_middleware(
@@ -25,27 +53,162 @@ app.add_middleware(
 # 初始化推荐引擎
 recommendation_engine = RecommendationEngine()
 
+# IP定位（缓存 + 可选离线IP库）
+geo_locator = GeoLocator.from_env()
+
+# 事件循环延迟监控（发现同步代码阻塞事件循环的回归）
+loop_monitor = EventLoopLagMonitor(
+    interval=float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5")),
+    warn_threshold=float(os.getenv("EVENT_LOOP_LAG_WARN", "0.1")),
+    log_interval=float(os.getenv("EVENT_LOOP_LAG_LOG_INTERVAL", "60"))
+)
+
+def _collect_runtime_metrics():
+    """/metrics 抓取时读取的已有统计：缓存命中、出站连接池、事件循环延迟、提示词大小、大模型token用量、数据版本"""
+    completion_cache = get_completion_cache()
+    pool = pool_stats()
+    lag = loop_monitor.stats()
+    prompt = recommendation_engine.prompt_builder.stats()
+    doubao = recommendation_engine.doubao_api
+    usage = doubao.usage if doubao is not None else {}
+    catalog = recommendation_engine.catalog
+    return cache_family("food_cache", {
+        "llm": completion_cache.stats() if completion_cache is not None else None,
+        "geo": geo_locator.stats(),
+    }) + [
+        ("food_http_pool_connections", "gauge", "出站HTTP连接池的连接数（使用中、空闲）", [
+            ({"state": "active"}, pool["active"]),
+            ({"state": "idle"}, pool["idle"]),
+        ]),
+        ("food_http_pool_max_connections", "gauge", "出站HTTP连接池的连接数上限", [({}, pool["max_connections"])]),
+        ("food_http_pool_queued_requests", "gauge", "等待出站连接的请求数", [({}, pool["queued_requests"])]),
+        ("food_event_loop_lag_seconds", "gauge", "事件循环延迟（最近一次、最近窗口p99、最大）", [
+            ({"stat": "last"}, lag["last_ms"] / 1000),
+            ({"stat": "p99"}, lag["p99_ms"] / 1000),
+            ({"stat": "max"}, lag["max_ms"] / 1000),
+        ]),
+        ("food_prompt_tokens", "gauge", "聊天提示词估算token数（最近窗口）", [
+            ({"stat": "p50"}, prompt["p50_tokens"]),
+            ({"stat": "p95"}, prompt["p95_tokens"]),
+        ]),
+        ("food_prompt_restaurants_dropped_total", "counter", "因token预算被裁掉的餐厅行数", [({}, prompt["restaurants_dropped"])]),
+        ("food_llm_tokens_total", "counter", "大模型返回的token用量", [
+            ({"kind": "prompt"}, usage.get("prompt_tokens")),
+            ({"kind": "completion"}, usage.get("completion_tokens")),
+        ]),
+        ("food_catalog_restaurants", "gauge", "当前数据快照中的餐厅数", [({}, catalog.index.size)]),
+        ("food_catalog_version", "gauge", "当前数据快照的版本号", [({}, catalog.version)]),
+    ]
+
+REGISTRY.add_collector(_collect_runtime_metrics)
+
 class FilterRequest(BaseModel):
     cuisine: Optional[str] = None  # 菜系
     min_price: Optional[float] = None  # 最低价格
     max_price: Optional[float] = None  # 最高价格
     min_rating: Optional[float] = None  # 最低评分
     max_delivery_time: Optional[int] = None  # 最长配送时间（分钟）
-    keyword: Optional[str] = None  # 关键词搜索
+    keyword: Optional[str] = None  # 关键词搜索（空格分隔表示同时包含，"|" 分隔表示任一）
+    sort: Optional[str] = None  # 排序方式：rating（默认）、relevance（按关键词匹配度）或 score（综合得分）
+    budget: Optional[float] = None  # 预算（sort=score 时参与打分，默认取价格区间）
+    latitude: Optional[float] = Field(None, ge=-90, le=90)  # 送餐位置（只指定 radius_km 时按客户端IP定位）
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius_km: Optional[float] = Field(None, ge=0)  # 配送半径（给出坐标时默认 DELIVERY_RADIUS_KM，0 表示不限）
+    fields: Optional[List[str]] = None  # 只返回这些字段（默认全部）
+    cursor: Optional[str] = None  # 分页游标
+    limit: Optional[int] = Field(None, ge=1, le=1000)  # 每页条数
+
+class RestaurantChanges(BaseModel):
+    upsert: List[dict] = []  # 新增或修改的餐厅（已有餐厅可只传需要修改的字段）
+    delete: List[Union[int, str]] = []  # 要删除的餐厅id（按数据中id的类型匹配，不存在时返回404）
 
 class ChatRequest(BaseModel):
     message: str  # 用户消息
     conversation_history: Optional[List[dict]] = []  # 对话历史
+    latitude: Optional[float] = Field(None, ge=-90, le=90)  # 送餐位置（给出时只推荐配送半径内的餐厅）
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+def _chat_coordinates(request: ChatRequest):
+    """聊天请求中客户端给出的 (纬度, 经度)，没有给出时返回None"""
+    if request.latitude is None or request.longitude is None:
+        return None
+    return request.latitude, request.longitude
 
 @app.get("/")
 async def root():
     return {"message": "AI外卖推荐助手 API"}
 
+# 分页请求未指定limit时的每页条数
+DEFAULT_PAGE_SIZE = 100
+
+def _parse_cursor(cursor: Optional[str]) -> int:
+    """分页游标是行偏移量"""
+    if cursor is None:
+        return 0
+    try:
+        start = int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的cursor")
+    if start < 0:
+        raise HTTPException(status_code=400, detail="无效的cursor")
+    return start
+
+def _parse_fields(fields, catalog=None) -> Optional[List[str]]:
+    try:
+        return (catalog or recommendation_engine.catalog).parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/restaurants")
-async def get_restaurants():
-    """获取所有餐厅列表"""
-    restaurants = recommendation_engine.get_all_restaurants()
-    return {"data": restaurants}
+async def get_restaurants(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    fields: Optional[str] = None
+):
+    """获取所有餐厅列表（预序列化快照，支持ETag/304、gzip/br预压缩、cursor分页和fields字段投影）"""
+    snapshot = await recommendation_engine.get_json_snapshot_async()
+    if_none_match = request.headers.get("if-none-match")
+    selected_fields = _parse_fields(fields)
+    
+    if cursor is not None or limit is not None or selected_fields is not None:
+        start = _parse_cursor(cursor)
+        page_limit = limit or DEFAULT_PAGE_SIZE
+        etag = snapshot.page_etag(start, page_limit, selected_fields)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(
+            snapshot.page(start, page_limit, selected_fields),
+            media_type="application/json",
+            headers={"ETag": etag}
+        )
+    
+    headers = {"ETag": snapshot.etag, "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""), snapshot.encoded)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        return Response(snapshot.encoded[encoding], media_type="application/json", headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+@app.get("/api/stats")
+async def get_stats():
+    """运行状态统计（连接池占用、大模型回复缓存命中率、聊天提示词大小等）"""
+    completion_cache = get_completion_cache()
+    return {
+        "http_pool": pool_stats(),
+        "llm_cache": completion_cache.stats() if completion_cache is not None else None,
+        "geo_cache": geo_locator.stats(),
+        "event_loop": loop_monitor.stats(),
+        "prompt": recommendation_engine.prompt_builder.stats()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 指标（文本格式）：请求和各阶段耗时、上游状态、备用路径次数、缓存命中等"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/api/cuisines")
 async def get_cuisines():
@@ -69,70 +232,35 @@ def get_client_ip(request: Request) -> str:
     return "unknown"
 
 async def get_location_from_ip(ip: str) -> dict:
-    """根据IP地址获取地理位置信息（使用免费API）"""
-    # 如果是本地IP，跳过API调用
-    if ip in ["127.0.0.1", "localhost", "::1", "unknown"] or ip.startswith("192.168.") or ip.startswith("10."):
-        return {
-            "city": "北京",  # 默认城市
-            "region": "北京",
-            "country": "中国"
-        }
-    
+    """根据IP地址获取地理位置信息（带缓存，可选离线IP库）"""
+    return await geo_locator.locate(ip)
+
+async def get_client_location(http_request: Request, endpoint: str = "chat") -> Union[dict, str]:
+    """根据客户端IP获取位置（城市，以及可用时的经纬度），失败时返回默认的位置描述"""
     try:
-        # 使用ipapi.co免费API（无需密钥）
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://ipapi.co/{ip}/json/",
-                timeout=5.0
-            )
-            if response.status_code == 200:
-                data = response.json()
-                # 检查是否有错误
-                if "error" in data:
-                    raise Exception(data.get("reason", "API返回错误"))
-                return {
-                    "city": data.get("city", "未知"),
-                    "region": data.get("region", "未知"),
-                    "country": data.get("country_name", "未知")
-                }
+        client_ip = get_client_ip(http_request)
+        # 获取地理位置信息
+        with STAGE_SECONDS.time(endpoint, "location"):
+            return await get_location_from_ip(client_ip)
     except Exception as e:
-        print(f"获取IP地理位置失败 ({ip}): {e}")
-    
-    # 如果获取失败，返回默认值
-    return {
-        "city": "北京",  # 默认城市
-        "region": "北京",
-        "country": "中国"
-    }
+        print(f"获取位置信息失败: {e}")
+        return "您所在的城市"  # 使用默认值
 
 @app.post("/api/chat")
 async def chat(request: ChatRequest, http_request: Request):
     """聊天接口，根据用户消息和IP地址推荐餐厅"""
     try:
-        # 获取用户IP地址
-        try:
-            client_ip = get_client_ip(http_request)
-            # 获取地理位置信息
-            location = await get_location_from_ip(client_ip)
-            location_str = f"{location['city']}市" if location['city'] != "未知" else "您所在的城市"
-        except Exception as e:
-            print(f"获取位置信息失败: {e}")
-            location_str = "您所在的城市"  # 使用默认值
-        
-        # 获取所有餐厅数据
-        try:
-            all_restaurants = recommendation_engine.get_all_restaurants()
-        except Exception as e:
-            print(f"获取餐厅数据失败: {e}")
-            raise HTTPException(status_code=500, detail="获取餐厅数据失败")
+        # 定位与餐厅数据准备并发进行：先发起定位，推荐引擎准备好提示词后再等待结果
+        location_task = asyncio.create_task(get_client_location(http_request))
+        await asyncio.sleep(0)
         
         # 使用豆包API理解用户需求并推荐
         try:
             response_data = await recommendation_engine.chat_recommend(
                 user_message=request.message,
                 conversation_history=request.conversation_history or [],
-                location=location_str,
-                restaurants=all_restaurants
+                location=location_task,
+                coordinates=_chat_coordinates(request)
             )
             return response_data
         except Exception as e:
@@ -154,32 +282,137 @@ async def chat(request: ChatRequest, http_request: Request):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
+def _sse_event(event: str, data: dict) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """流式聊天接口（SSE）：逐段推送AI回复，匹配到餐厅后立即推送餐厅卡片"""
+    async def event_stream():
+        location_task = asyncio.create_task(get_client_location(http_request, "chat_stream"))
+        await asyncio.sleep(0)
+        try:
+            async for event, data in recommendation_engine.chat_recommend_stream(
+                user_message=request.message,
+                conversation_history=request.conversation_history or [],
+                location=location_task,
+                coordinates=_chat_coordinates(request)
+            ):
+                yield _sse_event(event, data)
+        except Exception as e:
+            print(f"流式聊天接口异常: {e}")
+            yield _sse_event("done", {
+                "message": f"抱歉，处理您的请求时出现错误：{str(e)}。请稍后重试。",
+                "restaurants": [],
+                "type": "error"
+            })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/recommend")
-async def recommend(request: FilterRequest):
-    """基于筛选条件推荐外卖"""
+async def recommend(request: FilterRequest, http_request: Request):
+    """基于筛选条件推荐外卖（支持cursor分页和fields字段投影，推荐理由只在第一页生成）"""
+    # 整个请求使用同一个数据快照，期间重新加载不影响本次请求
+    catalog = recommendation_engine.catalog
+    selected_fields = _parse_fields(request.fields, catalog)
+    paginated = request.cursor is not None or request.limit is not None
+    start = _parse_cursor(request.cursor)
+    if request.sort is not None and request.sort not in catalog.index.SORT_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序方式: {request.sort}")
+    page_stop = start + (request.limit or DEFAULT_PAGE_SIZE) if paginated else None
+    # 数据带坐标时只推荐配送半径内的餐厅；只有请求指定了 radius_km 而没有给出坐标时才等待客户端IP定位
+    radius_km = recommendation_engine.delivery_radius_km if request.radius_km is None else request.radius_km
+    latitude, longitude = request.latitude, request.longitude
+    if (latitude is None or longitude is None) and request.radius_km and catalog.index.spatial_index is not None:
+        location = await get_client_location(http_request, "recommend")
+        if isinstance(location, dict):
+            latitude, longitude = location.get("latitude"), location.get("longitude")
     try:
-        results = recommendation_engine.filter_restaurants(
-            cuisine=request.cuisine,
-            min_price=request.min_price,
-            max_price=request.max_price,
-            min_rating=request.min_rating,
-            max_delivery_time=request.max_delivery_time,
-            keyword=request.keyword
-        )
+        # 筛选和序列化在引擎线程池中执行，不阻塞事件循环上的流式聊天等请求
+        # 分页时只选出到本页为止的行（多取一行用于判断是否还有下一页，至少5行用于推荐理由），不对全部结果排序
+        with STAGE_SECONDS.time("recommend", "filter"):
+            rows = await recommendation_engine.filter_restaurant_rows_async(
+                catalog=catalog,
+                cuisine=request.cuisine,
+                min_price=request.min_price,
+                max_price=request.max_price,
+                min_rating=request.min_rating,
+                max_delivery_time=request.max_delivery_time,
+                keyword=request.keyword,
+                sort=request.sort,
+                budget=request.budget,
+                limit=max(page_stop + 1, 5) if paginated else None,
+                latitude=latitude,
+                longitude=longitude,
+                radius_km=radius_km
+            )
         
-        # 使用豆包API生成推荐理由
-        if results:
-            recommendations = await recommendation_engine.generate_recommendations(results[:5])
+        # 使用豆包API生成推荐理由（基于全部结果的前5家）
+        if len(rows) and start == 0:
+            with STAGE_SECONDS.time("recommend", "reasons"):
+                recommendations = await recommendation_engine.generate_recommendations(
+                    catalog.index.materialize(rows[:5])
+                )
         else:
             recommendations = []
-            
-        return {
-            "data": results,
-            "recommendations": recommendations
-        }
+        
+        # 只序列化当前页、所选字段，直接拼接成响应体
+        stop = min(page_stop, len(rows)) if paginated else len(rows)
+        with STAGE_SECONDS.time("recommend", "encode"):
+            data = await recommendation_engine.encode_restaurants_async(rows[start:stop], selected_fields, catalog)
+        body = b'{"data":[' + data
+        body += b'],"recommendations":' + dumps(recommendations)
+        if paginated:
+            body += b',"next_cursor":' + (b'"%d"' % stop if stop < len(rows) else b"null")
+        return Response(body + b"}", media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _require_admin(token: Optional[str]):
+    """管理接口鉴权：未配置 ADMIN_TOKEN 时管理接口不可用"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="管理接口未启用")
+    if not token or not hmac.compare_digest(token, admin_token):
+        raise HTTPException(status_code=401, detail="管理令牌无效")
+
+@app.post("/api/admin/catalog/reload")
+async def reload_catalog(x_admin_token: Optional[str] = Header(None)):
+    """重新加载餐厅数据（在工作线程中构建，完成后原子替换，不影响正在处理的请求）"""
+    _require_admin(x_admin_token)
+    try:
+        catalog = await recommendation_engine.reload_catalog_async()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重新加载失败: {e}")
+    return {"version": catalog.version, "restaurants": catalog.index.size}
+
+@app.post("/api/admin/restaurants")
+async def update_restaurants(changes: RestaurantChanges, x_admin_token: Optional[str] = Header(None)):
+    """增量新增/修改/删除餐厅（写入变更日志后立即生效，无需重新加载全部数据）"""
+    _require_admin(x_admin_token)
+    try:
+        catalog = await recommendation_engine.apply_changes_async(changes.model_dump())
+    except RestaurantNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version": catalog.version, "restaurants": catalog.index.size}
+
+@app.delete("/api/admin/restaurants/{restaurant_id}")
+async def delete_restaurant(restaurant_id: int, x_admin_token: Optional[str] = Header(None)):
+    """删除单个餐厅"""
+    _require_admin(x_admin_token)
+    try:
+        catalog = await recommendation_engine.apply_changes_async({"upsert": [], "delete": [restaurant_id]})
+    except RestaurantNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"version": catalog.version, "restaurants": catalog.index.size}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
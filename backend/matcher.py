@@ -0,0 +1,106 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import pandas as pd
+
+# 招牌菜字符串的分隔符（顿号、逗号、空白）
+DISH_SEPARATOR = re.compile(r'[、，,\s]+')
+
+
+class AhoCorasick:
+    """Aho–Corasick 多模式匹配自动机：一次线性扫描找出文本中出现的全部模式串"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        # 转移表压平成一个字典：(节点 << 21) | 字符码 -> 子节点，比每个节点一个字典省内存
+        self._goto: Dict[int, int] = {}
+        self._fail: List[int] = [0]
+        self._output: Dict[int, Tuple[int, ...]] = {}
+        children: List[List[int]] = [[]]
+
+        for pattern in dict.fromkeys(patterns):
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                key = (node << 21) | ord(ch)
+                child = self._goto.get(key)
+                if child is None:
+                    child = len(self._fail)
+                    self._goto[key] = child
+                    self._fail.append(0)
+                    children.append([])
+                    children[node].append(ord(ch))
+                node = child
+            self._output[node] = self._output.get(node, ()) + (len(self.patterns),)
+            self.patterns.append(pattern)
+
+        # 按层构建失败指针，并把失败链上的输出合并到当前节点
+        queue = deque(self._goto[code] for code in children[0])
+        while queue:
+            node = queue.popleft()
+            for code in children[node]:
+                child = self._goto[(node << 21) | code]
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ((fail << 21) | code) not in self._goto:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto.get((fail << 21) | code, 0)
+                inherited = self._output.get(self._fail[child])
+                if inherited:
+                    self._output[child] = self._output.get(child, ()) + inherited
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """依次产出 (起始位置, 模式串)"""
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            code = ord(ch)
+            while node and ((node << 21) | code) not in goto:
+                node = fail[node]
+            node = goto.get((node << 21) | code, 0)
+            for pattern_id in output.get(node, ()):
+                pattern = patterns[pattern_id]
+                yield i - len(pattern) + 1, pattern
+
+    def find(self, text: str) -> Set[str]:
+        """返回文本中出现过的全部模式串"""
+        return {pattern for _, pattern in self.iter_matches(text)}
+
+
+class IntentMatcher:
+    """启动时基于餐厅名、意图关键词和菜品名构建的匹配器，一次扫描完成意图提取"""
+
+    def __init__(self, df: pd.DataFrame, keywords: Iterable[str]):
+        self.keywords = set(keywords)
+
+        # 餐厅名 -> 行号（按小写匹配）
+        self.name_rows: Dict[str, List[int]] = {}
+        for row, name in enumerate(df["name"].fillna("").astype(str).str.lower()):
+            if name:
+                self.name_rows.setdefault(name, []).append(row)
+
+        # 招牌菜 -> 行号
+        self.dish_rows: Dict[str, List[int]] = {}
+        dishes = df["signature_dish"] if "signature_dish" in df.columns else pd.Series([""] * len(df))
+        for row, signature_dish in enumerate(dishes.fillna("").astype(str).str.lower()):
+            for dish in DISH_SEPARATOR.split(signature_dish):
+                if dish:
+                    self.dish_rows.setdefault(dish, []).append(row)
+
+        self.automaton = AhoCorasick(
+            list(self.name_rows) + sorted(self.keywords) + list(self.dish_rows)
+        )
+
+    def scan(self, text: str) -> Tuple[List[int], Set[str], List[int]]:
+        """扫描文本，返回 (提到的餐厅行号, 命中的关键词, 提到的菜品所属餐厅行号)，行号升序"""
+        name_rows: Set[int] = set()
+        keywords: Set[str] = set()
+        dish_rows: Set[int] = set()
+        for pattern in self.automaton.find(text.lower()):
+            name_rows.update(self.name_rows.get(pattern, ()))
+            dish_rows.update(self.dish_rows.get(pattern, ()))
+            if pattern in self.keywords:
+                keywords.add(pattern)
+        return sorted(name_rows), keywords, sorted(dish_rows)
@@ -0,0 +1,233 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+# 耗时直方图的默认桶（秒），覆盖从内存操作到大模型调用的范围
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """单调递增计数器，按标签值分组"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self.values.items())
+        for labels, value in sorted(values):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """累积分桶直方图；observe 只做一次二分查找和两次加法，适合放在请求路径上"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数（不累积，最后一个是+Inf）, 总和]
+        self.values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """记录 with 块的耗时（异常退出也记录）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        entry = self.values.get(labels)
+        return sum(entry[0]) if entry is not None else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(labels, list(entry[0]), entry[1]) for labels, entry in self.values.items()]
+        for labels, counts, total in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    """指标注册表：请求路径上直接更新的计数器/直方图，以及抓取时才读取的回调（缓存命中率等已有统计）"""
+
+    def __init__(self):
+        self.metrics: List = []
+        # 回调返回 [(指标名, 类型, 说明, [(标签字典, 值), ...]), ...]
+        self.collectors: List[Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"读取指标失败: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# 请求总耗时（按路由模板）
+REQUEST_SECONDS = REGISTRY.histogram(
+    "food_http_request_duration_seconds", "HTTP请求耗时（秒）", ("method", "route", "status")
+)
+# 请求内部各阶段耗时：location / restaurants / summary / prompt / llm / llm_first_token / extract / images / fallback / filter / reasons / encode
+STAGE_SECONDS = REGISTRY.histogram(
+    "food_stage_duration_seconds", "请求各阶段耗时（秒）", ("endpoint", "stage")
+)
+# 上游调用（doubao / ipapi）：状态为HTTP状态码、timeout、cancelled 或 error
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "food_upstream_requests_total", "上游接口调用次数", ("upstream", "status")
+)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "food_upstream_duration_seconds", "上游接口调用耗时（秒）", ("upstream",)
+)
+# 备用推荐路径（大模型不可用或出错时按关键词推荐，或使用默认推荐理由）
+FALLBACKS = REGISTRY.counter(
+    "food_fallback_total", "走备用推荐路径的次数", ("endpoint", "reason")
+)
+
+
+@contextmanager
+def track_upstream(upstream: str):
+    """记录一次上游调用的耗时和结果；with 块内把HTTP状态码写入 call["status"]"""
+    call: Dict[str, object] = {"status": "error"}
+    started = time.perf_counter()
+    try:
+        yield call
+    except httpx.TimeoutException:
+        call["status"] = "timeout"
+        raise
+    except asyncio.CancelledError:
+        # 外层 wait_for 超时或客户端断开
+        call["status"] = "cancelled"
+        raise
+    finally:
+        UPSTREAM_REQUESTS.inc(upstream, str(call["status"]))
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream)
+
+
+class RequestTimer:
+    """ASGI中间件：按 (方法, 路由模板, 状态码) 记录请求耗时；流式响应计到最后一段发送完"""
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 路由匹配后 scope 中带有路由对象，用路径模板避免路径参数导致标签数量无限增长
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.histogram.observe(time.perf_counter() - started, scope["method"], route, str(status))
+
+
+def cache_family(name: str, caches: Dict[str, Optional[Dict]]) -> List[Tuple]:
+    """把各缓存的 stats()（hits/misses/size）转换成抓取时的指标"""
+    hits, misses, sizes = [], [], []
+    for cache, stats in caches.items():
+        if not stats:
+            continue
+        labels = {"cache": cache}
+        hits.append((labels, stats.get("hits")))
+        misses.append((labels, stats.get("misses")))
+        sizes.append((labels, stats.get("size")))
+    return [
+        (f"{name}_hits_total", "counter", "缓存命中次数", hits),
+        (f"{name}_misses_total", "counter", "缓存未命中次数", misses),
+        (f"{name}_entries", "gauge", "缓存条目数", sizes),
+    ]
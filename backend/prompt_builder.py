@@ -0,0 +1,252 @@
+import math
+import os
+import re
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# 中日韩文字和全角符号按每字1个token估算（中文分词器通常1~1.5字一个token，偏保守），
+# 其余非空白字符按每3个1个token估算，空白不计
+_WIDE_CHARS = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+_SPACES = re.compile(r"\s")
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD = 4
+
+# 餐厅行中简介保留的字数
+DESCRIPTION_CHARS = 20
+# 超出预算时也至少保留的餐厅数
+MIN_RESTAURANTS = 3
+# 单条历史消息最多保留的token数（过长的AI回复只保留开头）
+MESSAGE_TOKENS = 200
+# 被裁掉的历史中每条用户消息在摘要里保留的字数
+SUMMARY_CHARS = 24
+# 有历史被裁掉时为摘要预留的token数（不超过历史预算的1/4）
+SUMMARY_TOKENS = 80
+
+# 提示词中餐厅行的列（每行用"|"分隔）
+RESTAURANT_COLUMNS = "编号|店名|菜系|人均(元)|评分|配送(分钟)|简介|招牌菜"
+
+SYSTEM_PROMPT = """你是一个专业的外卖推荐助手，位于{location}。你的任务是理解用户的需求，并从以下餐厅列表中推荐合适的餐厅。
+
+可用餐厅列表（每行：{columns}）：
+{restaurants}
+{history_summary}
+重要提示：
+1. 必须严格匹配用户的需求。如果用户说"烧烤"，只能推荐包含"烤"字的餐厅（如韩式烤肉、烤鸭等）
+2. 如果用户提到价格范围（如"人均100左右"），必须推荐价格在范围内的餐厅
+3. 优先推荐完全匹配的餐厅，如果没有完全匹配的，再考虑相似类型
+4. **只推荐1家最符合需求的餐厅**（最重要的一条！）
+
+请根据用户的对话内容，理解他们的需求（如菜系、价格、口味、配送时间等），然后：
+1. 用自然、友好的语言回复用户
+2. **只推荐1家最符合需求的餐厅**（必须严格匹配用户需求）
+3. 说明推荐理由
+
+回复格式要求：
+- 第一段：理解用户需求并友好回复
+- 第二段：推荐餐厅（必须在回复中明确提到餐厅名称，不要提编号，格式：餐厅名（菜系）- 价格 - 评分 - 配送时间 - 推荐理由）
+- 保持对话自然流畅，像朋友聊天一样
+
+如果用户的需求不明确，可以询问更多细节。"""
+
+
+def estimate_tokens(text: str) -> int:
+    """估算一段文本的token数（不调用分词器）"""
+    if not text:
+        return 0
+    wide = len(_WIDE_CHARS.findall(text))
+    narrow = len(text) - wide - len(_SPACES.findall(text))
+    return wide + math.ceil(narrow / 3)
+
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    """截断到估算不超过 tokens 个token，被截断时末尾加"…" """
+    if estimate_tokens(text) <= tokens:
+        return text
+    if tokens <= 1:
+        return ""
+    # 每个非空白字符至少1/3个token，只需检查开头这一段
+    text = text[:tokens * 3 + 64]
+    used = 0.0
+    for i, char in enumerate(text):
+        if _WIDE_CHARS.match(char):
+            used += 1
+        elif not char.isspace():
+            used += 1 / 3
+        if used > tokens - 1:
+            return text[:i] + "…"
+    return text
+
+
+def _compact(value, limit: Optional[int] = None) -> str:
+    """餐厅字段的紧凑写法：整数去掉小数点，去掉分隔符和换行，可截断"""
+    if value is None or value != value:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = " ".join(str(value).replace("|", "/").split())
+    if limit is not None and len(text) > limit:
+        text = text[:limit] + "…"
+    return text
+
+
+def encode_restaurant(number: int, restaurant: Dict) -> str:
+    """提示词中的一行餐厅信息（列见 RESTAURANT_COLUMNS）"""
+    return "|".join([
+        str(number),
+        _compact(restaurant.get("name")),
+        _compact(restaurant.get("cuisine")),
+        _compact(restaurant.get("price")),
+        _compact(restaurant.get("rating")),
+        _compact(restaurant.get("delivery_time")),
+        _compact(restaurant.get("description"), DESCRIPTION_CHARS),
+        _compact(restaurant.get("signature_dish")),
+    ])
+
+
+class PromptBuilder:
+    """按token预算构建聊天推荐的消息列表，并统计每次请求的提示词大小
+
+    预算依次分配给：系统提示词固定部分和当前消息、至少 MIN_RESTAURANTS 家餐厅、
+    最近的对话历史（不超过 history_budget，更早的用户消息压缩成一行摘要）、其余餐厅（按相关度从高到低）。
+    """
+
+    def __init__(
+        self,
+        budget: Optional[int] = None,
+        history_budget: Optional[int] = None,
+        history_messages: Optional[int] = None,
+        window: int = 500
+    ):
+        self.budget = budget if budget is not None else int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+        self.history_budget = history_budget if history_budget is not None else int(os.getenv("PROMPT_HISTORY_TOKENS", "800"))
+        self.history_messages = history_messages if history_messages is not None else int(os.getenv("PROMPT_HISTORY_MESSAGES", "10"))
+        # 最近的请求，用于计算分位数
+        self.recent: deque = deque(maxlen=window)
+        self.requests = 0
+        self.over_budget = 0
+        self.totals = {"tokens": 0, "restaurants": 0, "restaurants_dropped": 0, "history_messages": 0, "history_summarized": 0}
+
+    def _fit_history(self, history: List[dict], budget: int) -> Tuple[List[dict], int, str]:
+        """从最新的消息往前保留，放不下的更早的用户消息压缩成摘要，返回 (保留的消息, 裁掉的条数, 摘要)"""
+        messages = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in history
+            if isinstance(msg, dict) and msg.get("role") in ("user", "assistant") and isinstance(msg.get("content"), str)
+        ]
+        recent = messages[-self.history_messages:] if self.history_messages > 0 else []
+        contents = [truncate_tokens(msg["content"], MESSAGE_TOKENS) for msg in recent]
+        costs = [estimate_tokens(content) + MESSAGE_OVERHEAD for content in contents]
+
+        def fit(limit: int) -> int:
+            """从最新的消息往前能放下的条数"""
+            used, count = 0, 0
+            for cost in reversed(costs):
+                if used + cost > limit:
+                    break
+                used, count = used + cost, count + 1
+            return count
+
+        count = fit(budget)
+        if count < len(messages):
+            # 有消息被裁掉时给摘要留出一部分预算
+            count = fit(budget - min(SUMMARY_TOKENS, budget // 4))
+        start = len(messages) - count
+        kept = [
+            {"role": msg["role"], "content": content}
+            for msg, content in zip(recent[len(recent) - count:], contents[len(recent) - count:])
+        ]
+        used = sum(costs[len(costs) - count:])
+
+        # 最近的用户消息在前，摘要只用剩余的历史预算
+        earlier = [
+            _compact(msg["content"][:SUMMARY_CHARS * 4], SUMMARY_CHARS)
+            for msg in reversed(messages[max(0, start - 50):start]) if msg["role"] == "user"
+        ]
+        summary = ""
+        remaining = budget - used
+        for text in earlier:
+            candidate = f"{summary}；{text}" if summary else text
+            if not text or estimate_tokens(candidate) + 12 > remaining:
+                continue
+            summary = candidate
+        if summary:
+            summary = f"\n此前对话中用户提到（由近到远）：{summary}\n"
+        return kept, start, summary
+
+    def build(
+        self,
+        user_message: str,
+        conversation_history: List[dict],
+        location: str,
+        restaurant_summary: str
+    ) -> Tuple[List[dict], Dict]:
+        """构建消息列表（系统提示词 + 对话历史 + 当前消息），返回 (消息列表, 本次提示词统计)；
+        restaurant_summary 每行一家餐厅，按相关度从高到低"""
+        lines = [line for line in restaurant_summary.split("\n") if line]
+        line_tokens = [estimate_tokens(line) + 1 for line in lines]
+        fixed = (
+            estimate_tokens(SYSTEM_PROMPT.format(location=location, columns=RESTAURANT_COLUMNS, restaurants="", history_summary=""))
+            + estimate_tokens(user_message) + 2 * MESSAGE_OVERHEAD
+        )
+        reserved = sum(line_tokens[:MIN_RESTAURANTS])
+        history, summarized, history_summary = self._fit_history(
+            conversation_history or [],
+            max(0, min(self.history_budget, self.budget - fixed - reserved))
+        )
+        history_tokens = sum(estimate_tokens(msg["content"]) + MESSAGE_OVERHEAD for msg in history)
+        used = fixed + history_tokens + estimate_tokens(history_summary)
+
+        count = 0
+        for cost in line_tokens:
+            if count >= MIN_RESTAURANTS and used + cost > self.budget:
+                break
+            used += cost
+            count += 1
+
+        system_prompt = SYSTEM_PROMPT.format(
+            location=location,
+            columns=RESTAURANT_COLUMNS,
+            restaurants="\n".join(lines[:count]),
+            history_summary=history_summary
+        )
+        messages = [{"role": "system", "content": system_prompt}] + history + [{"role": "user", "content": user_message}]
+        stats = {
+            "tokens": used,
+            "system_tokens": used - history_tokens - estimate_tokens(user_message) - MESSAGE_OVERHEAD,
+            "history_tokens": history_tokens,
+            "restaurants": count,
+            "restaurants_dropped": len(lines) - count,
+            "history_messages": len(history),
+            "history_summarized": summarized,
+        }
+        self.record(stats)
+        return messages, stats
+
+    def record(self, stats: Dict):
+        self.requests += 1
+        self.recent.append(stats["tokens"])
+        if stats["tokens"] > self.budget:
+            self.over_budget += 1
+        for key in self.totals:
+            self.totals[key] += stats[key]
+
+    def stats(self) -> Dict:
+        recent = sorted(self.recent)
+
+        def percentile(q: float) -> int:
+            return recent[min(len(recent) - 1, int(len(recent) * q))] if recent else 0
+
+        requests = max(self.requests, 1)
+        return {
+            "budget": self.budget,
+            "requests": self.requests,
+            "over_budget": self.over_budget,
+            "mean_tokens": round(self.totals["tokens"] / requests, 1),
+            "p50_tokens": percentile(0.5),
+            "p95_tokens": percentile(0.95),
+            "max_tokens": recent[-1] if recent else 0,
+            "mean_restaurants": round(self.totals["restaurants"] / requests, 1),
+            "restaurants_dropped": self.totals["restaurants_dropped"],
+            "history_messages": self.totals["history_messages"],
+            "history_summarized": self.totals["history_summarized"],
+        }
@@ -1,161 +1,615 @@
 import pandas as pd
+import asyncio
+import json
 import os
-from typing import List, Dict, Optional
-import httpx
+import threading
+import time
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import AsyncIterator, Awaitable, List, Dict, Optional, Set, Tuple, Union
+import numpy as np
 import re
-from doubao_api import DoubaoAPI
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有flock，只能单进程运行
+    fcntl = None
+from doubao_api import DoubaoAPI, DoubaoAPIError
+from catalog_index import CatalogIndex
+from matcher import IntentMatcher
+from dish_images import DishImageResolver
+from catalog_json import CatalogJSONSnapshot
+from catalog_store import catalog_is_fresh, load_catalog, write_catalog
+from scoring import DEFAULT_WEIGHTS, parse_weights, score_rows, top_k
+from prompt_builder import PromptBuilder, encode_restaurant
+from sample_data import create_sample_data
+from metrics import FALLBACKS, STAGE_SECONDS
+
+# 菜系关键词（更精确的匹配）
+CUISINE_KEYWORDS = {
+    '烧烤': ['烧烤', '烤肉', '烤串', '烤'],
+    '川菜': ['川菜', '川', '辣', '麻', '火锅'],
+    '湘菜': ['湘菜', '湘', '湖南'],
+    '粤菜': ['粤菜', '粤', '广东', '广式'],
+    '日式': ['日式', '日', '拉面', '寿司'],
+    '韩式': ['韩式', '韩', '烤肉'],
+    '快餐': ['快餐', '快', '便当', '盒饭'],
+    '面食': ['面食', '面', '馄饨', '饺子', '包子'],
+    '火锅': ['火锅'],
+    '京菜': ['京菜', '北京', '烤鸭']
+}
+
+# 意图匹配器中的全部关键词
+INTENT_KEYWORDS = set(CUISINE_KEYWORDS) | {k for keywords in CUISINE_KEYWORDS.values() for k in keywords}
+
+# 价格表达：xx元/xx块、人均xx、xx左右
+PRICE_PATTERN = re.compile(r'(\d+)\s*[元块]|人均\s*(\d+)|(\d+)\s*左右')
+
+def _parse_target_price(message: str) -> Optional[int]:
+    """提取消息中的第一个价格"""
+    for match in PRICE_PATTERN.findall(message):
+        for price in match:
+            if price:
+                return int(price)
+    return None
+
+def _bbq_mask(df: pd.DataFrame) -> np.ndarray:
+    """名称、描述或招牌菜中包含"烤"字的餐厅"""
+    mask = np.zeros(len(df), dtype=bool)
+    for column in ("name", "description", "signature_dish"):
+        if column in df.columns:
+            mask |= df[column].fillna("").astype(str).str.contains('烤', regex=False).to_numpy()
+    return mask
+
+def _build_dish_image_columns(df: pd.DataFrame, image_resolver: DishImageResolver) -> Tuple[List[str], np.ndarray]:
+    """每种招牌菜只解析一次，返回 (URL表, 形状为(2, 行数)的URL编码)"""
+    dish_codes, dishes = pd.factorize(df["signature_dish"].fillna("").astype(str))
+    url_codes: Dict[str, int] = {}
+    pair_codes = np.empty((2, len(dishes)), dtype=np.int16)
+    for i, signature_dish in enumerate(dishes):
+        for j, url in enumerate(image_resolver.images_for(signature_dish)):
+            pair_codes[j, i] = url_codes.setdefault(url, len(url_codes))
+    return list(url_codes), pair_codes[:, dish_codes]
+
+def _build_restaurant_summary(restaurants: List[Dict]) -> str:
+    """构建系统提示词中的餐厅信息摘要（每行一家的紧凑编码，顺序即相关度）"""
+    return "\n".join(encode_restaurant(i + 1, r) for i, r in enumerate(restaurants))
+
+def _describe_location(location: Union[str, Dict]) -> str:
+    """提示词中的位置描述：定位结果为字典时取城市名"""
+    if isinstance(location, str):
+        return location
+    city = location.get("city")
+    return f"{city}市" if city and city != "未知" else "您所在的城市"
+
+class RestaurantNotFoundError(ValueError):
+    """要删除的餐厅不存在"""
+    def __init__(self, ids: List):
+        super().__init__(f"餐厅不存在: {', '.join(str(i) for i in ids)}")
+        self.ids = ids
+
+class CatalogSnapshot:
+    """某个数据版本的餐厅数据及其全部派生结构；发布后只读，更新时生成新快照整体替换"""
+    
+    # 新增餐厅必须提供的字段
+    REQUIRED_FIELDS = ("id", "name", "cuisine", "price", "rating", "delivery_time", "description")
+    NUMERIC_FIELDS = ("price", "rating", "delivery_time", "latitude", "longitude")
+    
+    def __init__(
+        self,
+        df: Optional[pd.DataFrame],
+        version: int,
+        image_resolver: DishImageResolver,
+        index: Optional[CatalogIndex] = None,
+        columns: Optional[List[str]] = None
+    ):
+        self.version = version
+        self.image_resolver = image_resolver
+        # 构建列式索引，筛选时直接在预排序数组上查询
+        self.index = index if index is not None else CatalogIndex(df)
+        self.columns = list(columns if columns is not None else df.columns)
+        if df is not None:
+            self.df = df
+        # /api/restaurants 的预序列化JSON快照，首次请求时构建
+        self._json_snapshot: Optional[CatalogJSONSnapshot] = None
+    
+    # 以下派生结构在首次使用时构建；完整加载时在发布前预先构建，增量更新后在后台线程中补建
+    
+    @cached_property
+    def df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.index.records, columns=self.columns)
+    
+    @cached_property
+    def intent_matcher(self) -> IntentMatcher:
+        # 餐厅名/关键词/菜品的多模式匹配器，聊天意图提取只需一次扫描
+        return IntentMatcher(self.df, INTENT_KEYWORDS)
+    
+    @cached_property
+    def bbq_mask(self) -> np.ndarray:
+        return _bbq_mask(self.df)
+    
+    @cached_property
+    def row_by_id(self) -> Dict:
+        return {record.get("id"): row for row, record in enumerate(self.index.records)}
+    
+    @cached_property
+    def dish_image_columns(self) -> Tuple[List[str], np.ndarray]:
+        # 按招牌菜预先解析两张图片，存成URL表 + 每行的int16编码列
+        return _build_dish_image_columns(self.df, self.image_resolver)
+    
+    @cached_property
+    def bbq_rank_rows(self) -> np.ndarray:
+        # 含"烤"字的餐厅按默认排序（评分降序、价格升序）的行号，烧烤意图时补足提示词中的餐厅；
+        # 其他意图直接取索引中的 rank_order，每轮对话不再遍历全部餐厅
+        return self.index.rank_order[self.bbq_mask[self.index.rank_order]]
+    
+    @cached_property
+    def longest_name(self) -> int:
+        return max((len(str(record.get("name"))) for record in self.index.records), default=1)
+    
+    def warm(self):
+        """预先构建全部派生结构（JSON快照除外）"""
+        for name in ("df", "intent_matcher", "bbq_mask", "row_by_id", "dish_image_columns", "bbq_rank_rows", "longest_name"):
+            getattr(self, name)
+    
+    def _validate(self, restaurant: Dict, base: Optional[Dict]) -> Dict:
+        """校验并合并一条餐厅更新（已有餐厅可只传需要修改的字段）"""
+        unknown = [field for field in restaurant if field not in self.columns]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}")
+        if base is None:
+            missing = [field for field in self.REQUIRED_FIELDS if field in self.columns and restaurant.get(field) is None]
+            if missing:
+                raise ValueError(f"新增餐厅缺少字段: {', '.join(missing)}")
+            merged = {field: None if field in self.NUMERIC_FIELDS else "" for field in self.columns}
+        else:
+            merged = dict(base)
+        merged.update(restaurant)
+        for field in self.NUMERIC_FIELDS:
+            value = merged.get(field)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise ValueError(f"字段 {field} 必须是数字")
+        return merged
+    
+    def _coerce_id(self, restaurant_id):
+        """把id转换成数据中id的类型（整数id的数据收到 "5" 时按 5 处理），无法转换时原样返回"""
+        sample = next(iter(self.row_by_id), None)
+        if isinstance(restaurant_id, bool) or isinstance(sample, bool):
+            return restaurant_id
+        if isinstance(sample, (int, np.integer)) and isinstance(restaurant_id, str):
+            try:
+                return int(restaurant_id.strip())
+            except ValueError:
+                return restaurant_id
+        if isinstance(sample, str) and isinstance(restaurant_id, int):
+            return str(restaurant_id)
+        return restaurant_id
+    
+    def apply_changes(self, batches: List[Dict], version: int, strict: bool = False) -> "CatalogSnapshot":
+        """按顺序应用变更批次（每批 {"upsert": [...], "delete": [...]}，批内先更新后删除），返回新快照
+
+        strict 为True时删除不存在的餐厅抛出 RestaurantNotFoundError（重放变更日志时忽略）。
+        """
+        row_by_id = self.row_by_id
+        records = self.index.records
+        # 同一餐厅的多次变更先合并，最后一次生效（None表示删除）
+        pending: Dict = {}
+        missing = []
+        for batch in batches:
+            for restaurant in batch.get("upsert") or []:
+                if "id" not in restaurant:
+                    raise ValueError("餐厅缺少id")
+                restaurant_id = self._coerce_id(restaurant["id"])
+                restaurant = dict(restaurant, id=restaurant_id)
+                base = pending.get(restaurant_id) if restaurant_id in pending else (
+                    records[row_by_id[restaurant_id]] if restaurant_id in row_by_id else None
+                )
+                pending[restaurant_id] = self._validate(restaurant, base)
+            for restaurant_id in batch.get("delete") or []:
+                restaurant_id = self._coerce_id(restaurant_id)
+                exists = pending[restaurant_id] is not None if restaurant_id in pending else restaurant_id in row_by_id
+                if not exists:
+                    missing.append(restaurant_id)
+                pending[restaurant_id] = None
+        if strict and missing:
+            raise RestaurantNotFoundError(missing)
+        
+        new_records = list(records)
+        removed, updated, appended = [], [], []
+        for restaurant_id, restaurant in pending.items():
+            row = row_by_id.get(restaurant_id)
+            if restaurant is None:
+                if row is not None:
+                    removed.append(row)
+            elif row is None:
+                appended.append(restaurant)
+            else:
+                new_records[row] = restaurant
+                updated.append(row)
+        removed.sort()
+        for row in reversed(removed):
+            del new_records[row]
+        kept = len(new_records)
+        new_records.extend(appended)
+        
+        # 被修改的行在删除之后的新行号 = 旧行号 - 排在它前面的被删除行数
+        updated_rows = np.asarray(updated, dtype=np.int64)
+        updated_rows -= np.searchsorted(np.asarray(removed, dtype=np.int64), updated_rows)
+        changed = np.concatenate([updated_rows, np.arange(kept, len(new_records))]).astype(np.int64)
+        index = self.index.patched(new_records, np.asarray(removed, dtype=np.int64), changed)
+        
+        catalog = CatalogSnapshot(None, version, self.image_resolver, index=index, columns=self.columns)
+        # id -> 行号：没有删除时在旧映射上增量维护
+        if not removed:
+            if appended:
+                row_by_id = dict(row_by_id)
+                row_by_id.update((restaurant["id"], kept + i) for i, restaurant in enumerate(appended))
+            catalog.row_by_id = row_by_id
+        return catalog
+    
+    def json_snapshot(self) -> CatalogJSONSnapshot:
+        if self._json_snapshot is None:
+            self._json_snapshot = CatalogJSONSnapshot(self.index.records, self.columns)
+        return self._json_snapshot
+    
+    def parse_fields(self, fields) -> Optional[List[str]]:
+        """解析字段投影（逗号分隔的字符串或列表），未指定时返回None，包含未知字段时抛出ValueError"""
+        if fields is None:
+            return None
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        selected = list(dict.fromkeys(field.strip() for field in fields if field.strip()))
+        unknown = [field for field in selected if field not in self.columns]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}")
+        return selected or None
+    
+    def encode_rows(self, rows, fields: Optional[List[str]] = None) -> bytes:
+        """按行号把餐厅序列化为JSON对象列表（不含外层方括号），只读取所选字段"""
+        return self.json_snapshot().encode_rows(rows, fields)
 
 class RecommendationEngine:
     def __init__(self):
-        # 加载数据集
-        data_path = os.path.join(os.path.dirname(__file__), "data", "restaurants.csv")
-        if os.path.exists(data_path):
-            self.df = pd.read_csv(data_path, encoding='utf-8-sig')
-        else:
-            # 如果没有数据集，使用示例数据
-            self.df = self._create_sample_data()
-            # 确保数据目录存在
-            os.makedirs(os.path.join(os.path.dirname(__file__), "data"), exist_ok=True)
-            self.df.to_csv(data_path, index=False, encoding='utf-8-sig')
+        data_dir = os.path.join(os.path.dirname(__file__), "data")
+        self.data_path = os.path.join(data_dir, "restaurants.csv")
+        # 编译好的列式文件（python catalog_store.py 生成），存在且不比CSV旧时用mmap加载
+        self.binary_path = os.getenv("CATALOG_BINARY_PATH", os.path.join(data_dir, "restaurants.rcat"))
+        # 行级变更的追加日志：启动和重新加载时在数据文件之上重放，条数达到阈值后在后台合并进数据文件
+        self.changelog_path = os.getenv("CATALOG_CHANGELOG_PATH", os.path.join(data_dir, "restaurants.changes.jsonl"))
+        self.compact_threshold = int(os.getenv("CATALOG_COMPACT_THRESHOLD", "1000"))
+        self._changelog_entries = 0
+        # 当前快照已包含的变更日志字节数，之后追加的批次由 sync_catalog 增量应用
+        self._changelog_offset = 0
+        self._maintenance: Optional[asyncio.Task] = None
+        
+        # 招牌菜图片解析器（映射表和匹配结构只构建一次）
+        self.image_resolver = DishImageResolver()
+        
+        # 当前数据快照：请求开始时读取一次引用，重新加载或更新时整体替换，读路径无需加锁
+        self._write_lock = threading.Lock()
+        self._catalog_signature = self._source_signature()
+        self.catalog = self._build_snapshot(self._read_catalog(), 1, replay=True)
+        
+        # CPU密集的筛选/序列化/意图提取放到有界线程池中执行，避免阻塞事件循环上的其他请求；
+        # 这些代码持有GIL，线程池只隔离延迟、不增加吞吐量（多核靠 serve.py 多进程）
+        self.max_workers = int(os.getenv("ENGINE_WORKERS", "4"))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        
+        # 客户端给出坐标、但没有指定半径时使用的配送半径（公里），数据带坐标时只推荐这个范围内的餐厅；0 表示不限
+        # IP定位通常只精确到城市中心，不用于按半径筛选
+        self.delivery_radius_km = float(os.getenv("DELIVERY_RADIUS_KM", "5"))
+        
+        # 聊天时按向量相似度召回、放进提示词的餐厅数
+        self.chat_candidates = int(os.getenv("CHAT_CANDIDATES", "30"))
+        # 相对阈值：只召回相似度不低于最高相似度这个比例的餐厅，不足 CHAT_CANDIDATES 家时按默认排序（评分降序、价格升序）补足
+        self.chat_min_ratio = float(os.getenv("CHAT_MIN_SIMILARITY_RATIO", "0.5"))
+        # 聊天提示词的token预算（PROMPT_TOKEN_BUDGET 等），超出时先裁对话历史、再裁相关度低的餐厅
+        self.prompt_builder = PromptBuilder()
+        
+        # sort=score 及备用推荐使用的综合打分权重
+        try:
+            self.score_weights = parse_weights(os.getenv("SCORE_WEIGHTS"))
+        except ValueError as e:
+            print(f"{e}，使用默认权重")
+            self.score_weights = dict(DEFAULT_WEIGHTS)
         
         # 延迟初始化豆包API，避免配置错误时立即失败
         self.doubao_api = None
+        # 推荐理由生成模式：fanout（每家餐厅一次并发请求）或 batch（一次请求生成全部）
+        self.reason_mode = os.getenv("RECOMMENDATION_REASON_MODE", "fanout").lower()
     
-    def _create_sample_data(self) -> pd.DataFrame:
-        """创建示例数据集"""
-        data = {
-            "id": range(1, 51),
-            "name": [
-                "川味小厨", "湘味轩", "粤式茶餐厅", "东北饺子王", "新疆大盘鸡",
-                "重庆小面", "兰州拉面", "沙县小吃", "黄焖鸡米饭", "麻辣香锅",
-                "日式拉面屋", "韩式烤肉", "泰式料理", "意式披萨", "法式西餐",
-                "麦当劳", "肯德基", "必胜客", "星巴克", "一点点",
-                "海底捞火锅", "小龙坎", "大龙燚", "呷哺呷哺", "小肥羊",
-                "老乡鸡", "真功夫", "永和大王", "李先生", "和合谷",
-                "西贝莜面村", "外婆家", "绿茶餐厅", "南京大牌档", "眉州东坡",
-                "全聚德", "便宜坊", "东来顺", "护国寺小吃", "庆丰包子铺",
-                "杨国福麻辣烫", "张亮麻辣烫", "小杨生煎", "阿香米线", "味千拉面",
-                "吉野家", "食其家", "丸龟制面", "萨莉亚", "达美乐披萨"
-            ],
-            "cuisine": [
-                "川菜", "湘菜", "粤菜", "东北菜", "新疆菜",
-                "川菜", "面食", "快餐", "快餐", "川菜",
-                "日式", "韩式", "泰式", "意式", "法式",
-                "快餐", "快餐", "快餐", "饮品", "饮品",
-                "火锅", "火锅", "火锅", "火锅", "火锅",
-                "快餐", "快餐", "快餐", "快餐", "快餐",
-                "西北菜", "杭帮菜", "江浙菜", "江浙菜", "川菜",
-                "京菜", "京菜", "京菜", "京菜", "京菜",
-                "麻辣烫", "麻辣烫", "江浙菜", "快餐", "日式",
-                "日式", "日式", "日式", "意式", "意式"
-            ],
-            "price": [
-                45, 52, 68, 38, 55, 25, 22, 20, 28, 58,
-                48, 85, 72, 65, 120, 35, 38, 55, 40, 25,
-                95, 88, 92, 75, 85, 35, 32, 28, 25, 30,
-                75, 65, 58, 72, 68, 150, 85, 120, 35, 25,
-                32, 28, 25, 22, 45, 38, 35, 42, 48, 62
-            ],
-            "rating": [
-                4.5, 4.6, 4.7, 4.4, 4.5, 4.3, 4.2, 4.0, 4.1, 4.6,
-                4.4, 4.5, 4.6, 4.5, 4.8, 4.2, 4.3, 4.4, 4.5, 4.3,
-                4.7, 4.6, 4.7, 4.5, 4.6, 4.3, 4.2, 4.1, 4.0, 4.2,
-                4.6, 4.5, 4.4, 4.7, 4.6, 4.8, 4.5, 4.7, 4.2, 4.1,
-                4.3, 4.2, 4.4, 4.1, 4.3, 4.2, 4.1, 4.3, 4.4, 4.5
-            ],
-            "delivery_time": [
-                35, 40, 45, 30, 50, 25, 28, 20, 30, 40,
-                35, 45, 50, 40, 60, 30, 35, 45, 25, 20,
-                50, 55, 60, 45, 50, 30, 28, 25, 25, 30,
-                45, 40, 35, 50, 45, 60, 40, 55, 30, 25,
-                30, 28, 25, 30, 35, 32, 30, 35, 38, 45
-            ],
-            "description": [
-                "正宗川味，麻辣鲜香", "湖南风味，香辣下饭", "广式茶点，精致美味", "东北风味，分量十足", "新疆特色，大盘实惠",
-                "重庆小面，麻辣过瘾", "兰州拉面，汤鲜味美", "沙县小吃，经济实惠", "黄焖鸡米饭，嫩滑香浓", "麻辣香锅，食材丰富",
-                "日式拉面，汤底浓郁", "韩式烤肉，肉质鲜嫩", "泰式料理，酸甜开胃", "意式披萨，芝士拉丝", "法式西餐，精致浪漫",
-                "快餐连锁，方便快捷", "炸鸡汉堡，经典美味", "披萨意面，多种选择", "咖啡饮品，提神醒脑", "奶茶果茶，香甜可口",
-                "火锅连锁，服务贴心", "重庆火锅，麻辣鲜香", "四川火锅，地道正宗", "台式火锅，清淡健康", "内蒙古火锅，羊肉鲜嫩",
-                "中式快餐，营养搭配", "蒸菜快餐，健康美味", "台式快餐，米饭配菜", "牛肉面，汤鲜肉烂", "日式快餐，精致美味",
-                "西北风味，面食丰富", "杭帮菜，清淡精致", "江浙菜，甜咸适中", "南京风味，鸭血粉丝", "川菜连锁，菜品丰富",
-                "北京烤鸭，皮脆肉嫩", "焖炉烤鸭，别有风味", "涮羊肉，肉质鲜嫩", "北京小吃，种类丰富", "包子铺，馅料多样",
-                "麻辣烫，自选食材", "麻辣烫连锁，口味统一", "生煎包，皮薄馅大", "米线，汤鲜味美", "日式拉面，汤底浓郁",
-                "日式快餐，牛肉饭", "日式快餐，多种套餐", "日式面食，乌冬面", "意式快餐，经济实惠", "披萨连锁，外送快速"
-            ],
-            "signature_dish": [
-                "麻婆豆腐、水煮鱼、宫保鸡丁", "剁椒鱼头、口味虾、小炒肉", "虾饺、烧卖、叉烧包", "猪肉大葱饺子、锅包肉、地三鲜", "大盘鸡、羊肉串、手抓饭",
-                "重庆小面、豌杂面、红油抄手", "牛肉拉面、羊肉拉面、凉拌牛肉", "扁肉、拌面、蒸饺", "黄焖鸡米饭、黄焖排骨", "麻辣香锅、干锅牛蛙",
-                "豚骨拉面、味增拉面、日式炸鸡", "韩式烤肉、石锅拌饭、泡菜汤", "冬阴功汤、泰式咖喱、芒果糯米饭", "玛格丽特披萨、意大利面、提拉米苏", "牛排、鹅肝、法式蜗牛",
-                "巨无霸、薯条、麦乐鸡", "原味鸡、香辣鸡腿堡、蛋挞", "超级至尊披萨、意式肉酱面", "拿铁、美式咖啡、星冰乐", "珍珠奶茶、四季春茶、波霸奶茶",
-                "毛肚、虾滑、牛肉片", "麻辣牛肉、鸭肠、脑花", "嫩牛肉、黄喉、毛肚", "肥牛、蔬菜拼盘、虾滑", "羊肉片、羊蝎子、手切羊肉",
-                "鸡汤、蒸蛋、小菜", "蒸蛋、蒸排骨、蒸鸡", "卤肉饭、豆浆、油条", "牛肉面、小菜", "日式套餐、味增汤",
-                "莜面、羊肉串、凉皮", "西湖醋鱼、东坡肉、龙井虾仁", "糖醋里脊、白切鸡、小笼包", "鸭血粉丝汤、盐水鸭、小笼包", "东坡肉、麻婆豆腐、宫保鸡丁",
-                "北京烤鸭、鸭架汤、京酱肉丝", "焖炉烤鸭、炸酱面", "涮羊肉、芝麻烧饼", "豆汁、焦圈、驴打滚", "猪肉大葱包子、三鲜包子",
-                "麻辣烫、自选配菜", "麻辣烫、自选配菜", "生煎包、小笼包", "过桥米线、酸辣米线", "味千拉面、日式炸鸡",
-                "牛肉饭、照烧鸡排饭", "牛丼饭、咖喱饭", "乌冬面、天妇罗", "意式肉酱面、披萨", "经典披萨、意式香肠披萨"
-            ],
-            "reviews": [
-                "味道正宗，麻辣鲜香！|分量很足，性价比高|服务态度好，配送快",
-                "湘菜很正宗，辣得过瘾|菜品新鲜，味道好|价格合理，值得推荐",
-                "茶点很精致，味道正宗|环境不错，适合聚餐|价格稍贵但值得",
-                "饺子皮薄馅大，很好吃|分量真的很足|性价比超高",
-                "大盘鸡分量足，味道好|羊肉串很香|配送时间稍长但值得等",
-                "小面很正宗，麻辣过瘾|价格便宜，性价比高|配送快，包装好",
-                "拉面劲道，汤很鲜|价格实惠|配送及时",
-                "价格便宜，味道不错|配送很快|适合工作餐",
-                "鸡肉嫩滑，米饭香|价格实惠|配送准时",
-                "食材新鲜，味道好|可以自选配菜|分量足",
-                "拉面汤底浓郁，很正宗|环境干净|价格适中",
-                "肉质新鲜，烤得很好|配菜丰富|价格稍贵但值得",
-                "泰式风味正宗|酸甜开胃|配送时间稍长",
-                "披萨芝士拉丝，很好吃|意面正宗|价格合理",
-                "菜品精致，味道好|环境优雅|价格较高但值得",
-                "经典快餐，味道稳定|配送快|价格适中",
-                "炸鸡外酥里嫩|配送准时|性价比不错",
-                "披萨种类多|味道不错|配送及时",
-                "咖啡香浓|服务好|配送快",
-                "奶茶好喝，甜度可选|价格便宜|配送快",
-                "服务很好，食材新鲜|配送包装好|价格稍贵",
-                "重庆火锅很正宗|麻辣过瘾|配送时间稍长",
-                "四川火锅地道|食材新鲜|味道好",
-                "台式火锅清淡|适合不吃辣的人|价格合理",
-                "羊肉很新鲜|汤底好|配送及时",
-                "营养搭配好|味道不错|价格实惠",
-                "蒸菜健康|味道清淡|配送快",
-                "台式快餐正宗|价格便宜|配送及时",
-                "牛肉面汤鲜|价格实惠|配送快",
-                "日式快餐精致|味道好|价格适中",
-                "西北风味正宗|面食好吃|价格合理",
-                "杭帮菜清淡|味道精致|环境好",
-                "江浙菜正宗|甜咸适中|价格合理",
-                "南京风味正宗|鸭血粉丝好吃|配送时间稍长",
-                "川菜连锁，味道稳定|菜品丰富|价格适中",
-                "烤鸭皮脆肉嫩|正宗北京味|价格较高但值得",
-                "焖炉烤鸭别有风味|价格合理|配送及时",
-                "涮羊肉肉质好|汤底鲜|价格稍贵",
-                "北京小吃种类多|味道正宗|价格实惠",
-                "包子皮薄馅大|价格便宜|配送快",
-                "可以自选配菜|味道好|价格实惠",
-                "麻辣烫口味统一|价格便宜|配送快",
-                "生煎包皮薄馅大|价格实惠|配送及时",
-                "米线汤鲜|价格便宜|配送快",
-                "拉面汤底浓郁|味道好|价格适中",
-                "牛肉饭好吃|价格合理|配送及时",
-                "套餐种类多|味道不错|价格实惠",
-                "乌冬面劲道|价格适中|配送快",
-                "意式快餐经济实惠|味道好|价格便宜",
-                "披萨外送快|味道好|价格合理"
-            ]
-        }
-        return pd.DataFrame(data)
+    async def run_in_executor(self, func, *args, **kwargs):
+        """在引擎线程池中执行同步函数"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="engine")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def close(self):
+        """关闭线程池（之后再调用 run_in_executor 会重新创建）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.catalog.df
+    
+    @property
+    def index(self) -> CatalogIndex:
+        return self.catalog.index
+    
+    @property
+    def intent_matcher(self) -> IntentMatcher:
+        return self.catalog.intent_matcher
+    
+    @property
+    def catalog_version(self) -> int:
+        return self.catalog.version
+    
+    def _read_catalog(self) -> pd.DataFrame:
+        """读取餐厅数据：优先列式文件，其次CSV，都没有时生成示例数据"""
+        if catalog_is_fresh(self.binary_path, self.data_path):
+            return load_catalog(self.binary_path)
+        if os.path.exists(self.data_path):
+            return pd.read_csv(self.data_path, encoding='utf-8-sig')
+        # 如果没有数据集，使用示例数据
+        df = create_sample_data()
+        # 确保数据目录存在
+        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        df.to_csv(self.data_path, index=False, encoding='utf-8-sig')
+        return df
+    
+    def _source_signature(self) -> Tuple:
+        """数据文件和变更日志的 (修改时间, 大小)，用于检测文件变化（多进程部署时其他worker据此同步变更）"""
+        signature = []
+        for path in (self.data_path, self.binary_path, self.changelog_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    @contextmanager
+    def _changelog_lock(self, create: bool = False):
+        """跨进程的变更日志排它锁（flock）：多进程部署时各worker的追加写入、同步和合并互斥
+
+        变更日志不存在且 create 为False时不加锁（此时没有可合并的变更）；不支持flock的平台上只有进程内的锁。
+        """
+        if fcntl is None or (not create and not os.path.exists(self.changelog_path)):
+            yield
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.changelog_path)), exist_ok=True)
+        # 合并时原地截断日志（不替换文件），锁始终加在同一个文件上
+        with open(self.changelog_path, "a", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _read_changelog(self, start: int = 0) -> Tuple[List[Dict], int]:
+        """读取变更日志中从 start 字节开始的批次（跳过写入不完整的行），返回 (批次, 读到的字节位置)"""
+        batches = []
+        if not os.path.exists(self.changelog_path):
+            return batches, 0
+        with open(self.changelog_path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        for line in data.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                batches.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"跳过无法解析的变更日志: {line[:100]}")
+                batches.append({})
+        return batches, start + len(data)
+    
+    @staticmethod
+    def _replay(catalog: CatalogSnapshot, batches: List[Dict], version: int) -> CatalogSnapshot:
+        """在快照上重放变更批次；整体失败时逐批重放并跳过无效的批次"""
+        try:
+            return catalog.apply_changes(batches, version)
+        except (ValueError, TypeError) as e:
+            print(f"重放变更日志失败: {e}，逐条重放并跳过无效的变更")
+        for batch in batches:
+            try:
+                catalog = catalog.apply_changes([batch], version)
+            except (ValueError, TypeError) as e:
+                print(f"跳过无效的变更: {e}")
+        return catalog
+    
+    def _build_snapshot(self, df: pd.DataFrame, version: int, replay: bool) -> CatalogSnapshot:
+        """构建完整快照（可选重放变更日志）并预先构建全部派生结构"""
+        catalog = CatalogSnapshot(df, version, self.image_resolver)
+        if replay:
+            batches, self._changelog_offset = self._read_changelog()
+            self._changelog_entries = len(batches)
+            if batches:
+                catalog = self._replay(catalog, batches, version)
+        else:
+            # 直接传入的数据以它为准，已有的变更日志视为已包含在内
+            self._changelog_offset = os.path.getsize(self.changelog_path) if os.path.exists(self.changelog_path) else 0
+        catalog.warm()
+        return catalog
+    
+    def _reload_locked(self, df: Optional[pd.DataFrame] = None) -> CatalogSnapshot:
+        """重新加载并发布快照（调用方持有 _write_lock 和变更日志锁）"""
+        signature = self._source_signature()
+        replay = df is None
+        if df is None:
+            df = self._read_catalog()
+        catalog = self._build_snapshot(df, self.catalog.version + 1, replay)
+        catalog.json_snapshot()
+        self._catalog_signature = signature
+        # 正在处理的请求继续使用它们开始时拿到的旧快照
+        self.catalog = catalog
+        return catalog
+    
+    def reload_catalog(self, df: Optional[pd.DataFrame] = None) -> CatalogSnapshot:
+        """重新加载餐厅数据：在调用线程中构建新快照（含JSON快照），完成后一次引用替换发布
+
+        从文件加载时会在其上重放变更日志；直接传入 df 时以它为准。
+        """
+        with self._write_lock, self._changelog_lock():
+            return self._reload_locked(df)
+    
+    async def reload_catalog_async(self, df: Optional[pd.DataFrame] = None) -> CatalogSnapshot:
+        """在工作线程中重新加载，不阻塞事件循环"""
+        return await asyncio.to_thread(self.reload_catalog, df)
+    
+    def _sync_locked(self) -> CatalogSnapshot:
+        """追上其他进程的变更（调用方持有 _write_lock 和变更日志锁）：
+        数据文件变化时（其他worker合并过日志或文件被替换）完整重新加载，否则只增量应用日志中新追加的批次"""
+        signature = self._source_signature()
+        changelog_size = signature[2][1] if signature[2] is not None else 0
+        if signature[:2] != self._catalog_signature[:2] or changelog_size < self._changelog_offset:
+            return self._reload_locked()
+        if changelog_size > self._changelog_offset:
+            batches, self._changelog_offset = self._read_changelog(self._changelog_offset)
+            self._changelog_entries += len(batches)
+            if batches:
+                self.catalog = self._replay(self.catalog, batches, self.catalog.version + 1)
+        self._catalog_signature = signature
+        return self.catalog
+    
+    def sync_catalog(self) -> CatalogSnapshot:
+        """按数据文件和变更日志的变化同步当前快照（多进程部署时由文件监控调用）"""
+        with self._write_lock, self._changelog_lock():
+            return self._sync_locked()
+    
+    async def watch_catalog(self, interval: float):
+        """定期检查数据文件，变化时在后台同步（只追加了变更日志时增量应用，否则重新加载）"""
+        while True:
+            await asyncio.sleep(interval)
+            if self._source_signature() == self._catalog_signature:
+                continue
+            try:
+                catalog = await asyncio.to_thread(self.sync_catalog)
+                self._schedule_maintenance()
+                print(f"餐厅数据已同步（版本 {catalog.version}，共 {catalog.index.size} 家）")
+            except Exception as e:
+                print(f"重新加载餐厅数据失败: {e}")
+                # 记下失败时的文件状态，文件再次变化后才重试
+                self._catalog_signature = self._source_signature()
+    
+    def apply_changes(self, batch: Dict) -> CatalogSnapshot:
+        """应用一批行级变更 {"upsert": [...], "delete": [...]}：写入变更日志后发布增量更新的快照
+
+        删除不存在的餐厅时抛出 RestaurantNotFoundError，整批不生效。
+        先在变更日志锁内追上其他worker写入的变更，再校验和追加，多个worker写入同一份日志不会互相覆盖。
+        只增量修补索引（写时复制），匹配器、JSON快照等派生结构留给 maintain_catalog 在后台补建。
+        """
+        with self._write_lock:
+            if not batch.get("upsert") and not batch.get("delete"):
+                # 空批次不改变数据，不写日志也不更新版本
+                return self.catalog
+            with self._changelog_lock(create=True):
+                self._sync_locked()
+                catalog = self.catalog.apply_changes([batch], self.catalog.version + 1, strict=True)
+                with open(self.changelog_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(batch, ensure_ascii=False) + "\n")
+                    self._changelog_offset = f.tell()
+                self._changelog_entries += 1
+                self._catalog_signature = self._source_signature()
+                self.catalog = catalog
+                return catalog
+    
+    def _schedule_maintenance(self):
+        """在后台补建派生结构、按需合并变更日志（已在运行时不重复启动）"""
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.create_task(self.maintain_catalog())
+    
+    async def apply_changes_async(self, batch: Dict) -> CatalogSnapshot:
+        """在工作线程中应用变更，并在后台补建派生结构、按需合并变更日志"""
+        catalog = await asyncio.to_thread(self.apply_changes, batch)
+        self._schedule_maintenance()
+        return catalog
+    
+    async def maintain_catalog(self):
+        """为最新快照补建派生结构；变更日志超过阈值时合并进数据文件。连续更新时只处理最新的快照"""
+        while True:
+            catalog = self.catalog
+            try:
+                await asyncio.to_thread(catalog.warm)
+                await asyncio.to_thread(catalog.json_snapshot)
+                if self._changelog_entries >= self.compact_threshold:
+                    await asyncio.to_thread(self.compact_changelog)
+            except Exception as e:
+                print(f"餐厅数据后台维护失败: {e}")
+                return
+            if self.catalog is catalog:
+                return
+    
+    def compact_changelog(self):
+        """把变更日志合并进数据文件（CSV，已有列式文件时一并更新）并清空日志
+
+        整个过程持有变更日志锁：先追上其他worker追加的变更（其他worker已合并过时重新加载数据文件并重放日志），
+        此时快照 = 数据文件 + 日志中的全部批次，写回数据文件后截断日志。合并期间其他写入等待锁释放。
+        """
+        with self._write_lock, self._changelog_lock():
+            catalog = self._sync_locked()
+            if not self._changelog_entries:
+                return
+            
+            df = catalog.df
+            tmp_path = self.data_path + ".tmp"
+            df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+            os.replace(tmp_path, self.data_path)
+            if os.path.exists(self.binary_path):
+                write_catalog([df], self.binary_path)
+            
+            # 日志中的批次都已重放进写出的数据（持锁期间没有新的追加），原地截断
+            with open(self.changelog_path, "r+", encoding="utf-8") as f:
+                f.truncate(0)
+            self._changelog_entries = 0
+            self._changelog_offset = 0
+            # 数据文件是自己写的，不需要文件监控再重新加载
+            self._catalog_signature = self._source_signature()
+    
+    async def get_json_snapshot_async(self) -> CatalogJSONSnapshot:
+        """获取JSON快照；尚未构建时在线程池中构建"""
+        catalog = self.catalog
+        if catalog._json_snapshot is not None:
+            return catalog._json_snapshot
+        return await self.run_in_executor(catalog.json_snapshot)
+    
+    async def filter_restaurant_rows_async(self, **filters) -> np.ndarray:
+        """filter_restaurant_rows 的异步版本（在线程池中执行，接口中使用）"""
+        return await self.run_in_executor(self.filter_restaurant_rows, **filters)
+    
+    async def encode_restaurants_async(
+        self,
+        rows,
+        fields: Optional[List[str]] = None,
+        catalog: Optional[CatalogSnapshot] = None
+    ) -> bytes:
+        """encode_restaurants 的异步版本（在线程池中执行，接口中使用）"""
+        return await self.run_in_executor((catalog or self.catalog).encode_rows, rows, fields)
     
     def get_all_restaurants(self) -> List[Dict]:
         """获取所有餐厅"""
         return self.df.to_dict(orient="records")
     
+    def get_json_snapshot(self) -> CatalogJSONSnapshot:
+        """获取当前数据版本的预序列化JSON快照"""
+        return self.catalog.json_snapshot()
+    
+    def parse_fields(self, fields) -> Optional[List[str]]:
+        """解析字段投影，包含未知字段时抛出ValueError"""
+        return self.catalog.parse_fields(fields)
+    
+    def encode_restaurants(self, rows, fields: Optional[List[str]] = None) -> bytes:
+        """按行号把餐厅序列化为JSON对象列表（不含外层方括号），只读取所选字段"""
+        return self.catalog.encode_rows(rows, fields)
+    
     def get_all_cuisines(self) -> List[str]:
         """获取所有菜系"""
-        return sorted(self.df["cuisine"].unique().tolist())
+        return sorted(self.index.cuisine_bitmaps)
     
     def filter_restaurants(
         self,
@@ -164,37 +618,63 @@ class RecommendationEngine:
         max_price: Optional[float] = None,
         min_rating: Optional[float] = None,
         max_delivery_time: Optional[int] = None,
-        keyword: Optional[str] = None
+        keyword: Optional[str] = None,
+        sort: Optional[str] = None,
+        budget: Optional[float] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None
     ) -> List[Dict]:
-        """根据筛选条件过滤餐厅"""
-        filtered_df = self.df.copy()
-        
-        if cuisine:
-            filtered_df = filtered_df[filtered_df["cuisine"] == cuisine]
-        
-        if min_price is not None:
-            filtered_df = filtered_df[filtered_df["price"] >= min_price]
-        
-        if max_price is not None:
-            filtered_df = filtered_df[filtered_df["price"] <= max_price]
-        
-        if min_rating is not None:
-            filtered_df = filtered_df[filtered_df["rating"] >= min_rating]
-        
-        if max_delivery_time is not None:
-            filtered_df = filtered_df[filtered_df["delivery_time"] <= max_delivery_time]
-        
-        if keyword:
-            keyword_lower = keyword.lower()
-            filtered_df = filtered_df[
-                filtered_df["name"].str.contains(keyword_lower, case=False, na=False) |
-                filtered_df["description"].str.contains(keyword_lower, case=False, na=False)
-            ]
-        
-        # 按评分和价格排序
-        filtered_df = filtered_df.sort_values(["rating", "price"], ascending=[False, True])
-        
-        return filtered_df.to_dict(orient="records")
+        """根据筛选条件过滤餐厅（默认按评分降序、价格升序；sort="relevance" 按关键词匹配度，sort="score" 按综合得分；给出坐标时只保留配送半径内的餐厅）"""
+        index = self.index
+        rows = index.query(
+            cuisine=cuisine,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            max_delivery_time=max_delivery_time,
+            keyword=keyword,
+            sort=sort,
+            budget=budget,
+            weights=self.score_weights,
+            latitude=latitude,
+            longitude=longitude,
+            radius_km=self.delivery_radius_km if radius_km is None else radius_km
+        )
+        return index.materialize(rows)
+    
+    def filter_restaurant_rows(
+        self,
+        cuisine: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        max_delivery_time: Optional[int] = None,
+        keyword: Optional[str] = None,
+        sort: Optional[str] = None,
+        budget: Optional[float] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None,
+        limit: Optional[int] = None,
+        catalog: Optional[CatalogSnapshot] = None
+    ) -> np.ndarray:
+        """同 filter_restaurants，但只返回排好序的行号（limit 只选出前若干行），不构建结果字典"""
+        return (catalog or self.catalog).index.query(
+            cuisine=cuisine,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            max_delivery_time=max_delivery_time,
+            keyword=keyword,
+            sort=sort,
+            budget=budget,
+            limit=limit,
+            weights=self.score_weights,
+            latitude=latitude,
+            longitude=longitude,
+            radius_km=self.delivery_radius_km if radius_km is None else radius_km
+        )
     
     async def generate_recommendations(self, restaurants: List[Dict]) -> List[Dict]:
         """使用豆包API生成推荐理由"""
@@ -203,33 +683,136 @@ class RecommendationEngine:
                 self.doubao_api = DoubaoAPI()
             except Exception as e:
                 print(f"豆包API初始化失败: {e}，将使用默认推荐理由")
+                FALLBACKS.inc("recommend", "api_unavailable")
                 return self._generate_default_recommendations(restaurants)
         
         try:
-            return await self.doubao_api.generate_recommendations(restaurants)
+            if self.reason_mode == "batch":
+                return await self.doubao_api.generate_recommendations_batched(
+                    restaurants,
+                    fallback_reason=self._default_reason
+                )
+            return await self.doubao_api.generate_recommendations(
+                restaurants,
+                fallback_reason=self._default_reason
+            )
         except Exception as e:
             print(f"豆包API调用失败: {e}，将使用默认推荐理由")
+            FALLBACKS.inc("recommend", "error")
             return self._generate_default_recommendations(restaurants)
     
+    def _default_reason(self, restaurant: Dict) -> str:
+        """默认推荐理由模板"""
+        return (
+            f"{restaurant['name']}评分{restaurant['rating']}分，价格¥{restaurant['price']}，"
+            f"配送{restaurant['delivery_time']}分钟，值得一试！"
+        )
+    
     def _generate_default_recommendations(self, restaurants: List[Dict]) -> List[Dict]:
         """生成默认推荐理由（当API不可用时）"""
         return [
             {
                 "restaurant_id": r.get("id"),
                 "name": r.get("name"),
-                "reason": f"{r['name']}评分{r['rating']}分，价格¥{r['price']}，配送{r['delivery_time']}分钟，值得一试！"
+                "reason": self._default_reason(r)
             }
             for r in restaurants
         ]
     
-    async def chat_recommend(
+    def _get_restaurant_summary(
+        self,
+        user_message: str,
+        rows: Optional[np.ndarray] = None,
+        catalog: Optional[CatalogSnapshot] = None
+    ) -> str:
+        """获取系统提示词中的餐厅摘要（rows 为候选行号，None表示全部），依次放入：
+        消息中提到的餐厅、菜系/菜品/价格意图命中的餐厅（先按相似度、再按默认顺序）、按向量相似度召回的餐厅，
+        不足 chat_candidates 家时按默认顺序补足"""
+        catalog = catalog or self.catalog
+        records = catalog.index.records
+        semantic_index = catalog.index.semantic_index
+        count = self.chat_candidates
+        name_rows, keywords, dish_rows = catalog.intent_matcher.scan(user_message)
+        groups = [np.asarray(self._within(name_rows, rows), dtype=np.int64)]
+        
+        # 意图匹配器识别出的菜系和菜品比向量相似度可靠（"想吃辣的"、"日料"之类的消息向量召回不到）
+        mask = self._intent_mask(user_message, keywords, dish_rows, catalog)
+        if mask is not None:
+            intent_rows = np.flatnonzero(mask) if rows is None else rows[mask[rows]]
+            groups.append(semantic_index.search(user_message, count, within=intent_rows)[0])
+            groups.append(self._ranked_rows(catalog, intent_rows, count))
+        
+        # 召回与消息最相关的餐厅，提示词大小与餐厅总数无关，任何一家餐厅都可能被推荐；
+        # 用相对阈值去掉与最相关的餐厅相差很远的行
+        found, _ = semantic_index.search(user_message, count, within=rows, min_ratio=self.chat_min_ratio)
+        # 用户提到烧烤时，优先展示包含"烤"字的餐厅
+        bbq = '烧烤' in keywords or '烤肉' in keywords
+        if bbq:
+            is_bbq = catalog.bbq_mask[found]
+            found = np.concatenate([found[is_bbq], found[~is_bbq]])
+        groups.append(found)
+        selected = self._pad_rows(np.concatenate(groups), rows, bbq, catalog)
+        return _build_restaurant_summary([records[row] for row in selected])
+    
+    def _ranked_rows(
+        self,
+        catalog: CatalogSnapshot,
+        rows: Optional[np.ndarray],
+        k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """候选行（None表示全部）中按默认排序的前k行，mask 给出时只取其中的行"""
+        if rows is None:
+            if mask is None:
+                return catalog.index.rank_order[:k]
+            if mask is catalog.bbq_mask:
+                return catalog.bbq_rank_rows[:k]
+            rows = np.flatnonzero(mask)
+        elif mask is not None:
+            rows = rows[mask[rows]]
+        return rows[top_k(-catalog.index.rank_position[rows], k)]
+    
+    def _pad_rows(self, found: np.ndarray, rows: Optional[np.ndarray], bbq: bool, catalog: CatalogSnapshot) -> List[int]:
+        """按顺序去重取前 chat_candidates 家，不足时按默认排序补足（烧烤意图先补含"烤"字的餐厅，最多占2/3）"""
+        count = self.chat_candidates
+        selected = []
+        seen = set()
+        
+        def take(source: np.ndarray, limit: int):
+            for row in source:
+                if len(selected) >= limit:
+                    break
+                if int(row) not in seen:
+                    seen.add(int(row))
+                    selected.append(int(row))
+        
+        take(found, count)
+        if len(selected) < count:
+            if bbq:
+                take(self._ranked_rows(catalog, rows, count + len(selected), catalog.bbq_mask), count * 2 // 3)
+            take(self._ranked_rows(catalog, rows, count + len(selected)), count)
+        return selected
+    
+    def _build_chat_messages(
         self,
         user_message: str,
         conversation_history: List[dict],
         location: str,
-        restaurants: List[Dict]
+        restaurant_summary: str
+    ) -> List[dict]:
+        """构建聊天推荐的消息列表（系统提示词 + 对话历史 + 当前消息），按token预算裁剪"""
+        messages, _ = self.prompt_builder.build(user_message, conversation_history, location, restaurant_summary)
+        return messages
+    
+    async def chat_recommend(
+        self,
+        user_message: str,
+        conversation_history: List[dict],
+        location: Union[str, Dict, Awaitable],
+        restaurants: Optional[List[Dict]] = None,
+        coordinates: Optional[Tuple[float, float]] = None
     ) -> dict:
-        """基于聊天对话推荐餐厅"""
+        """基于聊天对话推荐餐厅（restaurants 为空时使用全部餐厅数据；给出时只在其中按id对应的数据行中推荐；coordinates 为客户端给出的 (纬度, 经度)，给出时只推荐配送半径内的餐厅）"""
         # 初始化豆包API
         if self.doubao_api is None:
             try:
@@ -242,135 +825,84 @@ class RecommendationEngine:
                     "type": "error"
                 }
         
+        # 整个请求使用同一个数据快照，期间重新加载不影响本次请求
+        catalog = self.catalog
+        if restaurants is None:
+            with STAGE_SECONDS.time("chat", "restaurants"):
+                rows = self._nearby_restaurants(coordinates, catalog)
+        else:
+            rows = self._rows_for(restaurants, catalog)
+        
         try:
-            # 构建餐厅信息摘要（包含所有餐厅，特别是烧烤相关的）
-            # 如果用户提到烧烤，优先包含所有包含"烤"字的餐厅
-            user_message_lower = user_message.lower()
-            if '烧烤' in user_message_lower or '烤肉' in user_message_lower:
-                # 先筛选出包含"烤"的餐厅
-                bbq_restaurants = [r for r in restaurants if '烤' in r['name'] or '烤' in r.get('description', '') or '烤' in r.get('signature_dish', '')]
-                other_restaurants = [r for r in restaurants if r not in bbq_restaurants]
-                # 优先展示烧烤相关的餐厅
-                restaurants_to_show = bbq_restaurants[:20] + other_restaurants[:10]
-            else:
-                restaurants_to_show = restaurants[:30]
-            
-            restaurant_summary = "\n".join([
-                f"{i+1}. {r['name']}（{r['cuisine']}）- ¥{r['price']}，评分{r['rating']}，配送{r['delivery_time']}分钟 - {r['description']} - 招牌菜：{r.get('signature_dish', '无')}"
-                for i, r in enumerate(restaurants_to_show)
-            ])
+            with STAGE_SECONDS.time("chat", "summary"):
+                restaurant_summary = await self.run_in_executor(self._get_restaurant_summary, user_message, rows, catalog)
+            # 定位可以是还在进行中的任务，餐厅摘要准备好之后再等待它
+            if not isinstance(location, (str, dict)):
+                with STAGE_SECONDS.time("chat", "location_wait"):
+                    location = await location
+            with STAGE_SECONDS.time("chat", "prompt"):
+                messages = self._build_chat_messages(user_message, conversation_history, _describe_location(location), restaurant_summary)
             
-            # 构建系统提示词
-            system_prompt = f"""你是一个专业的外卖推荐助手，位于{location}。你的任务是理解用户的需求，并从以下餐厅列表中推荐合适的餐厅。
-
-可用餐厅列表：
-{restaurant_summary}
-
-重要提示：
-1. 必须严格匹配用户的需求。如果用户说"烧烤"，只能推荐包含"烤"字的餐厅（如韩式烤肉、烤鸭等）
-2. 如果用户提到价格范围（如"人均100左右"），必须推荐价格在范围内的餐厅
-3. 优先推荐完全匹配的餐厅，如果没有完全匹配的，再考虑相似类型
-4. **只推荐1家最符合需求的餐厅**（最重要的一条！）
-
-请根据用户的对话内容，理解他们的需求（如菜系、价格、口味、配送时间等），然后：
-1. 用自然、友好的语言回复用户
-2. **只推荐1家最符合需求的餐厅**（必须严格匹配用户需求）
-3. 说明推荐理由
-
-回复格式要求：
-- 第一段：理解用户需求并友好回复
-- 第二段：推荐餐厅（必须在回复中明确提到餐厅名称，格式：餐厅名（菜系）- 价格 - 评分 - 配送时间 - 推荐理由）
-- 保持对话自然流畅，像朋友聊天一样
-
-如果用户的需求不明确，可以询问更多细节。"""
+            # 调用豆包API
+            try:
+                with STAGE_SECONDS.time("chat", "llm"):
+                    ai_message = await self.doubao_api.complete(messages, max_tokens=1000)
+            except DoubaoAPIError as e:
+                print(f"豆包API调用失败: {e.detail}")
+                FALLBACKS.inc("chat", "api_error")
+                
+                # 即使API失败，也尝试基于关键词推荐
+                with STAGE_SECONDS.time("chat", "fallback"):
+                    fallback_restaurants = await self.run_in_executor(self._fallback_recommend, user_message, rows, catalog)
+                
+                # 只返回1家餐厅
+                if fallback_restaurants:
+                    restaurant = fallback_restaurants[0]
+                    restaurant = self._add_dish_images(dict(restaurant), catalog)
+                    fallback_restaurants = [restaurant]
+                
+                return {
+                    "message": f"根据您的需求，我为您推荐以下餐厅：",
+                    "restaurants": fallback_restaurants,
+                    "type": "recommendation"
+                }
             
-            # 构建消息历史
-            messages = [{"role": "system", "content": system_prompt}]
+            if not ai_message:
+                ai_message = "抱歉，AI暂时无法生成回复，请稍后重试。"
             
-            # 添加对话历史（最近5轮）
-            for msg in conversation_history[-10:]:  # 保留最近10条消息
-                messages.append(msg)
+            # 从AI回复中提取餐厅名称，匹配实际餐厅数据
+            with STAGE_SECONDS.time("chat", "extract"):
+                recommended_restaurants = await self.run_in_executor(self._extract_restaurants_from_message, ai_message, rows, catalog)
             
-            # 添加当前用户消息
-            messages.append({"role": "user", "content": user_message})
+            # 只返回1家餐厅
+            if recommended_restaurants:
+                # 根据招牌菜生成或匹配图片
+                restaurant = recommended_restaurants[0]
+                with STAGE_SECONDS.time("chat", "images"):
+                    restaurant = self._add_dish_images(dict(restaurant), catalog)
+                recommended_restaurants = [restaurant]
             
-            # 调用豆包API
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.doubao_api.api_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.doubao_api.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "ep-20251103145219-hzndr",
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "max_tokens": 1000
-                    },
-                    timeout=30.0
-                )
+            return {
+                "message": ai_message,
+                "restaurants": recommended_restaurants,
+                "type": "recommendation"
+            }
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    ai_message = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                    
-                    if not ai_message:
-                        ai_message = "抱歉，AI暂时无法生成回复，请稍后重试。"
-                    
-                    # 从AI回复中提取餐厅名称，匹配实际餐厅数据
-                    recommended_restaurants = self._extract_restaurants_from_message(ai_message, restaurants)
-                    
-                    # 只返回1家餐厅
-                    if recommended_restaurants:
-                        # 根据招牌菜生成或匹配图片
-                        restaurant = recommended_restaurants[0]
-                        restaurant = self._add_dish_images(restaurant)
-                        recommended_restaurants = [restaurant]
-                    
-                    return {
-                        "message": ai_message,
-                        "restaurants": recommended_restaurants,
-                        "type": "recommendation"
-                    }
-                else:
-                    error_detail = f"API返回错误: {response.status_code}"
-                    try:
-                        error_body = response.json()
-                        error_detail = error_body.get("error", {}).get("message", error_detail)
-                    except:
-                        error_detail = f"API返回错误: {response.status_code} - {response.text[:200]}"
-                    
-                    print(f"豆包API调用失败: {error_detail}")
-                    
-                    # 即使API失败，也尝试基于关键词推荐
-                    fallback_restaurants = self._fallback_recommend(user_message, restaurants)
-                    
-                    # 只返回1家餐厅
-                    if fallback_restaurants:
-                        restaurant = fallback_restaurants[0]
-                        restaurant = self._add_dish_images(restaurant)
-                        fallback_restaurants = [restaurant]
-                    
-                    return {
-                        "message": f"根据您的需求，我为您推荐以下餐厅：",
-                        "restaurants": fallback_restaurants,
-                        "type": "recommendation"
-                    }
-                    
         except Exception as e:
             print(f"聊天推荐错误: {e}")
             import traceback
             traceback.print_exc()
             
             # 尝试备用推荐
+            FALLBACKS.inc("chat", "error")
             try:
-                fallback_restaurants = self._fallback_recommend(user_message, restaurants)
+                with STAGE_SECONDS.time("chat", "fallback"):
+                    fallback_restaurants = await self.run_in_executor(self._fallback_recommend, user_message, rows, catalog)
                 
                 # 只返回1家餐厅
                 if fallback_restaurants:
                     restaurant = fallback_restaurants[0]
-                    restaurant = self._add_dish_images(restaurant)
+                    restaurant = self._add_dish_images(dict(restaurant), catalog)
                     fallback_restaurants = [restaurant]
                 
                 return {
@@ -385,94 +917,224 @@ class RecommendationEngine:
                     "type": "error"
                 }
     
-    def _extract_restaurants_from_message(self, message: str, restaurants: List[Dict]) -> List[Dict]:
-        """从AI回复中提取餐厅信息"""
-        recommended = []
-        message_lower = message.lower()
-        
-        # 尝试匹配餐厅名称（精确匹配）
-        for restaurant in restaurants:
-            if restaurant['name'] in message:
-                if restaurant not in recommended:
-                    recommended.append(restaurant)
-                if len(recommended) >= 1:  # 只返回1个
+    async def chat_recommend_stream(
+        self,
+        user_message: str,
+        conversation_history: List[dict],
+        location: Union[str, Dict, Awaitable],
+        restaurants: Optional[List[Dict]] = None,
+        coordinates: Optional[Tuple[float, float]] = None
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """基于聊天对话流式推荐餐厅，依次产出 (事件名, 数据)：delta / restaurant / done"""
+        if self.doubao_api is None:
+            try:
+                self.doubao_api = DoubaoAPI()
+            except Exception as e:
+                print(f"豆包API初始化失败: {e}")
+                yield "done", {
+                    "message": "抱歉，AI服务暂时不可用，请稍后重试。",
+                    "restaurants": [],
+                    "type": "error"
+                }
+                return
+        
+        catalog = self.catalog
+        if restaurants is None:
+            with STAGE_SECONDS.time("chat_stream", "restaurants"):
+                rows = self._nearby_restaurants(coordinates, catalog)
+        else:
+            rows = self._rows_for(restaurants, catalog)
+        # 全部餐厅中最长的店名，作为增量匹配时向前回看的长度上限
+        longest_name = catalog.longest_name
+        
+        ai_message = ""
+        recommended = None
+        try:
+            with STAGE_SECONDS.time("chat_stream", "summary"):
+                restaurant_summary = await self.run_in_executor(self._get_restaurant_summary, user_message, rows, catalog)
+            # 定位可以是还在进行中的任务，餐厅摘要准备好之后再等待它
+            if not isinstance(location, (str, dict)):
+                with STAGE_SECONDS.time("chat_stream", "location_wait"):
+                    location = await location
+            with STAGE_SECONDS.time("chat_stream", "prompt"):
+                messages = self._build_chat_messages(user_message, conversation_history, _describe_location(location), restaurant_summary)
+            started = time.perf_counter()
+            async for delta in self.doubao_api.stream_complete(messages, max_tokens=1000):
+                if not ai_message:
+                    # 首字延迟
+                    STAGE_SECONDS.observe(time.perf_counter() - started, "chat_stream", "llm_first_token")
+                ai_message += delta
+                yield "delta", {"content": delta}
+                
+                # 增量匹配：只在新增文本（加上可能跨段的餐厅名前缀）中查找，匹配到就立即推送餐厅卡片
+                if recommended is None:
+                    window = ai_message[-(len(delta) + longest_name - 1):]
+                    restaurant = self._find_restaurant_by_name(window, rows, catalog)
+                    if restaurant is not None:
+                        recommended = self._add_dish_images(dict(restaurant), catalog)
+                        yield "restaurant", recommended
+            STAGE_SECONDS.observe(time.perf_counter() - started, "chat_stream", "llm")
+        except Exception as e:
+            detail = e.detail if isinstance(e, DoubaoAPIError) else str(e)
+            print(f"流式聊天推荐错误: {detail}")
+            if not ai_message:
+                # 还没有收到任何回复时，使用关键词备用推荐
+                FALLBACKS.inc("chat_stream", "api_error" if isinstance(e, DoubaoAPIError) else "error")
+                with STAGE_SECONDS.time("chat_stream", "fallback"):
+                    fallback_restaurants = await self.run_in_executor(self._fallback_recommend, user_message, rows, catalog)
+                fallback_restaurants = [self._add_dish_images(dict(r), catalog) for r in fallback_restaurants[:1]]
+                for restaurant in fallback_restaurants:
+                    yield "restaurant", restaurant
+                yield "done", {
+                    "message": f"根据您的需求「{user_message}」，我为您推荐以下餐厅：",
+                    "restaurants": fallback_restaurants,
+                    "type": "recommendation"
+                }
+                return
+        
+        if not ai_message:
+            ai_message = "抱歉，AI暂时无法生成回复，请稍后重试。"
+        
+        # 回复中没有出现餐厅名时，按完整回复的关键词/价格提取
+        if recommended is None:
+            with STAGE_SECONDS.time("chat_stream", "extract"):
+                extracted = await self.run_in_executor(self._extract_restaurants_from_message, ai_message, rows, catalog)
+            if extracted:
+                recommended = self._add_dish_images(dict(extracted[0]), catalog)
+                yield "restaurant", recommended
+        
+        yield "done", {
+            "message": ai_message,
+            "restaurants": [recommended] if recommended is not None else [],
+            "type": "recommendation"
+        }
+    
+    def _nearby_restaurants(
+        self,
+        coordinates: Optional[Tuple[float, float]],
+        catalog: CatalogSnapshot
+    ) -> Optional[np.ndarray]:
+        """客户端给出坐标时返回配送半径内餐厅的行号（升序）
+        
+        没有坐标、数据没有坐标或附近的餐厅不足 CHAT_CANDIDATES 家时返回None（使用全部餐厅），不等待IP定位。
+        后续的召回、意图匹配和备用推荐都直接在数据快照的索引上按行号限定范围，不为附近的餐厅重建索引。
+        """
+        if coordinates is None or catalog.index.spatial_index is None or self.delivery_radius_km <= 0:
+            return None
+        rows = catalog.index.nearby_rows(*coordinates, self.delivery_radius_km)
+        if rows is None or len(rows) < min(self.chat_candidates, catalog.index.size):
+            return None
+        return rows
+    
+    @staticmethod
+    def _rows_for(restaurants: Optional[List[Dict]], catalog: CatalogSnapshot) -> Optional[np.ndarray]:
+        """调用方给出的餐厅列表对应的行号（按id查找，升序；不在数据中的餐厅忽略），全部餐厅时返回None"""
+        if restaurants is None or restaurants is catalog.index.records:
+            return None
+        row_by_id = catalog.row_by_id
+        rows = [row_by_id.get(r.get("id")) for r in restaurants]
+        return np.unique(np.asarray([row for row in rows if row is not None], dtype=np.int64))
+    
+    @staticmethod
+    def _within(candidates: List[int], rows: Optional[np.ndarray]) -> List[int]:
+        """保留在 rows（升序行号，None表示全部）中的候选行"""
+        if rows is None or not candidates:
+            return list(candidates)
+        candidates = np.asarray(candidates, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+        return candidates[rows[positions] == candidates].tolist() if len(rows) else []
+    
+    def _find_restaurant_by_name(
+        self,
+        text: str,
+        rows: Optional[np.ndarray] = None,
+        catalog: Optional[CatalogSnapshot] = None
+    ) -> Optional[Dict]:
+        """返回名称出现在文本中的第一家餐厅（只在 rows 中查找，None表示全部）"""
+        catalog = catalog or self.catalog
+        name_rows = self._within(catalog.intent_matcher.scan(text)[0], rows)
+        return catalog.index.records[name_rows[0]] if name_rows else None
+    
+    def _extract_restaurants_from_message(
+        self,
+        message: str,
+        rows: Optional[np.ndarray] = None,
+        catalog: Optional[CatalogSnapshot] = None
+    ) -> List[Dict]:
+        """从AI回复中提取餐厅信息（只在 rows 中查找，None表示全部）"""
+        catalog = catalog or self.catalog
+        index = catalog.index
+        candidates = np.arange(index.size) if rows is None else rows
+        if not len(candidates):
+            return []
+        # 一次扫描得到回复中提到的餐厅名和关键词
+        name_rows, keywords, _ = catalog.intent_matcher.scan(message)
+        
+        # 尝试匹配餐厅名称（精确匹配），只取1个
+        recommended = self._within(name_rows, rows)[:1]
+        
+        # 检查是否提到烧烤：优先补充包含"烤"字的餐厅
+        if '烧烤' in keywords or '烤肉' in keywords:
+            for row in candidates[catalog.bbq_mask[candidates]]:
+                if len(recommended) >= 5:
                     break
+                if row not in recommended:
+                    recommended.append(int(row))
         
-        # 如果匹配到的餐厅少于3个，尝试从关键词匹配
-        if len(recommended) < 3:
-            # 检查是否提到烧烤
-            if '烧烤' in message_lower or '烤肉' in message_lower:
-                # 优先匹配包含"烤"字的餐厅
-                bbq_restaurants = [r for r in restaurants if '烤' in r['name'] or '烤' in r.get('description', '') or '烤' in r.get('signature_dish', '')]
-                for restaurant in bbq_restaurants:
-                    if restaurant not in recommended:
-                        recommended.append(restaurant)
-                        if len(recommended) >= 5:
-                            break
-            
-            # 提取价格范围
-            import re
-            price_pattern = r'(\d+)\s*[元块]|人均\s*(\d+)|(\d+)\s*左右'
-            price_matches = re.findall(price_pattern, message)
-            if price_matches:
-                prices = [int(p) for match in price_matches for p in match if p]
-                if prices:
-                    target_price = prices[0]
-                    min_price = max(0, target_price - 20)
-                    max_price = target_price + 20
-                    # 按价格筛选
-                    price_filtered = [r for r in restaurants if min_price <= r['price'] <= max_price and r not in recommended]
-                    for restaurant in price_filtered:
-                        if restaurant not in recommended:
-                            recommended.append(restaurant)
-                            if len(recommended) >= 5:
-                                break
-        
-        # 如果还是没有匹配到，返回评分最高的1个
+        # 按价格范围补充
+        target_price = _parse_target_price(message)
+        if target_price is not None:
+            prices = index.columns["price"][candidates]
+            in_range = (prices >= max(0, target_price - 20)) & (prices <= target_price + 20)
+            for row in candidates[in_range]:
+                if len(recommended) >= 5:
+                    break
+                if row not in recommended:
+                    recommended.append(int(row))
+        
+        # 如果还是没有匹配到，返回综合得分最高的1个
         if not recommended:
-            recommended = sorted(restaurants, key=lambda x: x['rating'], reverse=True)[:1]
-        
-        return recommended
-    
-    def _fallback_recommend(self, user_message: str, restaurants: List[Dict]) -> List[Dict]:
-        """当API失败时的备用推荐方法"""
-        # 简单的关键词匹配
-        message_lower = user_message.lower()
-        
-        # 提取价格范围
-        import re
-        price_pattern = r'(\d+)\s*[元块]|人均\s*(\d+)|(\d+)\s*左右'
-        price_matches = re.findall(price_pattern, user_message)
-        min_price = None
-        max_price = None
-        if price_matches:
-            prices = [int(p) for match in price_matches for p in match if p]
-            if prices:
-                target_price = prices[0]
-                min_price = max(0, target_price - 20)  # 允许±20的浮动
-                max_price = target_price + 20
-        
-        # 菜系关键词（更精确的匹配）
-        cuisine_keywords = {
-            '烧烤': ['烧烤', '烤肉', '烤串', '烤'],
-            '川菜': ['川菜', '川', '辣', '麻', '火锅'],
-            '湘菜': ['湘菜', '湘', '湖南'],
-            '粤菜': ['粤菜', '粤', '广东', '广式'],
-            '日式': ['日式', '日', '拉面', '寿司'],
-            '韩式': ['韩式', '韩', '烤肉'],
-            '快餐': ['快餐', '快', '便当', '盒饭'],
-            '面食': ['面食', '面', '馄饨', '饺子', '包子'],
-            '火锅': ['火锅'],
-            '京菜': ['京菜', '北京', '烤鸭']
-        }
+            recommended = [self._best_row(index, candidates)]
+        
+        return [index.records[row] for row in recommended]
+    
+    def _fallback_recommend(
+        self,
+        user_message: str,
+        rows: Optional[np.ndarray] = None,
+        catalog: Optional[CatalogSnapshot] = None
+    ) -> List[Dict]:
+        """当API失败时的备用推荐方法（只在 rows 中推荐，None表示全部）"""
+        catalog = catalog or self.catalog
+        index = catalog.index
+        candidates = np.arange(index.size) if rows is None else rows
+        if not len(candidates):
+            return []
+        # 一次扫描得到消息中的关键词和提到的菜品
+        _, keywords, dish_rows = catalog.intent_matcher.scan(user_message)
+        mask = self._intent_mask(user_message, keywords, dish_rows, catalog)
+        target_price = _parse_target_price(user_message)
         
+        # 按综合得分（评分、与预算的接近程度、配送时间）取最高的1个；如果没有，在全部候选餐厅中取
+        matched = candidates if mask is None else candidates[mask[candidates]]
+        if not len(matched):
+            matched = candidates
+        return [index.records[self._best_row(index, matched, target_price)]]
+    
+    def _intent_mask(
+        self,
+        user_message: str,
+        keywords: Set[str],
+        dish_rows: List[int],
+        catalog: CatalogSnapshot
+    ) -> Optional[np.ndarray]:
+        """消息中的菜系、菜品、烧烤和价格意图命中的餐厅（布尔掩码），没有任何意图时返回None"""
+        index = catalog.index
         matched_cuisines = []
-        matched_keywords = []
         
         # 优先匹配精确关键词
-        for keyword, cuisines in cuisine_keywords.items():
-            if keyword in message_lower:
-                matched_keywords.append(keyword)
+        for keyword, cuisines in CUISINE_KEYWORDS.items():
+            if keyword in keywords:
                 if keyword == '烧烤':
                     # 烧烤匹配韩式烤肉、烤鸭等
                     matched_cuisines.extend(['韩式', '京菜'])
@@ -481,298 +1143,48 @@ class RecommendationEngine:
         
         # 如果没有精确匹配，尝试部分匹配
         if not matched_cuisines:
-            for cuisine, keywords in cuisine_keywords.items():
-                if any(keyword in message_lower for keyword in keywords):
+            for cuisine, cuisine_keywords in CUISINE_KEYWORDS.items():
+                if any(keyword in keywords for keyword in cuisine_keywords):
                     matched_cuisines.append(cuisine)
         
-        # 筛选餐厅
-        filtered = restaurants
-        
-        # 按菜系筛选
+        # 按菜系筛选；没有菜系但提到了具体菜品时，按招牌菜筛选
+        mask = None
         if matched_cuisines:
-            filtered = [r for r in restaurants if r['cuisine'] in matched_cuisines]
+            mask = np.zeros(index.size, dtype=bool)
+            for cuisine in set(matched_cuisines):
+                bitmap = index.cuisine_bitmaps.get(cuisine)
+                if bitmap is not None:
+                    mask |= bitmap
+        elif dish_rows:
+            mask = np.zeros(index.size, dtype=bool)
+            mask[dish_rows] = True
         
         # 按名称和描述筛选（包含"烤"字）
-        if '烧烤' in message_lower or '烤肉' in message_lower:
-            filtered = [r for r in filtered if '烤' in r['name'] or '烤' in r.get('description', '') or '烤' in r.get('signature_dish', '')]
-        
-        # 按价格筛选
-        if min_price is not None and max_price is not None:
-            filtered = [r for r in filtered if min_price <= r['price'] <= max_price]
-        
-        # 按评分排序，返回前1个
-        recommended = sorted(filtered, key=lambda x: x['rating'], reverse=True)[:1]
+        if '烧烤' in keywords or '烤肉' in keywords:
+            mask = catalog.bbq_mask if mask is None else mask & catalog.bbq_mask
         
-        # 如果还是没有，返回评分最高的1个
-        if not recommended:
-            recommended = sorted(restaurants, key=lambda x: x['rating'], reverse=True)[:1]
-        
-        return recommended
+        # 按价格筛选（允许±20的浮动）
+        target_price = _parse_target_price(user_message)
+        if target_price is not None:
+            prices = index.columns["price"]
+            in_range = (prices >= max(0, target_price - 20)) & (prices <= target_price + 20)
+            mask = in_range if mask is None else mask & in_range
+        return mask
     
-    def _add_dish_images(self, restaurant: Dict) -> Dict:
-        """根据招牌菜动态生成或匹配图片URL"""
+    def _best_row(self, index: CatalogIndex, rows: np.ndarray, budget: Optional[float] = None) -> int:
+        """综合得分最高的行（只选出第一名，不排序）"""
+        scores = score_rows(index.columns, rows, budget, weights=self.score_weights)
+        return int(rows[top_k(scores, 1, index.rank_position[rows])[0]])
+    
+    def _add_dish_images(self, restaurant: Dict, catalog: Optional[CatalogSnapshot] = None) -> Dict:
+        """根据招牌菜设置图片URL（数据中的餐厅直接读取加载时解析好的图片列）"""
+        catalog = catalog or self.catalog
         signature_dish = restaurant.get('signature_dish', '')
-        
-        # 优先根据招牌菜匹配图片
-        dish_keywords = self._extract_dish_keywords(signature_dish)
-        
-        # 调试信息
-        print(f"[图片生成] 餐厅: {restaurant.get('name')}, 招牌菜: {signature_dish}, 关键词: {dish_keywords}")
-        
-        # 根据招牌菜关键词匹配图片（覆盖原有图片）
-        if dish_keywords:
-            if len(dish_keywords) >= 2:
-                # 有两个或更多招牌菜，分别匹配图片
-                restaurant['image1'] = self._get_food_image_url(dish_keywords[0], 0)
-                restaurant['image2'] = self._get_food_image_url(dish_keywords[1], 0)
-            else:
-                # 只有一个招牌菜，使用不同角度的图片
-                restaurant['image1'] = self._get_food_image_url(dish_keywords[0], 0)
-                restaurant['image2'] = self._get_food_image_url(dish_keywords[0], 1)
+        row = catalog.row_by_id.get(restaurant.get('id'))
+        if row is not None and catalog.index.records[row].get('signature_dish') == signature_dish:
+            urls, codes = catalog.dish_image_columns
+            restaurant['image1'] = urls[codes[0][row]]
+            restaurant['image2'] = urls[codes[1][row]]
         else:
-            # 如果没有招牌菜信息，使用默认图片
-            restaurant['image1'] = self._get_food_image_url('food', 0)
-            restaurant['image2'] = self._get_food_image_url('food', 1)
-        
-        # 确保图片URL不为空
-        if not restaurant.get('image1'):
-            restaurant['image1'] = self._get_food_image_url('food', 0)
-        if not restaurant.get('image2'):
-            restaurant['image2'] = self._get_food_image_url('food', 1)
-        
-        print(f"[图片生成] 生成的图片URL: image1={restaurant.get('image1')}, image2={restaurant.get('image2')}")
-        
+            restaurant['image1'], restaurant['image2'] = self.image_resolver.images_for(signature_dish)
         return restaurant
-    
-    def _extract_dish_keywords(self, signature_dish: str) -> List[str]:
-        """从招牌菜字符串中提取关键词"""
-        if not signature_dish:
-            return ['food']
-        
-        # 移除标点符号，按逗号、顿号、空格分割
-        dishes = re.split(r'[、，,\s]+', signature_dish)
-        # 过滤空字符串，取前2个
-        keywords = [d.strip() for d in dishes if d.strip()][:2]
-        return keywords if keywords else ['food']
-    
-    def _get_food_image_url(self, keyword: str, offset: int = 0) -> str:
-        """根据关键词获取美食图片URL（使用Unsplash Source API）"""
-        # 使用Unsplash Source API根据关键词动态获取图片
-        # 格式: https://source.unsplash.com/400x300/?keyword
-        
-        keyword_lower = keyword.lower()
-        
-        # 关键词映射到英文搜索词（用于Unsplash搜索）
-        keyword_mapping = {
-            # 火锅相关
-            '火锅': 'hotpot',
-            '毛肚': 'hotpot',
-            '虾滑': 'hotpot',
-            '牛肉片': 'hotpot',
-            '海底捞': 'hotpot',
-            '小龙坎': 'hotpot',
-            '大龙燚': 'hotpot',
-            '呷哺呷哺': 'hotpot',
-            '小肥羊': 'hotpot',
-            '麻辣牛肉': 'hotpot',
-            '鸭肠': 'hotpot',
-            '脑花': 'hotpot',
-            '黄喉': 'hotpot',
-            '肥牛': 'hotpot',
-            '蔬菜拼盘': 'hotpot',
-            '羊肉片': 'hotpot',
-            '羊蝎子': 'hotpot',
-            '手切羊肉': 'hotpot',
-            
-            # 烧烤相关
-            '烧烤': 'barbecue',
-            '烤肉': 'barbecue',
-            '烤串': 'barbecue',
-            '韩式烤肉': 'korean-barbecue',
-            '羊肉串': 'barbecue',
-            '烤': 'barbecue',
-            '石锅拌饭': 'korean-food',
-            '泡菜汤': 'korean-food',
-            
-            # 烤鸭相关
-            '烤鸭': 'peking-duck',
-            '北京烤鸭': 'peking-duck',
-            '焖炉烤鸭': 'peking-duck',
-            '鸭架汤': 'peking-duck',
-            '京酱肉丝': 'chinese-food',
-            
-            # 川菜
-            '麻婆豆腐': 'mapo-tofu',
-            '水煮鱼': 'sichuan-fish',
-            '宫保鸡丁': 'kung-pao-chicken',
-            '麻辣香锅': 'spicy-hot-pot',
-            '麻辣烫': 'spicy-soup',
-            '干锅牛蛙': 'spicy-food',
-            
-            # 面食
-            '拉面': 'ramen',
-            '牛肉拉面': 'beef-noodles',
-            '羊肉拉面': 'lamb-noodles',
-            '重庆小面': 'chongqing-noodles',
-            '豌杂面': 'noodles',
-            '红油抄手': 'wonton',
-            '米线': 'rice-noodles',
-            '过桥米线': 'rice-noodles',
-            '酸辣米线': 'spicy-noodles',
-            '凉拌牛肉': 'beef',
-            
-            # 饺子包子
-            '饺子': 'dumplings',
-            '包子': 'steamed-buns',
-            '小笼包': 'xiaolongbao',
-            '生煎包': 'pan-fried-buns',
-            '扁肉': 'wonton',
-            '拌面': 'noodles',
-            '蒸饺': 'dumplings',
-            
-            # 西餐
-            '披萨': 'pizza',
-            '牛排': 'steak',
-            '意面': 'pasta',
-            '意大利面': 'pasta',
-            '提拉米苏': 'tiramisu',
-            '玛格丽特披萨': 'pizza',
-            '意式肉酱面': 'pasta',
-            '意式香肠披萨': 'pizza',
-            
-            # 日式
-            '日式': 'japanese-food',
-            '寿司': 'sushi',
-            '乌冬面': 'udon',
-            '豚骨拉面': 'ramen',
-            '味增拉面': 'ramen',
-            '日式炸鸡': 'japanese-fried-chicken',
-            '天妇罗': 'tempura',
-            '牛肉饭': 'beef-rice',
-            '照烧鸡排饭': 'teriyaki-chicken',
-            '牛丼饭': 'gyudon',
-            '咖喱饭': 'curry-rice',
-            '日式套餐': 'japanese-bento',
-            '味增汤': 'miso-soup',
-            
-            # 粤菜
-            '虾饺': 'shrimp-dumplings',
-            '烧卖': 'shumai',
-            '叉烧包': 'char-siu-bao',
-            '茶点': 'dim-sum',
-            
-            # 其他
-            '黄焖鸡': 'braised-chicken',
-            '黄焖排骨': 'braised-pork',
-            '大盘鸡': 'xinjiang-chicken',
-            '手抓饭': 'pilaf',
-            '剁椒鱼头': 'fish-head',
-            '口味虾': 'spicy-shrimp',
-            '小炒肉': 'stir-fried-pork',
-            '锅包肉': 'sweet-sour-pork',
-            '地三鲜': 'three-delicacies',
-            '西湖醋鱼': 'west-lake-fish',
-            '东坡肉': 'dongpo-pork',
-            '龙井虾仁': 'shrimp',
-            '糖醋里脊': 'sweet-sour-pork',
-            '白切鸡': 'white-cut-chicken',
-            '鸭血粉丝汤': 'duck-blood-soup',
-            '盐水鸭': 'salted-duck',
-            '豆汁': 'beijing-food',
-            '焦圈': 'beijing-food',
-            '驴打滚': 'beijing-snack',
-            '卤肉饭': 'braised-pork-rice',
-            '豆浆': 'soy-milk',
-            '油条': 'youtiao',
-            '莜面': 'noodles',
-            '凉皮': 'liangpi',
-            '鸡汤': 'chicken-soup',
-            '蒸蛋': 'steamed-egg',
-            '小菜': 'side-dish',
-            '蒸排骨': 'steamed-ribs',
-            '蒸鸡': 'steamed-chicken',
-        }
-        
-        # 查找匹配的英文关键词
-        search_keyword = 'food'  # 默认关键词
-        
-        # 先尝试完全匹配
-        if keyword_lower in keyword_mapping:
-            search_keyword = keyword_mapping[keyword_lower]
-        else:
-            # 尝试部分匹配
-            for chinese_keyword, english_keyword in keyword_mapping.items():
-                if chinese_keyword in keyword_lower or keyword_lower in chinese_keyword:
-                    search_keyword = english_keyword
-                    break
-        
-        # 使用可靠的图片服务 - 使用food相关的Unsplash图片
-        # 为常见菜品提供高质量的图片URL
-        quality_image_map = {
-            'hotpot': [
-                'https://picsum.photos/seed/hotpot1/400/300',
-                'https://picsum.photos/seed/hotpot2/400/300',
-                'https://picsum.photos/seed/hotpot3/400/300'
-            ],
-            'barbecue': [
-                'https://picsum.photos/seed/barbecue1/400/300',
-                'https://picsum.photos/seed/barbecue2/400/300',
-                'https://picsum.photos/seed/barbecue3/400/300'
-            ],
-            'korean-barbecue': [
-                'https://picsum.photos/seed/korean1/400/300',
-                'https://picsum.photos/seed/korean2/400/300'
-            ],
-            'peking-duck': [
-                'https://picsum.photos/seed/duck1/400/300',
-                'https://picsum.photos/seed/duck2/400/300'
-            ],
-            'ramen': [
-                'https://picsum.photos/seed/ramen1/400/300',
-                'https://picsum.photos/seed/ramen2/400/300'
-            ],
-            'dumplings': [
-                'https://picsum.photos/seed/dumpling1/400/300',
-                'https://picsum.photos/seed/dumpling2/400/300'
-            ],
-            'pizza': [
-                'https://picsum.photos/seed/pizza1/400/300',
-                'https://picsum.photos/seed/pizza2/400/300'
-            ],
-            'steak': [
-                'https://picsum.photos/seed/steak1/400/300',
-                'https://picsum.photos/seed/steak2/400/300'
-            ],
-            'pasta': [
-                'https://picsum.photos/seed/pasta1/400/300',
-                'https://picsum.photos/seed/pasta2/400/300'
-            ],
-            'sushi': [
-                'https://picsum.photos/seed/sushi1/400/300',
-                'https://picsum.photos/seed/sushi2/400/300'
-            ],
-            'dim-sum': [
-                'https://picsum.photos/seed/dimsum1/400/300',
-                'https://picsum.photos/seed/dimsum2/400/300'
-            ],
-            'food': [
-                'https://picsum.photos/seed/food1/400/300',
-                'https://picsum.photos/seed/food2/400/300',
-                'https://picsum.photos/seed/food3/400/300',
-                'https://picsum.photos/seed/food4/400/300'
-            ],
-        }
-        
-        # 如果找到对应的图片URL，使用它
-        if search_keyword in quality_image_map:
-            img_urls = quality_image_map[search_keyword]
-            img_url = img_urls[offset % len(img_urls)]
-            return img_url
-        
-        # 否则使用默认的美食图片
-        default_images = quality_image_map.get('food', [
-            'https://images.unsplash.com/photo-1565299624946-b28f40a0ae38?w=400&h=300&fit=crop&q=80',
-            'https://images.unsplash.com/photo-1563379091339-03246963d19a?w=400&h=300&fit=crop&q=80'
-        ])
-        return default_images[offset % len(default_images)]
-
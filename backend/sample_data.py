@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""示例餐厅数据（50家）：没有数据文件时的默认数据，也是 catalog_generator.py 生成合成数据的词表来源
+
+只依赖pandas，生成器不必为读取示例数据导入推荐引擎（索引、HTTP客户端等）。
+"""
+import pandas as pd
+
+SAMPLE_RESTAURANTS = {
+    "id": range(1, 51),
+    "name": [
+        "川味小厨", "湘味轩", "粤式茶餐厅", "东北饺子王", "新疆大盘鸡",
+        "重庆小面", "兰州拉面", "沙县小吃", "黄焖鸡米饭", "麻辣香锅",
+        "日式拉面屋", "韩式烤肉", "泰式料理", "意式披萨", "法式西餐",
+        "麦当劳", "肯德基", "必胜客", "星巴克", "一点点",
+        "海底捞火锅", "小龙坎", "大龙燚", "呷哺呷哺", "小肥羊",
+        "老乡鸡", "真功夫", "永和大王", "李先生", "和合谷",
+        "西贝莜面村", "外婆家", "绿茶餐厅", "南京大牌档", "眉州东坡",
+        "全聚德", "便宜坊", "东来顺", "护国寺小吃", "庆丰包子铺",
+        "杨国福麻辣烫", "张亮麻辣烫", "小杨生煎", "阿香米线", "味千拉面",
+        "吉野家", "食其家", "丸龟制面", "萨莉亚", "达美乐披萨"
+    ],
+    "cuisine": [
+        "川菜", "湘菜", "粤菜", "东北菜", "新疆菜",
+        "川菜", "面食", "快餐", "快餐", "川菜",
+        "日式", "韩式", "泰式", "意式", "法式",
+        "快餐", "快餐", "快餐", "饮品", "饮品",
+        "火锅", "火锅", "火锅", "火锅", "火锅",
+        "快餐", "快餐", "快餐", "快餐", "快餐",
+        "西北菜", "杭帮菜", "江浙菜", "江浙菜", "川菜",
+        "京菜", "京菜", "京菜", "京菜", "京菜",
+        "麻辣烫", "麻辣烫", "江浙菜", "快餐", "日式",
+        "日式", "日式", "日式", "意式", "意式"
+    ],
+    "price": [
+        45, 52, 68, 38, 55, 25, 22, 20, 28, 58,
+        48, 85, 72, 65, 120, 35, 38, 55, 40, 25,
+        95, 88, 92, 75, 85, 35, 32, 28, 25, 30,
+        75, 65, 58, 72, 68, 150, 85, 120, 35, 25,
+        32, 28, 25, 22, 45, 38, 35, 42, 48, 62
+    ],
+    "rating": [
+        4.5, 4.6, 4.7, 4.4, 4.5, 4.3, 4.2, 4.0, 4.1, 4.6,
+        4.4, 4.5, 4.6, 4.5, 4.8, 4.2, 4.3, 4.4, 4.5, 4.3,
+        4.7, 4.6, 4.7, 4.5, 4.6, 4.3, 4.2, 4.1, 4.0, 4.2,
+        4.6, 4.5, 4.4, 4.7, 4.6, 4.8, 4.5, 4.7, 4.2, 4.1,
+        4.3, 4.2, 4.4, 4.1, 4.3, 4.2, 4.1, 4.3, 4.4, 4.5
+    ],
+    "delivery_time": [
+        35, 40, 45, 30, 50, 25, 28, 20, 30, 40,
+        35, 45, 50, 40, 60, 30, 35, 45, 25, 20,
+        50, 55, 60, 45, 50, 30, 28, 25, 25, 30,
+        45, 40, 35, 50, 45, 60, 40, 55, 30, 25,
+        30, 28, 25, 30, 35, 32, 30, 35, 38, 45
+    ],
+    "description": [
+        "正宗川味，麻辣鲜香", "湖南风味，香辣下饭", "广式茶点，精致美味", "东北风味，分量十足", "新疆特色，大盘实惠",
+        "重庆小面，麻辣过瘾", "兰州拉面，汤鲜味美", "沙县小吃，经济实惠", "黄焖鸡米饭，嫩滑香浓", "麻辣香锅，食材丰富",
+        "日式拉面，汤底浓郁", "韩式烤肉，肉质鲜嫩", "泰式料理，酸甜开胃", "意式披萨，芝士拉丝", "法式西餐，精致浪漫",
+        "快餐连锁，方便快捷", "炸鸡汉堡，经典美味", "披萨意面，多种选择", "咖啡饮品，提神醒脑", "奶茶果茶，香甜可口",
+        "火锅连锁，服务贴心", "重庆火锅，麻辣鲜香", "四川火锅，地道正宗", "台式火锅，清淡健康", "内蒙古火锅，羊肉鲜嫩",
+        "中式快餐，营养搭配", "蒸菜快餐，健康美味", "台式快餐，米饭配菜", "牛肉面，汤鲜肉烂", "日式快餐，精致美味",
+        "西北风味，面食丰富", "杭帮菜，清淡精致", "江浙菜，甜咸适中", "南京风味，鸭血粉丝", "川菜连锁，菜品丰富",
+        "北京烤鸭，皮脆肉嫩", "焖炉烤鸭，别有风味", "涮羊肉，肉质鲜嫩", "北京小吃，种类丰富", "包子铺，馅料多样",
+        "麻辣烫，自选食材", "麻辣烫连锁，口味统一", "生煎包，皮薄馅大", "米线，汤鲜味美", "日式拉面，汤底浓郁",
+        "日式快餐，牛肉饭", "日式快餐，多种套餐", "日式面食，乌冬面", "意式快餐，经济实惠", "披萨连锁，外送快速"
+    ],
+    "signature_dish": [
+        "麻婆豆腐、水煮鱼、宫保鸡丁", "剁椒鱼头、口味虾、小炒肉", "虾饺、烧卖、叉烧包", "猪肉大葱饺子、锅包肉、地三鲜", "大盘鸡、羊肉串、手抓饭",
+        "重庆小面、豌杂面、红油抄手", "牛肉拉面、羊肉拉面、凉拌牛肉", "扁肉、拌面、蒸饺", "黄焖鸡米饭、黄焖排骨", "麻辣香锅、干锅牛蛙",
+        "豚骨拉面、味增拉面、日式炸鸡", "韩式烤肉、石锅拌饭、泡菜汤", "冬阴功汤、泰式咖喱、芒果糯米饭", "玛格丽特披萨、意大利面、提拉米苏", "牛排、鹅肝、法式蜗牛",
+        "巨无霸、薯条、麦乐鸡", "原味鸡、香辣鸡腿堡、蛋挞", "超级至尊披萨、意式肉酱面", "拿铁、美式咖啡、星冰乐", "珍珠奶茶、四季春茶、波霸奶茶",
+        "毛肚、虾滑、牛肉片", "麻辣牛肉、鸭肠、脑花", "嫩牛肉、黄喉、毛肚", "肥牛、蔬菜拼盘、虾滑", "羊肉片、羊蝎子、手切羊肉",
+        "鸡汤、蒸蛋、小菜", "蒸蛋、蒸排骨、蒸鸡", "卤肉饭、豆浆、油条", "牛肉面、小菜", "日式套餐、味增汤",
+        "莜面、羊肉串、凉皮", "西湖醋鱼、东坡肉、龙井虾仁", "糖醋里脊、白切鸡、小笼包", "鸭血粉丝汤、盐水鸭、小笼包", "东坡肉、麻婆豆腐、宫保鸡丁",
+        "北京烤鸭、鸭架汤、京酱肉丝", "焖炉烤鸭、炸酱面", "涮羊肉、芝麻烧饼", "豆汁、焦圈、驴打滚", "猪肉大葱包子、三鲜包子",
+        "麻辣烫、自选配菜", "麻辣烫、自选配菜", "生煎包、小笼包", "过桥米线、酸辣米线", "味千拉面、日式炸鸡",
+        "牛肉饭、照烧鸡排饭", "牛丼饭、咖喱饭", "乌冬面、天妇罗", "意式肉酱面、披萨", "经典披萨、意式香肠披萨"
+    ],
+    "reviews": [
+        "味道正宗，麻辣鲜香！|分量很足，性价比高|服务态度好，配送快",
+        "湘菜很正宗，辣得过瘾|菜品新鲜，味道好|价格合理，值得推荐",
+        "茶点很精致，味道正宗|环境不错，适合聚餐|价格稍贵但值得",
+        "饺子皮薄馅大，很好吃|分量真的很足|性价比超高",
+        "大盘鸡分量足，味道好|羊肉串很香|配送时间稍长但值得等",
+        "小面很正宗，麻辣过瘾|价格便宜，性价比高|配送快，包装好",
+        "拉面劲道，汤很鲜|价格实惠|配送及时",
+        "价格便宜，味道不错|配送很快|适合工作餐",
+        "鸡肉嫩滑，米饭香|价格实惠|配送准时",
+        "食材新鲜，味道好|可以自选配菜|分量足",
+        "拉面汤底浓郁，很正宗|环境干净|价格适中",
+        "肉质新鲜，烤得很好|配菜丰富|价格稍贵但值得",
+        "泰式风味正宗|酸甜开胃|配送时间稍长",
+        "披萨芝士拉丝，很好吃|意面正宗|价格合理",
+        "菜品精致，味道好|环境优雅|价格较高但值得",
+        "经典快餐，味道稳定|配送快|价格适中",
+        "炸鸡外酥里嫩|配送准时|性价比不错",
+        "披萨种类多|味道不错|配送及时",
+        "咖啡香浓|服务好|配送快",
+        "奶茶好喝，甜度可选|价格便宜|配送快",
+        "服务很好，食材新鲜|配送包装好|价格稍贵",
+        "重庆火锅很正宗|麻辣过瘾|配送时间稍长",
+        "四川火锅地道|食材新鲜|味道好",
+        "台式火锅清淡|适合不吃辣的人|价格合理",
+        "羊肉很新鲜|汤底好|配送及时",
+        "营养搭配好|味道不错|价格实惠",
+        "蒸菜健康|味道清淡|配送快",
+        "台式快餐正宗|价格便宜|配送及时",
+        "牛肉面汤鲜|价格实惠|配送快",
+        "日式快餐精致|味道好|价格适中",
+        "西北风味正宗|面食好吃|价格合理",
+        "杭帮菜清淡|味道精致|环境好",
+        "江浙菜正宗|甜咸适中|价格合理",
+        "南京风味正宗|鸭血粉丝好吃|配送时间稍长",
+        "川菜连锁，味道稳定|菜品丰富|价格适中",
+        "烤鸭皮脆肉嫩|正宗北京味|价格较高但值得",
+        "焖炉烤鸭别有风味|价格合理|配送及时",
+        "涮羊肉肉质好|汤底鲜|价格稍贵",
+        "北京小吃种类多|味道正宗|价格实惠",
+        "包子皮薄馅大|价格便宜|配送快",
+        "可以自选配菜|味道好|价格实惠",
+        "麻辣烫口味统一|价格便宜|配送快",
+        "生煎包皮薄馅大|价格实惠|配送及时",
+        "米线汤鲜|价格便宜|配送快",
+        "拉面汤底浓郁|味道好|价格适中",
+        "牛肉饭好吃|价格合理|配送及时",
+        "套餐种类多|味道不错|价格实惠",
+        "乌冬面劲道|价格适中|配送快",
+        "意式快餐经济实惠|味道好|价格便宜",
+        "披萨外送快|味道好|价格合理"
+    ]
+}
+
+
+def create_sample_data() -> pd.DataFrame:
+    """创建示例数据集"""
+    return pd.DataFrame(SAMPLE_RESTAURANTS)
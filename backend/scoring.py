@@ -0,0 +1,78 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+# 综合打分的默认权重：评分、价格与预算的接近程度、配送速度、关键词匹配度
+DEFAULT_WEIGHTS = {"rating": 1.0, "price": 0.6, "delivery": 0.4, "relevance": 0.8}
+
+# 配送时间达到这个分钟数时配送得分为0
+DELIVERY_HORIZON = 90.0
+
+
+def parse_weights(value: Optional[str]) -> Dict[str, float]:
+    """解析 "rating=1,price=0.5" 形式的权重配置，未给出的项使用默认值"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (value or "").split(","):
+        name, sep, number = part.partition("=")
+        name = name.strip()
+        if not name:
+            continue
+        if not sep or name not in DEFAULT_WEIGHTS:
+            raise ValueError(f"无效的打分权重: {part.strip()}")
+        weights[name] = float(number)
+    return weights
+
+
+def budget_from_range(min_price: Optional[float], max_price: Optional[float]) -> Optional[float]:
+    """由价格区间推出预算：两端都有时取中点，否则取给出的一端"""
+    if min_price is not None and max_price is not None:
+        return (min_price + max_price) / 2
+    return max_price if max_price is not None else min_price
+
+
+def score_rows(
+    columns: Dict[str, np.ndarray],
+    rows: np.ndarray,
+    budget: Optional[float] = None,
+    relevance: Optional[np.ndarray] = None,
+    weights: Optional[Dict[str, float]] = None
+) -> np.ndarray:
+    """对给定行向量化计算综合得分，各项先归一化到 [0, 1] 再加权求和（缺失值记0分）
+
+    没有预算时不计价格项，没有关键词匹配度时不计匹配度项。
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    scores = weights["rating"] * np.nan_to_num(columns["rating"][rows] / 5.0)
+
+    delivery = np.clip(1.0 - columns["delivery_time"][rows] / DELIVERY_HORIZON, 0.0, 1.0)
+    scores += weights["delivery"] * np.nan_to_num(delivery)
+
+    if budget is not None and budget > 0:
+        distance = np.abs(columns["price"][rows] - budget) / budget
+        scores += weights["price"] * np.nan_to_num(np.clip(1.0 - distance, 0.0, 1.0))
+
+    if relevance is not None and len(relevance):
+        top = relevance.max()
+        if top > 0:
+            scores += weights["relevance"] * relevance / top
+    return scores
+
+
+def top_k(scores: np.ndarray, k: Optional[int] = None, tiebreak: Optional[np.ndarray] = None) -> np.ndarray:
+    """返回得分最高的k个位置（按得分降序，并列时按tiebreak升序）
+
+    先用 argpartition 在 O(N) 内选出前k个，只对这k个排序；k为空或不小于N时整体排序。
+    """
+    n = len(scores)
+    if tiebreak is None:
+        tiebreak = np.arange(n)
+    if k is None or k >= n:
+        return np.lexsort((tiebreak, -scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    # 第k名的得分可能有并列，把与之相同的都取出来再按tiebreak排序，结果与整体排序一致
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    threshold = scores[candidates].min()
+    candidates = np.flatnonzero(scores >= threshold)
+    order = np.lexsort((tiebreak[candidates], -scores[candidates]))
+    return candidates[order[:k]]
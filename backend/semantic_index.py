@@ -0,0 +1,213 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scoring import top_k
+from text_search import lower_text
+
+# 参与向量化的字段及权重：菜系和招牌菜最能代表用户的意图，权重最高；评价多是"好吃""配送快"之类的
+# 通用短语，会让寒暄消息也命中，不参与向量化
+EMBEDDING_FIELDS = {"name": 2.0, "cuisine": 3.0, "signature_dish": 2.5, "description": 1.0}
+
+# 哈希向量维数：EMBEDDING_DIM 未设置时按餐厅数选取，矩阵不超过 _MATRIX_BUDGET 字节，维数在 [_MIN_DIM, _MAX_DIM] 内
+DEFAULT_DIM = int(os.getenv("EMBEDDING_DIM") or 0) or None
+_MIN_DIM = 256
+_MAX_DIM = 2048
+_MATRIX_BUDGET = 64 << 20
+
+# 构建时每批处理的行数，限制计数矩阵的临时内存
+_CHUNK_ROWS = 20000
+
+# 增量更新后单独存放的向量超过这个比例时整体重建
+REBUILD_RATIO = 0.05
+
+_HASH_A = np.uint64(0x9E3779B1)
+_HASH_B = np.uint64(0x85EBCA77)
+_HASH_MASK = np.uint64(0xFFFFFFFF)
+
+
+def embedding_dim(rows: int) -> int:
+    """按餐厅数选取向量维数（2的幂）：餐厅少时用更高的维数减少哈希冲突"""
+    budget = _MATRIX_BUDGET // (max(rows, 1) * 4)
+    return int(min(_MAX_DIM, max(_MIN_DIM, 1 << max(budget, 1).bit_length() - 1)))
+
+
+def _gram_hashes(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """一批文本中全部字符二元组的32位哈希，返回 (所在文本序号, 哈希值)
+
+    不使用单字：单字（"好""吃"）在大量餐厅中出现，"你好"之类的寒暄也会命中。
+    """
+    joined = "\0".join(texts) + "\0"
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), [len(text) + 1 for text in texts])
+    separator = codes == 0
+    valid = ~(separator[:-1] | separator[1:])
+    bigrams = ((codes[:-1] * _HASH_A) ^ (codes[1:] * _HASH_B)) & _HASH_MASK
+    return rows[:-1][valid], bigrams[valid]
+
+
+def _in_vocabulary(hashes: np.ndarray, vocabulary: np.ndarray) -> np.ndarray:
+    """哈希值是否在升序的词表中"""
+    if not len(vocabulary):
+        return np.zeros(len(hashes), dtype=bool)
+    positions = np.minimum(np.searchsorted(vocabulary, hashes), len(vocabulary) - 1)
+    return vocabulary[positions] == hashes
+
+
+def _term_frequencies(
+    fields: List[Tuple[List[str], float]],
+    count: int,
+    dim: int,
+    vocabulary: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """带符号的特征哈希：各字段的n-gram按权重累加到 hash % dim 维，符号取哈希的最高位，
+    冲突的特征在内积中大致相互抵消；再做亚线性缩放 sign(x) * log(1 + |x|)
+
+    vocabulary 给出时只保留其中的n-gram：查询中餐厅数据里没有的n-gram会与某个餐厅特征哈希冲突，
+    落在IDF很高的维度上造成误命中，直接丢弃。返回 (词频矩阵, 出现过的哈希值（升序去重）)。
+    """
+    counts = np.zeros(count * dim, dtype=np.float64)
+    seen = []
+    for texts, weight in fields:
+        rows, hashes = _gram_hashes(texts)
+        if vocabulary is not None:
+            known = _in_vocabulary(hashes, vocabulary)
+            rows, hashes = rows[known], hashes[known]
+        seen.append(hashes)
+        dims = (hashes % np.uint64(dim)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(31), -weight, weight)
+        counts += np.bincount(rows * dim + dims, weights=signs, minlength=count * dim)
+    counts = counts.reshape(count, dim)
+    tf = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+    return tf, np.unique(np.concatenate(seen)) if seen else np.empty(0, dtype=np.uint64)
+
+
+def _record_fields(records: List[Dict]) -> List[Tuple[List[str], float]]:
+    return [([lower_text(record.get(field)) for record in records], weight) for field, weight in EMBEDDING_FIELDS.items()]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+    norms[norms == 0] = 1
+    matrix /= norms[:, None]
+    return matrix
+
+
+class SemanticIndex:
+    """本地计算的字符n-gram哈希TF-IDF向量索引，用余弦相似度为聊天消息召回最相关的餐厅
+
+    所有餐厅的向量存放在一块连续的 float32 矩阵中（每行已归一化），查询是一次矩阵-向量乘法，
+    再用 argpartition 选出前k个。不依赖网络和模型文件。
+    增量更新时矩阵和IDF不变，变化的行单独存放向量，查询时一起参与打分。
+    """
+
+    def __init__(self, records: List[Dict], dim: Optional[int] = DEFAULT_DIM):
+        self.dim = dim or embedding_dim(len(records))
+        dim = self.dim
+        # 当前行数（增量更新后可能与矩阵行数不同）
+        self.size = len(records)
+        self.matrix = np.zeros((self.size, dim), dtype=np.float32)
+        document_frequency = np.zeros(dim, dtype=np.int64)
+        vocabulary = []
+        for start in range(0, self.size, _CHUNK_ROWS):
+            chunk = records[start:start + _CHUNK_ROWS]
+            tf, hashes = _term_frequencies(_record_fields(chunk), len(chunk), dim)
+            document_frequency += np.count_nonzero(tf, axis=0)
+            self.matrix[start:start + len(tf)] = tf
+            vocabulary.append(hashes)
+        # 餐厅数据中出现过的n-gram哈希（升序），查询时只保留其中的n-gram
+        self.vocabulary = np.unique(np.concatenate(vocabulary)) if vocabulary else np.empty(0, dtype=np.uint64)
+        self.idf = (np.log((1 + self.size) / (1 + document_frequency)) + 1).astype(np.float32)
+        for start in range(0, self.size, _CHUNK_ROWS):
+            block = self.matrix[start:start + _CHUNK_ROWS]
+            block *= self.idf
+            _normalize(block)
+        # 矩阵中的行号 -> 当前行号（-1表示已删除或已修改）；None表示与当前行号一致
+        self.base_map: Optional[np.ndarray] = None
+        # 矩阵之外单独存放的当前行及其向量（增量更新后修改或新增的行）
+        self.extra_rows = np.empty(0, dtype=np.int64)
+        self.extra_vectors = np.empty((0, dim), dtype=np.float32)
+
+    def _embed(self, fields: List[Tuple[List[str], float]], count: int, vocabulary: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if not count:
+            return np.empty((0, self.dim), dtype=np.float32), np.empty(0, dtype=np.uint64)
+        tf, hashes = _term_frequencies(fields, count, self.dim, vocabulary)
+        return _normalize(tf * self.idf), hashes
+
+    def embed_records(self, records: List[Dict]) -> np.ndarray:
+        """按当前IDF把餐厅转成归一化的向量"""
+        return self._embed(_record_fields(records), len(records))[0]
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """按当前IDF把一段查询文本转成归一化的向量（只保留餐厅数据中出现过的n-gram）"""
+        return self._embed([([text.lower()], 1.0)], 1, self.vocabulary)[0][0]
+
+    def search(
+        self,
+        text: str,
+        k: int,
+        within: Optional[np.ndarray] = None,
+        min_score: float = 0.0,
+        min_ratio: float = 0.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """返回与文本最相似的至多k行 (行号, 余弦相似度)，按相似度降序
+
+        只含相似度大于 min_score、且不低于最高相似度的 min_ratio 倍的行（相对阈值：各消息的相似度量级
+        差别很大，只保留与最相关的餐厅相差不远的行）。within 为升序的行号时只在这些行中查找（如配送半径内的餐厅）。
+        """
+        query = self.embed_text(text)
+        if within is not None and self.base_map is None and not len(self.extra_rows):
+            # 矩阵行号即当前行号：只计算候选行
+            rows = np.asarray(within, dtype=np.int64)
+            scores = self.matrix[rows] @ query
+        else:
+            scores = self.matrix @ query
+            rows = np.arange(len(scores)) if self.base_map is None else self.base_map
+            if self.base_map is not None:
+                scores[rows < 0] = -1
+            if len(self.extra_rows):
+                scores = np.concatenate([scores, self.extra_vectors @ query])
+                rows = np.concatenate([rows, self.extra_rows])
+            if within is not None:
+                allowed = np.zeros(self.size, dtype=bool)
+                allowed[within] = True
+                scores[~allowed[np.maximum(rows, 0)] | (rows < 0)] = -1
+        positions = top_k(scores, k, rows)
+        positions = positions[scores[positions] > min_score]
+        if len(positions) and min_ratio > 0:
+            positions = positions[scores[positions] >= min_ratio * scores[positions[0]]]
+        return rows[positions], scores[positions]
+
+    def patched(self, records: List[Dict], removed: np.ndarray, changed: np.ndarray, structural: bool) -> "SemanticIndex":
+        """增量更新（参数同 CatalogIndex.patched）：共享矩阵，只为变化的行计算向量"""
+        if len(self.extra_rows) + len(changed) > max(1000, REBUILD_RATIO * len(records)):
+            return SemanticIndex(records, self.dim)
+
+        # 上一版本的行号 -> 新行号（被删除或被修改的行为-1）
+        previous = np.arange(self.size, dtype=np.int64)
+        if structural:
+            keep = np.ones(self.size, dtype=bool)
+            keep[removed] = False
+            previous = np.where(keep, np.cumsum(keep) - 1, -1)
+        previous[np.isin(previous, changed)] = -1
+
+        index = object.__new__(SemanticIndex)
+        index.dim, index.size, index.matrix, index.idf = self.dim, len(records), self.matrix, self.idf
+        if self.base_map is None:
+            index.base_map = previous
+        else:
+            index.base_map = np.where(self.base_map >= 0, previous[np.maximum(self.base_map, 0)], -1)
+
+        # 之前单独存放的行重新编号，再加入这次变化的行
+        extra_rows = previous[self.extra_rows] if len(self.extra_rows) else self.extra_rows
+        keep = extra_rows >= 0
+        rows = np.concatenate([extra_rows[keep], np.asarray(changed, dtype=np.int64)])
+        changed_records = [records[row] for row in changed]
+        vectors, hashes = self._embed(_record_fields(changed_records), len(changed_records))
+        vectors = np.concatenate([self.extra_vectors[keep], vectors])
+        # 新出现的n-gram加入词表（IDF不变）
+        index.vocabulary = np.union1d(self.vocabulary, hashes) if len(hashes) else self.vocabulary
+        order = np.argsort(rows, kind="stable")
+        index.extra_rows, index.extra_vectors = rows[order], vectors[order]
+        return index
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""多进程部署：预先加载一次餐厅数据，再fork出多个uvicorn worker共用
+
+父进程先把餐厅数据编译成列式文件放到共享内存目录（/dev/shm），再导入应用、
+构建索引，然后fork出N个worker共同监听同一个端口。各worker通过mmap映射同一份
+只读数值列（真正共享，不随worker数增长）；父进程中构建好的Python对象（记录字典、字符串、
+索引结构）以写时复制方式共享，但worker处理请求时对这些对象的引用计数更新会弄脏所在页面，
+这部分内存会逐渐复制到每个worker中。
+
+用法：
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def prepare_shared_catalog() -> str:
+    """把餐厅数据放到共享内存目录中，返回列式文件路径（已有新的列式文件时直接使用）"""
+    from catalog_store import catalog_is_fresh, compile_csv
+
+    csv_path = os.path.join(BACKEND_DIR, "data", "restaurants.csv")
+    binary_path = os.getenv("CATALOG_BINARY_PATH", os.path.join(BACKEND_DIR, "data", "restaurants.rcat"))
+    if catalog_is_fresh(binary_path, csv_path) or not os.path.exists(csv_path):
+        return ""
+    shared_dir = os.getenv("CATALOG_SHARED_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+    shared_path = os.path.join(shared_dir, f"ai-food-catalog-{os.getpid()}.rcat")
+    rows = compile_csv(csv_path, shared_path)
+    print(f"餐厅数据已编译到共享内存: {shared_path}（{rows} 行）")
+    return shared_path
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, app):
+    """子进程：在继承的socket上运行uvicorn"""
+    import uvicorn
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=os.getenv("LOG_LEVEL", "info"))
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def main(args) -> int:
+    if not hasattr(os, "fork"):
+        print("当前平台不支持fork，请使用 python main.py 单进程运行")
+        return 1
+
+    shared_path = prepare_shared_catalog()
+    if shared_path:
+        os.environ["CATALOG_BINARY_PATH"] = shared_path
+
+    # 在父进程中加载数据、构建索引，fork之后各worker共享
+    sys.path.insert(0, BACKEND_DIR)
+    import main as app_module
+    app_module.recommendation_engine.catalog.json_snapshot()
+    sock = bind_socket(args.host, args.port)
+    # 把已加载的对象移出GC跟踪，避免worker中的垃圾回收触碰这些页面导致写时复制（引用计数更新仍会复制被访问的页面）
+    gc.freeze()
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, app_module.app)
+            finally:
+                os._exit(0)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(args.workers):
+        spawn()
+    print(f"已启动 {args.workers} 个worker，监听 http://{args.host}:{args.port}")
+
+    try:
+        while workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = workers.pop(pid, None)
+            if started is None or stopping:
+                continue
+            print(f"worker {pid} 意外退出（状态 {status}），重新启动")
+            # 刚启动就退出说明配置有问题，避免无限快速重启
+            if time.monotonic() - started < 1:
+                time.sleep(1)
+            spawn()
+    finally:
+        sock.close()
+        if shared_path and os.path.exists(shared_path):
+            os.unlink(shared_path)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# 每纬度对应的公里数
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# 默认网格边长（度），约11公里，配送半径内通常只需要查几个格子
+DEFAULT_CELL_DEGREES = 0.1
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """一个点到一组点的球面距离（公里）"""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    """经纬度网格索引：有坐标的行按 (纬度格, 经度格) 排序，
+    查询时每个纬度格只需两次二分取出连续的经度格区间，再按球面距离精确过滤"""
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.cell = cell_degrees
+        self.width = int(math.ceil(360 / cell_degrees)) + 1
+        valid = (
+            np.isfinite(latitudes) & np.isfinite(longitudes)
+            & (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+        )
+        rows = np.flatnonzero(valid)
+        keys = self._cell(latitudes[rows], 90) * self.width + self._cell(longitudes[rows], 180)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.rows = rows[order]
+        self.size = len(rows)
+
+    def _cell(self, values, offset: float):
+        return np.floor((np.asarray(values) + offset) / self.cell).astype(np.int64)
+
+    def _lon_ranges(self, longitude: float, span: float):
+        """经度区间对应的经度格范围，跨越 ±180° 时拆成两段"""
+        if span >= 180:
+            return [(-180.0, 180.0)]
+        low, high = longitude - span, longitude + span
+        if low < -180:
+            return [(low + 360, 180.0), (-180.0, high)]
+        if high > 180:
+            return [(low, 180.0), (-180.0, high - 360)]
+        return [(low, high)]
+
+    def within(self, latitude: float, longitude: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """返回距离不超过 radius_km 的 (行号升序, 距离公里数)"""
+        lat_span = radius_km / KM_PER_DEGREE
+        lat_low, lat_high = max(-90.0, latitude - lat_span), min(90.0, latitude + lat_span)
+        # 经度跨度按区间内离赤道最远的纬度计算，保证覆盖整个圆
+        widest = math.cos(math.radians(max(abs(lat_low), abs(lat_high))))
+        lon_span = 180.0 if widest < 1e-9 else lat_span / widest
+        lon_ranges = [(int(self._cell(low, 180)), int(self._cell(high, 180))) for low, high in self._lon_ranges(longitude, lon_span)]
+
+        chunks = []
+        for lat_cell in range(int(self._cell(lat_low, 90)), int(self._cell(lat_high, 90)) + 1):
+            base = lat_cell * self.width
+            for low, high in lon_ranges:
+                start = np.searchsorted(self.keys, base + low, side="left")
+                stop = np.searchsorted(self.keys, base + high, side="right")
+                if stop > start:
+                    chunks.append(self.rows[start:stop])
+        if not chunks:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        candidates = np.concatenate(chunks)
+        distances = haversine_km(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+        keep = distances <= radius_km
+        rows, distances = candidates[keep], distances[keep]
+        order = np.argsort(rows, kind="stable")
+        return rows[order], distances[order]
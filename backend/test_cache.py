@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试大模型回复缓存（进程内LRU+TTL、SQLite和Redis协议共享后端）"""
+import asyncio
+
+from cache import CompletionCache, RedisCacheBackend, SQLiteCacheBackend, TTLCache
+
+
+def test_ttl_cache_evicts_lru_and_expired():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+
+
+def test_key_ignores_whitespace_differences():
+    key1 = CompletionCache.make_key("m", [{"role": "user", "content": "想吃  烧烤 "}], 0.7, 200)
+    key2 = CompletionCache.make_key("m", [{"role": "user", "content": "想吃 烧烤"}], 0.7, 200)
+    key3 = CompletionCache.make_key("m", [{"role": "user", "content": "想吃 烧烤"}], 0.2, 200)
+    # max_tokens较小的截断回复不能用于更长的请求
+    key4 = CompletionCache.make_key("m", [{"role": "user", "content": "想吃 烧烤"}], 0.7, 50)
+    assert key1 == key2
+    assert key1 != key3
+    assert key1 != key4
+
+
+def test_close_completion_cache_closes_backend(tmp_path, monkeypatch):
+    import cache
+
+    monkeypatch.setattr(cache, "_completion_cache", None)
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    monkeypatch.setenv("LLM_CACHE_BACKEND", f"sqlite:///{tmp_path / 'cache.db'}")
+    backend = cache.get_completion_cache().backend
+    asyncio.run(cache.close_completion_cache())
+    assert cache._completion_cache is None
+    assert backend._executor._shutdown
+
+
+def test_sqlite_backend_is_shared_between_caches(tmp_path):
+    async def run():
+        path = str(tmp_path / "cache.db")
+        first = CompletionCache(backend=SQLiteCacheBackend(path))
+        second = CompletionCache(backend=SQLiteCacheBackend(path))
+        await first.set("k", "回复")
+        assert await second.get("k") == "回复"
+        assert await second.get("missing") is None
+        return second.stats()
+
+    stats = asyncio.run(run())
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["backend_hits"] == 1
+
+
+def test_sqlite_backend_removes_expired_rows_and_caps_size(tmp_path):
+    async def run():
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_rows=3, cleanup_interval=0)
+        await backend.set("expired", "旧回复", ttl=-1)
+        for i in range(5):
+            await backend.set(f"k{i}", f"回复{i}", ttl=60 + i)
+        keys = [row[0] for row in backend._conn.execute("SELECT key FROM completions ORDER BY key")]
+        value = await backend.get("k4")
+        await backend.close()
+        return keys, value
+
+    keys, value = asyncio.run(run())
+    assert keys == ["k2", "k3", "k4"]
+    assert value == "回复4"
+
+
+async def _fake_redis_server(store):
+    """只支持 GET/SET 的本地Redis协议服务"""
+    async def handle(reader, writer):
+        while True:
+            header = await reader.readline()
+            if not header:
+                break
+            args = []
+            for _ in range(int(header[1:])):
+                length = int((await reader.readline())[1:])
+                args.append((await reader.readexactly(length + 2))[:-2].decode())
+            if args[0] == "GET":
+                value = store.get(args[1])
+                writer.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value.encode()), value.encode()))
+            else:
+                store[args[1]] = args[2]
+                writer.write(b"+OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_redis_backend_round_trip():
+    async def run():
+        store = {}
+        server = await _fake_redis_server(store)
+        port = server.sockets[0].getsockname()[1]
+        backend = RedisCacheBackend("127.0.0.1", port)
+        cache = CompletionCache(backend=backend)
+        await cache.set("k", "推荐韩式烤肉")
+        other = CompletionCache(backend=backend)
+        value = await other.get("k")
+        await backend.close()
+        server.close()
+        return store, value
+
+    store, value = asyncio.run(run())
+    assert store == {"llm:k": "推荐韩式烤肉"}
+    assert value == "推荐韩式烤肉"
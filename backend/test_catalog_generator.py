@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试合成餐厅数据生成器"""
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from catalog_generator import COLUMNS, CatalogGenerator, generate_catalog
+from catalog_store import load_catalog
+from sample_data import create_sample_data
+
+
+def test_chunks_follow_sample_schema_and_ranges():
+    sample = create_sample_data()
+    chunks = list(CatalogGenerator(seed=1, coordinates=True).chunks(2500, chunk_rows=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+
+    df = pd.concat(chunks, ignore_index=True)
+    assert list(df.columns) == COLUMNS + ["latitude", "longitude"]
+    assert df["id"].tolist() == list(range(1, 2501))
+    assert not df.isna().any().any()
+    assert set(df["cuisine"]) <= set(sample["cuisine"])
+    assert df["price"].between(8, 600).all()
+    assert df["rating"].between(2.5, 5.0).all()
+    assert df["delivery_time"].between(10, 120).all()
+    assert df["image1"].str.startswith("http").all()
+    # 招牌菜不重复
+    assert all(len(set(dishes.split("、"))) == len(dishes.split("、")) for dishes in df["signature_dish"])
+
+
+def test_same_seed_is_deterministic():
+    first = CatalogGenerator(seed=7).chunk(1, 200)
+    second = CatalogGenerator(seed=7).chunk(1, 200)
+    pd.testing.assert_frame_equal(first, second)
+    assert not first.equals(CatalogGenerator(seed=8).chunk(1, 200))
+
+
+def test_generate_catalog_writes_csv_and_binary(tmp_path):
+    csv_path = str(tmp_path / "restaurants.csv")
+    rcat_path = str(tmp_path / "restaurants.rcat")
+    assert generate_catalog(csv_path, 1200, seed=3, chunk_rows=500) == 1200
+    assert generate_catalog(rcat_path, 1200, seed=3, chunk_rows=500) == 1200
+
+    from_csv = pd.read_csv(csv_path, encoding="utf-8-sig")
+    assert list(from_csv.columns) == COLUMNS
+    assert len(from_csv) == 1200
+    catalog = load_catalog(rcat_path)
+    assert len(catalog) == 1200
+    assert list(catalog["name"][:5]) == list(from_csv["name"][:5])
+    assert catalog["price"].tolist() == from_csv["price"].tolist()
+
+
+def test_generator_does_not_import_the_engine():
+    code = "import sys, catalog_generator; print('recommendation' in sys.modules, 'httpx' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert output.split() == ["False", "False"]
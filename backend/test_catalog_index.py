@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试列式索引筛选结果与原pandas实现一致"""
+import itertools
+
+from recommendation import RecommendationEngine
+
+
+def _pandas_filter(df, cuisine=None, min_price=None, max_price=None,
+                   min_rating=None, max_delivery_time=None, keyword=None):
+    filtered_df = df.copy()
+    if cuisine:
+        filtered_df = filtered_df[filtered_df["cuisine"] == cuisine]
+    if min_price is not None:
+        filtered_df = filtered_df[filtered_df["price"] >= min_price]
+    if max_price is not None:
+        filtered_df = filtered_df[filtered_df["price"] <= max_price]
+    if min_rating is not None:
+        filtered_df = filtered_df[filtered_df["rating"] >= min_rating]
+    if max_delivery_time is not None:
+        filtered_df = filtered_df[filtered_df["delivery_time"] <= max_delivery_time]
+    if keyword:
+        filtered_df = filtered_df[
+            filtered_df["name"].str.contains(keyword, case=False, na=False) |
+            filtered_df["description"].str.contains(keyword, case=False, na=False) |
+            filtered_df["signature_dish"].str.contains(keyword, case=False, na=False) |
+            filtered_df["reviews"].str.contains(keyword, case=False, na=False)
+        ]
+    filtered_df = filtered_df.sort_values(["rating", "price"], ascending=[False, True])
+    return filtered_df.to_dict(orient="records")
+
+
+def test_filter_matches_pandas():
+    engine = RecommendationEngine()
+    cases = itertools.product(
+        [None, "川菜", "火锅", "不存在的菜系"],
+        [None, 30],
+        [None, 60],
+        [None, 4.5],
+        [None, 35],
+        [None, "拉面", "快餐", "辣", "好吃"],
+    )
+    for cuisine, min_price, max_price, min_rating, max_delivery_time, keyword in cases:
+        kwargs = dict(
+            cuisine=cuisine, min_price=min_price, max_price=max_price,
+            min_rating=min_rating, max_delivery_time=max_delivery_time, keyword=keyword
+        )
+        assert engine.filter_restaurants(**kwargs) == _pandas_filter(engine.df, **kwargs), kwargs
+
+
+def test_filter_results_are_copies():
+    engine = RecommendationEngine()
+    results = engine.filter_restaurants(cuisine="川菜")
+    results[0]["image1"] = "changed"
+    assert engine.filter_restaurants(cuisine="川菜")[0]["image1"] != "changed"
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试 /api/restaurants 预序列化快照（ETag、预压缩、分页、字段投影）"""
+import gzip
+import json
+
+from catalog_json import CatalogJSONSnapshot, choose_encoding
+
+
+def test_snapshot_pages_are_slices_of_full_body():
+    records = [{"id": i, "name": f"餐厅{i}", "price": i * 1.5} for i in range(10)]
+    snapshot = CatalogJSONSnapshot(records, ["id", "name", "price"])
+
+    assert json.loads(snapshot.body) == {"data": records}
+    assert json.loads(gzip.decompress(snapshot.encoded["gzip"])) == {"data": records}
+
+    page = json.loads(snapshot.page(0, 4))
+    assert page == {"data": records[:4], "next_cursor": "4"}
+    page = json.loads(snapshot.page(8, 4))
+    assert page == {"data": records[8:], "next_cursor": None}
+    assert json.loads(snapshot.page(20, 4)) == {"data": [], "next_cursor": None}
+
+    page = json.loads(snapshot.page(2, 2, ["price", "id"]))
+    assert page == {"data": [{"price": 3.0, "id": 2}, {"price": 4.5, "id": 3}], "next_cursor": "4"}
+    assert json.loads(b"[" + snapshot.encode_rows([5, 1]) + b"]") == [records[5], records[1]]
+
+
+def test_choose_encoding():
+    available = {"gzip": b"", "br": b""}
+    assert choose_encoding("gzip, deflate, br", available) == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0", available) == "gzip"
+    assert choose_encoding("identity", available) is None
+    assert choose_encoding("", {"gzip": b""}) is None
+
+
+def test_restaurants_endpoint_etag():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        response = client.get("/api/restaurants")
+        assert response.status_code == 200
+        assert response.json()["data"] == main.recommendation_engine.get_all_restaurants()
+
+        cached = client.get("/api/restaurants", headers={"If-None-Match": response.headers["etag"]})
+        assert cached.status_code == 304
+
+
+def test_recommend_endpoint_pagination_and_fields():
+    from fastapi.testclient import TestClient
+    import main
+
+    engine = main.recommendation_engine
+    expected = engine.filter_restaurants(max_price=40)
+    with TestClient(main.app) as client:
+        response = client.post("/api/recommend", json={
+            "max_price": 40, "fields": ["id", "name"], "cursor": "1", "limit": 2
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert body["data"] == [{"id": r["id"], "name": r["name"]} for r in expected[1:3]]
+        assert body["recommendations"] == []
+        assert body["next_cursor"] == ("3" if len(expected) > 3 else None)
+
+        response = client.get("/api/restaurants", params={"fields": "id,unknown"})
+        assert response.status_code == 400
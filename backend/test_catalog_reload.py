@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试餐厅数据热加载（快照原子替换、文件监控、管理接口）"""
+import asyncio
+import os
+
+import pandas as pd
+
+from recommendation import RecommendationEngine
+
+
+def test_reload_swaps_snapshot():
+    engine = RecommendationEngine()
+    old = engine.catalog
+    df = engine.df.copy()
+    df.loc[df["name"] == "川味小厨", "price"] = 999
+
+    new = asyncio.run(engine.reload_catalog_async(df))
+    assert engine.catalog is new and new.version == old.version + 1
+    assert engine.filter_restaurants(min_price=999)[0]["name"] == "川味小厨"
+    # 持有旧快照的请求继续看到旧数据
+    assert old.index.query(min_price=999).size == 0
+    assert new.json_snapshot() is not old.json_snapshot()
+
+
+def test_watch_reloads_changed_file(tmp_path):
+    engine = RecommendationEngine()
+    csv_path = str(tmp_path / "restaurants.csv")
+    engine.df.to_csv(csv_path, index=False, encoding="utf-8-sig")
+    engine.data_path = csv_path
+    engine.binary_path = str(tmp_path / "restaurants.rcat")
+    engine._catalog_signature = engine._source_signature()
+
+    async def run():
+        watcher = asyncio.create_task(engine.watch_catalog(0.01))
+        pd.DataFrame(engine.df.iloc[:3]).to_csv(csv_path, index=False, encoding="utf-8-sig")
+        os.utime(csv_path, ns=(0, 10 ** 18))
+        for _ in range(200):
+            if engine.index.size == 3:
+                break
+            await asyncio.sleep(0.01)
+        watcher.cancel()
+
+    asyncio.run(run())
+    assert engine.index.size == 3
+
+
+def test_admin_reload_requires_token(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        assert client.post("/api/admin/catalog/reload").status_code == 403
+
+        monkeypatch.setenv("ADMIN_TOKEN", "secret")
+        assert client.post("/api/admin/catalog/reload", headers={"X-Admin-Token": "wrong"}).status_code == 401
+        version = main.recommendation_engine.catalog_version
+        response = client.post("/api/admin/catalog/reload", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        assert response.json()["version"] == version + 1
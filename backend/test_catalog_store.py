@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试二进制列式餐厅数据文件的编译与mmap加载"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import compile_csv, load_catalog, write_catalog
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "data", "restaurants.csv")
+
+
+def test_compile_roundtrip(tmp_path):
+    path = str(tmp_path / "restaurants.rcat")
+    # 小块读取，覆盖多块拼接
+    assert compile_csv(CSV_PATH, path, chunksize=7) > 0
+
+    expected = pd.read_csv(CSV_PATH, encoding="utf-8-sig")
+    df = load_catalog(path)
+    pd.testing.assert_frame_equal(df, expected)
+    # 数值列直接映射文件，不可写
+    assert not df["price"].to_numpy().flags.writeable
+
+
+def test_nulls_and_int_promotion(tmp_path):
+    path = str(tmp_path / "mixed.rcat")
+    chunks = [
+        pd.DataFrame({"id": [1, 2], "name": ["甲", None]}),
+        pd.DataFrame({"id": [np.nan, 4.0], "name": ["乙", ""]}),
+    ]
+    assert write_catalog(iter(chunks), path) == 4
+
+    df = load_catalog(path)
+    assert df["id"].dtype == np.float64
+    assert df["id"].isna().tolist() == [False, False, True, False]
+    assert df["name"].isna().tolist() == [False, True, False, False]
+    assert df["name"].tolist()[2:] == ["乙", ""]
+
+
+def test_sparse_columns_across_chunks(tmp_path):
+    # 第一块的文本列全为空（推断为float64），后面的块才出现字符串；整数列在后面的块中出现空值
+    csv_path = tmp_path / "sparse.csv"
+    csv_path.write_text("id,reviews,latitude\n1,,31\n2,,32\n3,好吃,\n4,,33.5\n", encoding="utf-8")
+    path = str(tmp_path / "sparse.rcat")
+    assert compile_csv(str(csv_path), path, chunksize=2) == 4
+
+    df = load_catalog(path)
+    assert df["reviews"].isna().tolist() == [True, True, False, True]
+    assert df["reviews"][2] == "好吃"
+    assert df["latitude"].dtype == np.float64
+    assert df["latitude"].isna().tolist() == [False, False, True, False]
+
+    chunks = [
+        pd.DataFrame({"id": [1], "image2": [np.nan]}),
+        pd.DataFrame({"id": [2], "image2": [None]}),
+        pd.DataFrame({"id": [3], "image2": ["b.jpg"]}),
+    ]
+    assert write_catalog(chunks, path) == 3
+    assert load_catalog(path)["image2"].tolist()[2] == "b.jpg"
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试餐厅数据的增量更新（写时复制索引、变更日志重放与合并）"""
+import asyncio
+
+import pandas as pd
+
+from catalog_index import CatalogIndex
+from recommendation import RecommendationEngine, RestaurantNotFoundError
+
+
+def _engine_with_tmp_files(tmp_path) -> RecommendationEngine:
+    engine = RecommendationEngine()
+    engine.data_path = str(tmp_path / "restaurants.csv")
+    engine.binary_path = str(tmp_path / "restaurants.rcat")
+    engine.changelog_path = str(tmp_path / "restaurants.changes.jsonl")
+    engine.df.to_csv(engine.data_path, index=False, encoding="utf-8-sig")
+    engine._catalog_signature = engine._source_signature()
+    return engine
+
+
+def test_upsert_and_delete(tmp_path):
+    engine = _engine_with_tmp_files(tmp_path)
+    old = engine.catalog
+    new_restaurant = {
+        "id": 999, "name": "新开烤串店", "cuisine": "烧烤", "price": 66, "rating": 4.9,
+        "delivery_time": 20, "description": "炭火烤串"
+    }
+    engine.apply_changes({"upsert": [{"id": 1, "price": 12}, new_restaurant], "delete": [2]})
+
+    assert engine.filter_restaurants(max_price=12)[0]["name"] == "川味小厨"
+    assert engine.filter_restaurants()[0]["name"] == "新开烤串店"
+    assert "烧烤" in engine.get_all_cuisines()
+    assert all(r["id"] != 2 for r in engine.filter_restaurants())
+    # 旧快照不受影响，未变化的列继续共享
+    assert old.index.query(max_price=12).size == 0
+    assert engine.index.columns["delivery_time"] is not old.index.columns["delivery_time"]
+
+    # 增量索引与完整重建一致
+    full = CatalogIndex(pd.DataFrame(engine.index.records))
+    assert (engine.index.rank_order == full.rank_order).all()
+    # 派生结构按需补建
+    assert engine.catalog.intent_matcher.scan("新开烤串店")[0] == [engine.catalog.row_by_id[999]]
+
+
+def test_invalid_upsert_rejected(tmp_path):
+    engine = _engine_with_tmp_files(tmp_path)
+    for batch in ({"upsert": [{"id": 1, "unknown": 1}]}, {"upsert": [{"id": 1000, "name": "缺字段"}]},
+                  {"upsert": [{"id": 1, "price": "贵"}]}):
+        try:
+            engine.apply_changes(batch)
+        except ValueError:
+            continue
+        raise AssertionError(batch)
+    assert engine.catalog_version == 1
+
+
+def test_delete_coerces_ids_and_rejects_unknown(tmp_path):
+    engine = _engine_with_tmp_files(tmp_path)
+    engine.apply_changes({"delete": ["5"]})
+    assert 5 not in engine.catalog.row_by_id
+    assert engine.catalog_version == 2
+
+    for batch in ({"delete": [5]}, {"delete": ["9999"]}, {"upsert": [{"id": 1, "price": 1}], "delete": [9999]}):
+        try:
+            engine.apply_changes(batch)
+        except RestaurantNotFoundError:
+            continue
+        raise AssertionError(batch)
+    # 空批次和失败的批次都不写日志、不更新版本
+    engine.apply_changes({"upsert": [], "delete": []})
+    assert engine.catalog_version == 2
+    assert len(open(engine.changelog_path, encoding="utf-8").readlines()) == 1
+    assert engine.filter_restaurants(max_price=1) == []
+
+
+def test_changelog_replay_and_compaction(tmp_path):
+    engine = _engine_with_tmp_files(tmp_path)
+    engine.compact_threshold = 2
+
+    async def run():
+        await engine.apply_changes_async({"upsert": [{"id": 1, "rating": 3.0}]})
+        await engine.apply_changes_async({"delete": [3]})
+        await engine._maintenance
+
+    asyncio.run(run())
+    expected = engine.filter_restaurants()
+    # 变更已合并进CSV，日志清空
+    assert open(engine.changelog_path, encoding="utf-8").read() == ""
+    assert engine.reload_catalog().index.size == len(expected)
+
+    engine.apply_changes({"upsert": [{"id": 4, "price": 1}]})
+    expected = engine.filter_restaurants()
+    # 重新加载时在CSV之上重放日志
+    engine.reload_catalog()
+    assert engine.filter_restaurants() == expected
+    assert engine.filter_restaurants(max_price=1)[0]["id"] == 4
+
+
+def test_workers_share_changelog_without_losing_changes(tmp_path):
+    # 两个引擎模拟多进程部署中共用数据文件和变更日志的两个worker
+    worker_b = _engine_with_tmp_files(tmp_path)
+    worker_a = _engine_with_tmp_files(tmp_path)
+    worker_b.apply_changes({"upsert": [{"id": 1, "name": "B改的店名"}]})
+    worker_a.apply_changes({"upsert": [{"id": 2, "name": "A改的店名"}]})
+    # A写入前已追上B的变更
+    assert worker_a.catalog.index.records[worker_a.catalog.row_by_id[1]]["name"] == "B改的店名"
+
+    worker_a.compact_changelog()
+    assert open(worker_a.changelog_path, encoding="utf-8").read() == ""
+    names = pd.read_csv(worker_a.data_path, encoding="utf-8-sig").set_index("id")["name"]
+    assert names[1] == "B改的店名" and names[2] == "A改的店名"
+
+    # B检测到A合并后的数据文件，重新加载后两处变更都在，继续写入不会重复应用
+    catalog = worker_b.sync_catalog()
+    assert [catalog.index.records[catalog.row_by_id[i]]["name"] for i in (1, 2)] == ["B改的店名", "A改的店名"]
+    worker_b.apply_changes({"delete": [3]})
+    assert 3 not in worker_a.sync_catalog().row_by_id
+    assert worker_a.catalog.index.size == worker_b.catalog.index.size
+
+
+def test_admin_restaurants_endpoint(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    engine = main.recommendation_engine
+    monkeypatch.setattr(engine, "changelog_path", str(tmp_path / "restaurants.changes.jsonl"))
+    headers = {"X-Admin-Token": "secret"}
+    with TestClient(main.app) as client:
+        response = client.post("/api/admin/restaurants", json={"upsert": [{"id": 5, "price": 2}]}, headers=headers)
+        assert response.status_code == 200
+        assert client.post("/api/recommend", json={"max_price": 2}).json()["data"][0]["id"] == 5
+
+        response = client.post("/api/admin/restaurants", json={"upsert": [{"id": 5, "bad": 1}]}, headers=headers)
+        assert response.status_code == 400
+        assert client.delete("/api/admin/restaurants/5", headers=headers).status_code == 200
+        assert client.delete("/api/admin/restaurants/5", headers=headers).status_code == 404
+        assert client.post("/api/recommend", json={"max_price": 2}).json()["data"] == []
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试豆包API推荐理由生成（使用本地模拟的豆包接口）"""
+import asyncio
+import json
+import time
+
+import httpx
+
+import http_client
+from doubao_api import DoubaoAPI
+
+RESTAURANTS = [
+    {"id": i, "name": f"餐厅{i}", "cuisine": "川菜", "price": 40, "rating": 4.5,
+     "delivery_time": 30, "description": "测试"}
+    for i in range(1, 6)
+]
+
+
+def _run_with_fake_doubao(monkeypatch, handler, coro_factory):
+    monkeypatch.setenv("DOUBAO_API_KEY", "test-key")
+    monkeypatch.setenv("DOUBAO_REASON_TIMEOUT", "0.3")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+
+    async def main():
+        http_client.init_http_client(httpx.MockTransport(handler))
+        try:
+            return await coro_factory(DoubaoAPI())
+        finally:
+            await http_client.close_http_client()
+
+    return asyncio.run(main())
+
+
+def test_reasons_are_generated_concurrently(monkeypatch):
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "好吃"}}]})
+
+    started = time.perf_counter()
+    result = _run_with_fake_doubao(
+        monkeypatch, handler, lambda api: api.generate_recommendations(RESTAURANTS)
+    )
+    elapsed = time.perf_counter() - started
+
+    assert [r["restaurant_id"] for r in result] == [1, 2, 3, 4, 5]
+    assert all(r["reason"] == "好吃" for r in result)
+    assert elapsed < 0.4
+
+
+def test_slow_or_failed_reasons_use_fallback(monkeypatch):
+    async def handler(request):
+        body = json.loads(request.content)["messages"][0]["content"]
+        if "餐厅2" in body:
+            await asyncio.sleep(1)
+        if "餐厅3" in body:
+            return httpx.Response(500)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "好吃"}}]})
+
+    result = _run_with_fake_doubao(
+        monkeypatch, handler,
+        lambda api: api.generate_recommendations(RESTAURANTS, fallback_reason=lambda r: "默认")
+    )
+
+    assert [r["reason"] for r in result] == ["好吃", "默认", "默认", "好吃", "好吃"]
+
+
+def test_batched_reasons_fall_back_for_missing_ids(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        content = '```json\n{"1": "好吃", "2": "", "4": 3, "5": "实惠"}\n```'
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20},
+        })
+
+    async def run(api):
+        result = await api.generate_recommendations_batched(RESTAURANTS, fallback_reason=lambda r: "默认")
+        return result, api.usage
+
+    result, usage = _run_with_fake_doubao(monkeypatch, handler, run)
+
+    assert len(calls) == 1
+    assert [r["reason"] for r in result] == ["好吃", "默认", "默认", "默认", "实惠"]
+    assert usage == {"calls": 1, "prompt_tokens": 100, "completion_tokens": 20}
+
+
+def test_stream_chat_emits_restaurant_before_done(monkeypatch):
+    from recommendation import RecommendationEngine
+
+    deltas = ["想吃烤", "肉的话推荐韩式", "烤肉（韩式）", "，肉质鲜嫩。"]
+    body = "".join(
+        "data: " + json.dumps({"choices": [{"delta": {"content": d}}]}, ensure_ascii=False) + "\n\n"
+        for d in deltas
+    ) + "data: [DONE]\n\n"
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=body.encode(), headers={"Content-Type": "text/event-stream"})
+
+    async def run(api):
+        engine = RecommendationEngine()
+        engine.doubao_api = api
+        return [
+            event async for event in engine.chat_recommend_stream(
+                "想吃烤肉", [], "北京市", engine.get_all_restaurants()
+            )
+        ]
+
+    events = _run_with_fake_doubao(monkeypatch, handler, run)
+    names = [name for name, _ in events]
+
+    assert names == ["delta", "delta", "delta", "restaurant", "delta", "done"]
+    assert events[3][1]["name"] == "韩式烤肉"
+    assert events[-1][1]["message"] == "".join(deltas)
+    assert events[-1][1]["restaurants"] == [events[3][1]]
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试IP定位缓存和离线IP库"""
+import asyncio
+
+import httpx
+
+import http_client
+from geolocation import DEFAULT_LOCATION, GeoIPDatabase, GeoLocator
+
+
+def test_offline_database_binary_search():
+    database = GeoIPDatabase([
+        ("1.0.0.0", "1.0.0.255", {"city": "上海", "region": "上海", "country": "中国"}),
+        ("8.8.8.0", "8.8.8.255", {"city": "Mountain View", "region": "California", "country": "United States"}),
+        ("2400:da00::", "2400:da00::ffff", {"city": "杭州", "region": "浙江", "country": "中国"}),
+    ])
+    assert database.lookup("1.0.0.7")["city"] == "上海"
+    assert database.lookup("8.8.8.8")["city"] == "Mountain View"
+    assert database.lookup("2400:da00::1")["city"] == "杭州"
+    assert database.lookup("1.0.1.0") is None
+    assert database.lookup("not-an-ip") is None
+
+
+def test_locator_caches_successes_and_failures():
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        if "9.9.9.9" in request.url.path:
+            return httpx.Response(429, json={"error": True, "reason": "RateLimited"})
+        return httpx.Response(200, json={
+            "city": "Shenzhen", "region": "Guangdong", "country_name": "China", "latitude": 22.54, "longitude": 114.06
+        })
+
+    async def run():
+        http_client.init_http_client(httpx.MockTransport(handler))
+        locator = GeoLocator()
+        try:
+            results = await asyncio.gather(*(locator.locate("4.4.4.4") for _ in range(3)))
+            results.append(await locator.locate("9.9.9.9"))
+            results.append(await locator.locate("9.9.9.9"))
+            results.append(await locator.locate("127.0.0.1"))
+        finally:
+            await http_client.close_http_client()
+        return results, locator.stats()
+
+    results, stats = asyncio.run(run())
+    assert requests == ["/4.4.4.4/json/", "/9.9.9.9/json/"]
+    assert [r["city"] for r in results[:3]] == ["Shenzhen"] * 3
+    assert results[0]["latitude"] == 22.54 and results[0]["longitude"] == 114.06
+    assert results[3] == results[4] == results[5] == DEFAULT_LOCATION
+    assert stats["hits"] == 1
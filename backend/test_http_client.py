@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试出站连接池统计"""
+import asyncio
+
+import httpcore
+import httpx
+
+import http_client
+
+
+def test_httpcore_version_matches_pool_internals():
+    # pool_stats 读取 httpcore 连接池的内部属性，升级 httpcore 后需重新验证再修改 HTTPCORE_VERSION
+    assert httpcore.__version__.split(".")[:2] == http_client.HTTPCORE_VERSION.split(".")
+
+    async def main():
+        http_client.init_http_client()
+        try:
+            return http_client.pool_stats()
+        finally:
+            await http_client.close_http_client()
+
+    stats = asyncio.run(main())
+    assert stats["connections"] == 0
+    assert stats["active"] == 0
+    assert stats["http2"] == 0
+    assert stats["queued_requests"] == 0
+
+
+def test_pool_stats_without_pool_internals():
+    async def main():
+        http_client.init_http_client(httpx.MockTransport(lambda request: httpx.Response(200)))
+        try:
+            await http_client.get_http_client().get("http://example.test/")
+            return http_client.pool_stats()
+        finally:
+            await http_client.close_http_client()
+
+    stats = asyncio.run(main())
+    assert stats["max_connections"] > 0
+    assert stats["connections"] is None
+    assert stats["active"] is None
+    assert stats["queued_requests"] is None
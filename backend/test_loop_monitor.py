@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试事件循环延迟监控和引擎线程池"""
+import asyncio
+import threading
+import time
+
+from loop_monitor import EventLoopLagMonitor
+from recommendation import RecommendationEngine
+
+
+def test_monitor_detects_blocking():
+    monitor = EventLoopLagMonitor(interval=0.01, warn_threshold=0.05)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.03)
+        time.sleep(0.1)  # 故意阻塞事件循环
+        await asyncio.sleep(0.03)
+        monitor.stop()
+
+    asyncio.run(run())
+    stats = monitor.stats()
+    assert stats["slow"] >= 1
+    assert stats["max_ms"] >= 80
+
+
+def test_slow_wakeups_are_logged_at_most_once_per_interval(capsys):
+    monitor = EventLoopLagMonitor(warn_threshold=0.05, log_interval=60)
+    for _ in range(100):
+        monitor.record(0.2)
+    assert capsys.readouterr().out.count("\n") == 1
+
+    # 下一条日志合并期间的次数和最大值
+    monitor.record(0.3)
+    monitor._last_log -= 60
+    monitor.record(0.1)
+    assert "101 次" in capsys.readouterr().out
+    assert monitor.stats()["slow"] == 102
+
+
+def test_engine_work_runs_off_event_loop():
+    engine = RecommendationEngine()
+    monitor = EventLoopLagMonitor(interval=0.01, warn_threshold=0.05)
+
+    def slow_filter():
+        time.sleep(0.1)
+        return threading.current_thread().name, engine.filter_restaurants(cuisine="川菜")
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.02)
+        result = await engine.run_in_executor(slow_filter)
+        rows = await engine.filter_restaurant_rows_async(cuisine="川菜")
+        monitor.stop()
+        return result, rows
+
+    (thread_name, restaurants), rows = asyncio.run(run())
+    engine.close()
+    assert thread_name.startswith("engine")
+    assert restaurants == engine.index.materialize(rows) == engine.filter_restaurants(cuisine="川菜")
+    assert monitor.stats()["slow"] == 0
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试多模式匹配自动机和聊天意图提取"""
+import random
+
+from matcher import AhoCorasick
+from recommendation import RecommendationEngine
+
+
+def test_aho_corasick_matches_naive_search():
+    rng = random.Random(0)
+    patterns = ["烤", "烤肉", "韩式烤肉", "肉", "拉面", "日式拉面屋", "面", "he", "she", "hers"]
+    automaton = AhoCorasick(patterns)
+    alphabet = "烤肉韩式拉面日屋hers "
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        expected = sorted(
+            (i, p) for p in patterns for i in range(len(text)) if text.startswith(p, i)
+        )
+        assert sorted(automaton.iter_matches(text)) == expected
+
+
+def test_intent_extraction():
+    engine = RecommendationEngine()
+
+    # 多个餐厅名时取数据中靠前的一家
+    message = "湘味轩和川味小厨都不错"
+    assert engine._extract_restaurants_from_message(message)[0]["name"] == "川味小厨"
+
+    # 烧烤 + 价格
+    assert engine._fallback_recommend("想吃烤肉，人均80左右")[0]["name"] == "韩式烤肉"
+
+    # 只提到菜品时按招牌菜推荐
+    assert engine._fallback_recommend("来份虾饺")[0]["name"] == "粤式茶餐厅"
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试耗时直方图、上游调用计数和 /metrics 接口"""
+import asyncio
+
+import httpx
+import pytest
+
+from metrics import UPSTREAM_REQUESTS, Registry, track_upstream
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", "示例", ("stage",), buckets=(0.1, 1.0))
+    counter = registry.counter("demo_total", "示例", ("status",))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "llm")
+    counter.inc('a"b')
+    registry.add_collector(lambda: [("demo_hits_total", "counter", "命中", [({"cache": "geo"}, 3), ({"cache": "llm"}, None)])])
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{stage="llm",le="0.1"} 2' in text
+    assert 'demo_seconds_bucket{stage="llm",le="1"} 3' in text
+    assert 'demo_seconds_bucket{stage="llm",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{stage="llm"} 4' in text
+    assert 'demo_total{status="a\\"b"} 1' in text
+    assert 'demo_hits_total{cache="geo"} 3' in text and 'cache="llm"' not in text
+
+
+def test_track_upstream_records_status_and_timeouts():
+    def handler(request):
+        if request.url.path == "/slow":
+            raise httpx.ReadTimeout("timeout", request=request)
+        return httpx.Response(503)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://upstream") as client:
+            with track_upstream("test") as call:
+                call["status"] = (await client.get("/ok")).status_code
+            with pytest.raises(httpx.TimeoutException):
+                with track_upstream("test"):
+                    await client.get("/slow")
+
+    asyncio.run(main())
+    assert UPSTREAM_REQUESTS.values[("test", "503")] == 1
+    assert UPSTREAM_REQUESTS.values[("test", "timeout")] == 1
+
+
+def test_metrics_endpoint_reports_request_stages():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        assert client.post("/api/recommend", json={"cuisine": "川菜", "limit": 2}).status_code == 200
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'food_http_request_duration_seconds_count{method="POST",route="/api/recommend",status="200"}' in text
+    assert 'food_stage_duration_seconds_count{endpoint="recommend",stage="filter"}' in text
+    assert 'food_cache_hits_total{cache="geo"}' in text
+    assert "food_catalog_restaurants " in text
+    assert 'food_event_loop_lag_seconds{stat="p99"}' in text
+    assert "quantile=" not in text
+    assert "food_http_pool_max_connections " in text
+    assert 'food_http_pool_connections{state="active"}' in text
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试聊天提示词的token预算和紧凑编码"""
+from prompt_builder import MIN_RESTAURANTS, PromptBuilder, encode_restaurant, estimate_tokens, truncate_tokens
+from recommendation import RecommendationEngine
+
+
+def _summary(count: int) -> str:
+    return "\n".join(
+        encode_restaurant(i + 1, {"name": f"餐厅{i}", "cuisine": "川菜", "price": 45.0, "rating": 4.5,
+                                  "delivery_time": 30, "description": "麻辣鲜香" * 10, "signature_dish": "水煮鱼"})
+        for i in range(count)
+    )
+
+
+def test_encode_and_estimate():
+    line = encode_restaurant(7, {"name": "川味|小厨", "cuisine": "川菜", "price": 45.0, "rating": 4.5,
+                                 "delivery_time": 30, "description": "正宗\n川菜" * 20})
+    assert line.startswith("7|川味/小厨|川菜|45|4.5|30|正宗 川菜")
+    assert "\n" not in line and line.endswith("…|")
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("川菜 abc") == 3
+    assert estimate_tokens(truncate_tokens("好吃" * 500, 50)) <= 50
+
+
+def test_build_fits_budget_and_keeps_order():
+    builder = PromptBuilder(budget=1200, history_budget=300, history_messages=10)
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条消息" + "想吃辣的" * 20} for i in range(40)]
+    messages, stats = builder.build("推荐一家川菜", history, "上海市", _summary(30))
+
+    assert stats["tokens"] <= 1200
+    assert sum(estimate_tokens(m["content"]) + 4 for m in messages) <= stats["tokens"] + 10
+    assert MIN_RESTAURANTS <= stats["restaurants"] < 30
+    assert stats["restaurants"] + stats["restaurants_dropped"] == 30
+    # 保留的是相关度最高的前几家和最近的几条历史
+    system = messages[0]["content"]
+    assert "1|餐厅0|" in system and f"{stats['restaurants'] + 1}|" not in system
+    assert 0 < stats["history_messages"] < 10 and stats["history_summarized"] == 40 - stats["history_messages"]
+    assert messages[-2]["content"].startswith("第39条消息")
+    assert "此前对话中用户提到" in system
+    assert messages[-1] == {"role": "user", "content": "推荐一家川菜"}
+    assert builder.stats()["requests"] == 1
+
+
+def test_small_prompt_is_unchanged_and_tiny_budget_keeps_minimum():
+    builder = PromptBuilder(budget=3000, history_budget=800, history_messages=10)
+    history = [{"role": "user", "content": "你好"}, {"role": "assistant", "content": "你好！"}, {"role": "tool"}]
+    messages, stats = builder.build("想吃面", history, "北京市", _summary(5))
+    assert stats["restaurants"] == 5 and stats["history_messages"] == 2
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+
+    _, stats = PromptBuilder(budget=10, history_budget=800).build("想吃面", history, "北京市", _summary(5))
+    assert stats["restaurants"] == MIN_RESTAURANTS and stats["history_messages"] == 0
+
+
+def test_engine_messages_use_compact_summary():
+    engine = RecommendationEngine()
+    summary = engine._get_restaurant_summary("想吃披萨", catalog=engine.catalog)
+    messages = engine._build_chat_messages("想吃披萨", [], "上海市", summary)
+    assert "披萨" in messages[0]["content"] and "招牌菜：" not in messages[0]["content"]
+    assert engine.prompt_builder.stats()["requests"] == 1
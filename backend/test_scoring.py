@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试综合打分和top-k选择"""
+import numpy as np
+import pytest
+
+from recommendation import RecommendationEngine
+from scoring import DEFAULT_WEIGHTS, parse_weights, score_rows, top_k
+
+
+def test_parse_weights():
+    assert parse_weights(None) == DEFAULT_WEIGHTS
+    assert parse_weights("price=0, rating=2")["rating"] == 2.0
+    with pytest.raises(ValueError):
+        parse_weights("unknown=1")
+
+
+def test_top_k_matches_full_sort():
+    rng = np.random.default_rng(3)
+    # 大量并列得分，检验第k名并列时的结果与整体排序一致
+    scores = rng.integers(0, 20, 500).astype(np.float64)
+    tiebreak = rng.permutation(500)
+    full = np.lexsort((tiebreak, -scores))
+    for k in [1, 5, 37, 499, 500, 800]:
+        assert top_k(scores, k, tiebreak).tolist() == full[:k].tolist()
+    assert top_k(scores, 0).tolist() == []
+
+
+def test_score_prefers_budget_and_fast_delivery():
+    columns = {
+        "rating": np.array([4.5, 4.5, 4.5]),
+        "price": np.array([30.0, 80.0, 30.0]),
+        "delivery_time": np.array([30.0, 30.0, 60.0]),
+    }
+    scores = score_rows(columns, np.arange(3), budget=35)
+    assert scores[0] > scores[1] and scores[0] > scores[2]
+
+
+def test_query_sort_score_with_limit():
+    engine = RecommendationEngine()
+    index = engine.index
+    full = index.query(max_price=60, sort="score")
+    assert len(full) == len(index.query(max_price=60))
+    assert index.query(max_price=60, sort="score", limit=5).tolist() == full[:5].tolist()
+    assert index.query(sort="rating", limit=3).tolist() == index.query()[:3].tolist()
+    assert index.query(keyword="辣", sort="relevance", limit=2).tolist() == index.query(keyword="辣", sort="relevance")[:2].tolist()
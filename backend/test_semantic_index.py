@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试聊天候选召回的向量索引"""
+import numpy as np
+
+from catalog_generator import CatalogGenerator
+from recommendation import RecommendationEngine
+from semantic_index import SemanticIndex
+
+
+def test_search_ranks_relevant_restaurants():
+    engine = RecommendationEngine()
+    records = engine.index.records
+    index = engine.index.semantic_index
+    assert index.matrix.dtype == np.float32 and index.matrix.flags["C_CONTIGUOUS"]
+
+    rows, scores = index.search("想吃披萨", 3)
+    assert all("披萨" in records[row]["name"] for row in rows[:2])
+    assert (np.diff(scores) <= 0).all()
+    assert len(index.search("", 5)[0]) == 0
+
+
+def test_summary_can_include_restaurants_past_first_thirty():
+    engine = RecommendationEngine()
+    last = engine.index.records[-1]
+    summary = engine._get_restaurant_summary(f"有没有{last['name']}", catalog=engine.catalog)
+    assert last["name"] in summary
+    assert summary.count("\n") < engine.chat_candidates
+
+
+def test_search_ignores_unknown_grams_and_keeps_rows_close_to_the_best():
+    index = RecommendationEngine().index.semantic_index
+    # 寒暄中的n-gram不在餐厅数据中，不会因为哈希冲突命中
+    for message in ("hello", "你好", "谢谢", "随便"):
+        assert len(index.search(message, 5)[0]) == 0
+
+    rows, _ = index.search("北京烤鸭", 30)
+    kept, scores = index.search("北京烤鸭", 30, min_ratio=0.5)
+    assert 0 < len(kept) < len(rows)
+    assert (scores >= 0.5 * scores[0]).all()
+
+
+def test_cuisine_and_price_intents_fill_the_prompt(tmp_path):
+    engine = RecommendationEngine()
+    engine.changelog_path = str(tmp_path / "restaurants.changes.jsonl")
+    engine.reload_catalog(CatalogGenerator(seed=3).chunk(1, 3000))
+
+    def columns(message, column):
+        lines = engine._get_restaurant_summary(message, catalog=engine.catalog).split("\n")
+        assert len(lines) == engine.chat_candidates
+        return [line.split("|")[column] for line in lines]
+
+    for message, cuisine in (("想吃川菜", "川菜"), ("推荐个火锅", "火锅"), ("我想吃点辣的", "川菜")):
+        cuisines = columns(message, 2)
+        assert cuisines.count(cuisine) >= len(cuisines) * 2 // 3, (message, cuisines)
+    assert all(30 <= float(price) <= 70 for price in columns("人均50左右", 3))
+
+
+def test_generic_messages_are_padded_to_chat_candidates():
+    engine = RecommendationEngine()
+    records = engine.index.records
+    default_first = records[engine.index.rank_order[0]]["name"]
+    for message in ("hello", "你好", "?", "谢谢"):
+        lines = engine._get_restaurant_summary(message, catalog=engine.catalog).split("\n")
+        assert len(lines) == engine.chat_candidates
+        # 没有可信的召回时按默认排序（评分最高的在前）
+        assert lines[0].split("|")[1] == default_first
+
+    # 有召回时相关的餐厅在前，其余补足
+    lines = engine._get_restaurant_summary("想吃披萨", catalog=engine.catalog).split("\n")
+    assert len(lines) == engine.chat_candidates and "披萨" in lines[0]
+    assert len({line.split("|")[1] for line in lines}) == len(lines)
+
+    # 烧烤意图先补含"烤"字的餐厅
+    lines = engine._get_restaurant_summary("想吃烧烤", catalog=engine.catalog).split("\n")
+    assert all("烤" in line for line in lines[:3])
+
+
+def test_patched_index_tracks_updates():
+    records = [
+        {"name": "川味小厨", "cuisine": "川菜", "description": "麻辣鲜香"},
+        {"name": "粤式茶餐厅", "cuisine": "粤菜", "description": "清淡早茶"},
+        {"name": "意式披萨", "cuisine": "西餐", "description": "芝士披萨"},
+    ]
+    index = SemanticIndex(records)
+    # 修改一行、删除一行、新增一行
+    updated = [dict(records[0], name="兰州拉面", cuisine="面食", description="牛肉拉面"), records[2],
+               {"name": "韩式烤肉", "cuisine": "韩式", "description": "烤肉拌饭"}]
+    patched = index.patched(updated, np.array([1]), np.array([0, 2]), True)
+    assert patched.size == 3
+    assert patched.search("拉面", 1)[0].tolist() == [0]
+    assert patched.search("烤肉", 1)[0].tolist() == [2]
+    assert patched.search("披萨", 1)[0].tolist() == [1]
+    assert "粤" not in "".join(updated[row]["name"] for row in patched.search("清淡早茶粤菜", 3)[0])
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试网格空间索引和按配送半径筛选餐厅"""
+import asyncio
+
+import numpy as np
+
+from recommendation import RecommendationEngine
+from spatial_index import GridIndex, haversine_km
+
+
+def test_grid_matches_brute_force():
+    rng = np.random.default_rng(5)
+    latitudes = rng.uniform(-89, 89, 3000)
+    longitudes = rng.uniform(-180, 180, 3000)
+    # 集中一批点在城市附近、极地和日期变更线两侧
+    latitudes[:500] = 31.23 + rng.normal(0, 0.05, 500)
+    longitudes[:500] = 121.47 + rng.normal(0, 0.05, 500)
+    latitudes[500:600], longitudes[500:600] = rng.uniform(89.5, 90, 100), rng.uniform(-180, 180, 100)
+    latitudes[600:700], longitudes[600:700] = rng.uniform(-1, 1, 100), rng.choice([-179.99, 179.99], 100)
+    latitudes[700] = np.nan
+    index = GridIndex(latitudes, longitudes)
+    assert index.size == 2999
+
+    for latitude, longitude, radius in [(31.23, 121.47, 5), (89.9, 0, 80), (0, 180, 50), (0, -179.9, 300), (10, 10, 0.5)]:
+        rows, distances = index.within(latitude, longitude, radius)
+        expected = np.flatnonzero(haversine_km(latitude, longitude, latitudes, longitudes) <= radius)
+        assert rows.tolist() == expected.tolist(), (latitude, longitude, radius)
+        assert (distances <= radius).all()
+
+
+def _geo_engine(tmp_path):
+    engine = RecommendationEngine()
+    engine.changelog_path = str(tmp_path / "restaurants.changes.jsonl")
+    df = engine.df.copy()
+    # 前一半餐厅在上海，后一半在北京，最后一家没有坐标
+    half = len(df) // 2
+    df["latitude"] = [31.23 + 0.001 * i for i in range(half)] + [39.90 + 0.001 * i for i in range(len(df) - half)]
+    df["longitude"] = [121.47] * half + [116.40] * (len(df) - half)
+    df.loc[df.index[-1], ["latitude", "longitude"]] = np.nan
+    engine.reload_catalog(df)
+    engine.delivery_radius_km = 5
+    engine.chat_candidates = 10
+    return engine, df, half
+
+
+def test_filter_and_chat_prefilter_by_radius(tmp_path):
+    engine, df, half = _geo_engine(tmp_path)
+    shanghai_ids = set(df["id"][:half])
+    nearby = engine.filter_restaurants(latitude=31.23, longitude=121.47, radius_km=10)
+    assert {r["id"] for r in nearby} == shanghai_ids
+    # 不给出位置时不按距离筛选
+    assert len(engine.filter_restaurants()) == len(df)
+
+    rows = engine._nearby_restaurants((31.24, 121.47), engine.catalog)
+    assert [engine.index.records[row]["id"] for row in rows] == list(df["id"][:half])
+
+    # 客户端没有给出坐标，或附近的餐厅不足 CHAT_CANDIDATES 家时使用全部餐厅
+    assert engine._nearby_restaurants(None, engine.catalog) is None
+    engine.chat_candidates = half + 1
+    assert engine._nearby_restaurants((31.24, 121.47), engine.catalog) is None
+
+
+def test_stream_chat_prefilters_without_rebuilding_indexes(tmp_path, monkeypatch):
+    import recommendation
+
+    engine, df, half = _geo_engine(tmp_path)
+    beijing = df.iloc[half]
+    shanghai = df.iloc[1]
+
+    class FakeDoubao:
+        async def stream_complete(self, messages, max_tokens, temperature=0.7):
+            # 先提到不在配送范围内的北京餐厅，再提到附近的上海餐厅
+            for delta in [f"{beijing['name']}很远，", "推荐", shanghai["name"], "。"]:
+                yield delta
+
+    def rebuilt(*args, **kwargs):
+        raise AssertionError("每次请求不应重建索引")
+
+    # 快照的派生结构已在加载时构建，请求路径上不应再构建任何索引
+    for name in ("CatalogIndex", "IntentMatcher", "_bbq_mask"):
+        monkeypatch.setattr(recommendation, name, rebuilt)
+    engine.doubao_api = FakeDoubao()
+
+    async def run():
+        return [event async for event in engine.chat_recommend_stream(
+            "有什么好吃的", [], {"city": "上海"}, coordinates=(31.24, 121.47)
+        )]
+
+    events = asyncio.run(run())
+    cards = [data for name, data in events if name == "restaurant"]
+    assert [card["name"] for card in cards] == [shanghai["name"]]
+    assert events[-1][1]["restaurants"] == cards
+    # 召回和备用推荐也只在附近的餐厅中进行
+    rows = engine._nearby_restaurants((31.24, 121.47), engine.catalog)
+    assert engine._fallback_recommend("想吃烤鸭", rows)[0]["id"] in set(df["id"][:half])
+    summary = engine._get_restaurant_summary("北京烤鸭", rows, engine.catalog)
+    assert beijing["name"] not in summary
+
+
+def test_coordinates_follow_incremental_updates(tmp_path):
+    engine, df, half = _geo_engine(tmp_path)
+    moved = int(df["id"].iloc[0])
+    engine.apply_changes({
+        "upsert": [
+            {"id": moved, "latitude": 39.91, "longitude": 116.41},
+            {"id": 9001, "name": "新店", "cuisine": "川菜", "price": 30, "rating": 4.0, "delivery_time": 20,
+             "description": "新开", "latitude": 31.25, "longitude": 121.48},
+        ],
+        "delete": [int(df["id"].iloc[1])],
+    })
+    nearby = {r["id"] for r in engine.filter_restaurants(latitude=31.23, longitude=121.47, radius_km=10)}
+    assert nearby == (set(df["id"][2:half]) | {9001})
+
+
+def test_recommend_uses_ip_location_only_when_asked(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    engine, df, half = _geo_engine(tmp_path)
+    located = []
+
+    async def fake_location(http_request, endpoint="chat"):
+        located.append(endpoint)
+        return {"city": "上海", "latitude": 31.24, "longitude": 121.47}
+
+    monkeypatch.setattr(main, "recommendation_engine", engine)
+    monkeypatch.setattr(main, "get_client_location", fake_location)
+    client = TestClient(main.app)
+
+    # 没有给出位置时不等待IP定位，也不按距离筛选
+    assert len(client.post("/api/recommend", json={}).json()["data"]) == len(df)
+    assert located == []
+    # 给出坐标时按 DELIVERY_RADIUS_KM 筛选
+    data = client.post("/api/recommend", json={"latitude": 39.9, "longitude": 116.4}).json()["data"]
+    assert {r["id"] for r in data} == set(df["id"][half:-1])
+    assert located == []
+    # 只指定半径时按IP定位
+    data = client.post("/api/recommend", json={"radius_km": 10}).json()["data"]
+    assert {r["id"] for r in data} == set(df["id"][:half])
+    assert located == ["recommend"]
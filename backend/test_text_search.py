@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试关键词倒排索引：AND/OR查询、BM25排序、增量更新后与重建结果一致"""
+import random
+
+import numpy as np
+
+from catalog_index import CatalogIndex
+from recommendation import RecommendationEngine
+from text_search import SEARCH_FIELDS, TextIndex, parse_query
+
+
+def _brute_force(records, query):
+    matched = set()
+    for terms in parse_query(query):
+        for row, record in enumerate(records):
+            text = " ".join(str(record.get(field) or "").lower() for field in SEARCH_FIELDS)
+            if all(term in text for term in terms):
+                matched.add(row)
+    return sorted(matched)
+
+
+def test_parse_query():
+    assert parse_query("川菜 辣") == [["川菜", "辣"]]
+    assert parse_query("拉面 | 寿司 OR Pizza") == [["拉面"], ["寿司"], ["pizza"]]
+    assert parse_query("  ") == []
+
+
+def test_search_matches_brute_force():
+    engine = RecommendationEngine()
+    records = engine.index.records
+    text_index = engine.index.text_index
+    for query in ["辣", "麻辣", "鲜香 配送", "拉面 | 寿司", "性价比高 | 不存在的词", "不存在的词"]:
+        rows, scores = text_index.search(query)
+        assert rows.tolist() == _brute_force(records, query), query
+        assert (scores > 0).all()
+
+
+def test_relevance_sort_prefers_name_matches():
+    records = [
+        {"name": "好吃的店", "description": "", "signature_dish": "", "reviews": "拉面不错"},
+        {"name": "拉面馆", "description": "手工拉面", "signature_dish": "牛肉拉面", "reviews": ""},
+        {"name": "小吃", "description": "", "signature_dish": "", "reviews": ""},
+    ]
+    rows, scores = TextIndex.from_records(records).search("拉面")
+    assert rows.tolist() == [0, 1]
+    assert scores[1] > scores[0]
+
+    engine = RecommendationEngine()
+    by_rating = engine.filter_restaurants(keyword="辣")
+    by_relevance = engine.filter_restaurants(keyword="辣", sort="relevance")
+    assert sorted(r["id"] for r in by_rating) == sorted(r["id"] for r in by_relevance)
+
+
+def test_patched_search_matches_rebuild():
+    engine = RecommendationEngine()
+    records = [dict(record) for record in engine.index.records]
+    index = CatalogIndex(engine.df)
+    rng = random.Random(7)
+    words = ["麻辣", "拉面", "寿司", "好吃", "清淡"]
+    for step in range(60):
+        new_records = [dict(record) for record in records]
+        removed = []
+        changed = []
+        action = rng.choice(["update", "update", "delete", "insert"])
+        if action == "update" or not new_records:
+            row = rng.randrange(len(new_records))
+            new_records[row]["description"] = rng.choice(words) + str(step)
+            changed = [row]
+        elif action == "delete":
+            row = rng.randrange(len(new_records))
+            del new_records[row]
+            removed = [row]
+        else:
+            new = dict(rng.choice(new_records), id=1000 + step, name=rng.choice(words) + "店")
+            new_records.append(new)
+            changed = [len(new_records) - 1]
+        index = index.patched(new_records, np.array(removed, dtype=np.int64), np.array(changed, dtype=np.int64))
+        records = new_records
+        for query in words + ["拉面 | 寿司", "好吃 麻辣"]:
+            assert index.text_index.search(query)[0].tolist() == _brute_force(records, query), (step, query)
+
+
+def test_recommend_endpoint_sort():
+    from fastapi.testclient import TestClient
+    import main
+
+    expected = main.recommendation_engine.filter_restaurants(keyword="麻辣 | 拉面", sort="relevance")
+    with TestClient(main.app) as client:
+        response = client.post("/api/recommend", json={
+            "keyword": "麻辣 | 拉面", "sort": "relevance", "fields": ["id"], "cursor": "1", "limit": 3
+        })
+        assert response.status_code == 200
+        assert response.json()["data"] == [{"id": r["id"]} for r in expected[1:4]]
+
+        scored = main.recommendation_engine.filter_restaurants(max_price=60, sort="score")
+        response = client.post("/api/recommend", json={"max_price": 60, "sort": "score", "fields": ["id"], "limit": 3})
+        assert response.json()["data"] == [{"id": r["id"]} for r in scored[:3]]
+
+        response = client.post("/api/recommend", json={"sort": "unknown"})
+        assert response.status_code == 400
@@ -0,0 +1,249 @@
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 参与关键词搜索的字段及其BM25权重（名称命中比评价命中更相关）
+SEARCH_FIELDS = {"name": 3.0, "signature_dish": 2.0, "description": 1.5, "reviews": 1.0}
+
+# 查询语法：空白分隔的词之间是AND，"|" 或 "OR" 分隔的组之间是OR
+_OR_PATTERN = re.compile(r"\s*(?:\||\bOR\b)\s*")
+
+# 基数排序每轮处理的位数
+_RADIX_BITS = 16
+
+# 增量更新未进入倒排表的行超过这个比例时整体重建
+REBUILD_RATIO = 0.05
+
+
+def lower_text(value) -> str:
+    """小写文本，空值视为空字符串"""
+    if value is None or value != value:
+        return ""
+    return str(value).lower()
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """解析查询为 OR 组列表，每组是需要同时出现的词"""
+    groups = []
+    for part in _OR_PATTERN.split(query.strip()):
+        terms = [term.lower() for term in part.split() if term]
+        if terms:
+            groups.append(list(dict.fromkeys(terms)))
+    return groups
+
+
+class TextIndex:
+    """名称、描述、招牌菜、评价的字符级倒排索引（单字 + 二元组），支持AND/OR查询和BM25打分
+
+    倒排表以CSR形式存放：排好序的键数组 + 每个键的行号区间，查询只读取相关词的倒排表。
+    增量更新时倒排表不变，通过行号映射和少量"未入表"行实现，未入表的行逐行检查。
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, texts: Dict[str, List[str]]):
+        self.texts = texts
+        self.size = len(next(iter(texts.values()))) if texts else 0
+        self.doc_lengths = self._doc_lengths(range(self.size))
+        self.avg_length = float(self.doc_lengths.mean()) if self.size else 0.0
+        # 倒排表中的行号 -> 当前行号（-1表示已删除或已修改）；None表示与当前行号一致
+        self.base_map: Optional[np.ndarray] = None
+        # 文本不在倒排表中的当前行（增量更新后修改或新增的行）
+        self.extra_rows = np.empty(0, dtype=np.int64)
+        self.charset, self.keys, self.offsets, self.postings = self._build_postings()
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "TextIndex":
+        return cls({field: [lower_text(record.get(field)) for record in records] for field in SEARCH_FIELDS})
+
+    def _doc_lengths(self, rows) -> np.ndarray:
+        rows = list(rows)
+        lengths = np.zeros(len(rows), dtype=np.float64)
+        for field, weight in SEARCH_FIELDS.items():
+            texts = self.texts[field]
+            lengths += weight * np.fromiter((len(texts[row]) for row in rows), dtype=np.float64, count=len(rows))
+        return lengths
+
+    def _build_postings(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """把全部文本拼接成一个码点数组，向量化生成 (词, 行号) 对后按词分组
+
+        字符先映射为稠密编号（字符集大小C），单字的键为编号，二元组的键为 C + 前字*C + 后字；
+        按键做LSD基数排序（每轮16位的稳定排序），行号在同一个键内保持升序。
+        """
+        # 每行各字段以 \0 分隔，跨字段、跨行的二元组会被过滤掉
+        docs = ["\0".join(self.texts[field][row] for field in SEARCH_FIELDS) + "\0" for row in range(self.size)]
+        codes = np.frombuffer("".join(docs).encode("utf-32-le"), dtype=np.uint32)
+        rows = np.repeat(np.arange(self.size, dtype=np.int32), [len(doc) for doc in docs])
+        present = np.zeros(0x110000, dtype=bool)
+        present[codes] = True
+        present[0] = False
+        charset = np.flatnonzero(present).astype(np.uint32)
+        width = len(charset)
+        # 键空间不超过int32时用32位整数，排序和拷贝的数据量减半
+        dtype = np.int32 if width + width * width < 2 ** 31 else np.int64
+        char_ids = (np.cumsum(present, dtype=dtype) - 1)[codes]
+        separator = codes == 0
+
+        valid = ~(separator[:-1] | separator[1:])
+        keys = np.concatenate([
+            char_ids[~separator],
+            (width + char_ids[:-1] * width + char_ids[1:])[valid],
+        ])
+        key_rows = np.concatenate([rows[~separator], rows[:-1][valid]])
+
+        order = None
+        bits = max(int(width + width * width).bit_length(), 1)
+        for shift in range(0, bits, _RADIX_BITS):
+            digits = ((keys if order is None else keys[order]) >> shift) & ((1 << _RADIX_BITS) - 1)
+            step = np.argsort(digits.astype(np.uint16), kind="stable")
+            order = step if order is None else order[step]
+        keys, key_rows = keys[order], key_rows[order]
+
+        # 同一行中重复出现的词只保留一次
+        distinct = np.ones(len(keys), dtype=bool)
+        distinct[1:] = (keys[1:] != keys[:-1]) | (key_rows[1:] != key_rows[:-1])
+        keys, key_rows = keys[distinct], key_rows[distinct]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else np.empty(0, dtype=np.int64)
+        offsets = np.append(starts, len(keys)).astype(np.int64)
+        return charset, keys[starts], offsets, key_rows
+
+    def _gram_keys(self, term: str) -> Optional[np.ndarray]:
+        """词对应的键（单字或各个二元组）；包含字符集以外的字时返回None"""
+        codes = np.array([ord(ch) for ch in term], dtype=np.uint32)
+        ids = np.searchsorted(self.charset, codes).astype(self.keys.dtype)
+        if (ids >= len(self.charset)).any() or (self.charset[np.minimum(ids, len(self.charset) - 1)] != codes).any():
+            return None
+        width = self.keys.dtype.type(len(self.charset))
+        if len(ids) == 1:
+            return ids
+        return np.unique(width + ids[:-1] * width + ids[1:])
+
+    def _posting(self, key) -> np.ndarray:
+        i = int(np.searchsorted(self.keys, key))
+        if i >= len(self.keys) or self.keys[i] != key:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def candidates(self, term: str) -> np.ndarray:
+        """可能包含该词的当前行号（升序）：倒排表求交集 + 未入表行逐行检查"""
+        keys = self._gram_keys(term) if term else None
+        if keys is None:
+            rows = np.empty(0, dtype=np.int64)
+        else:
+            # 从最短的倒排表开始求交集
+            postings = sorted((self._posting(key) for key in keys), key=len)
+            rows = postings[0]
+            for posting in postings[1:]:
+                if len(rows) == 0:
+                    break
+                rows = rows[np.isin(rows, posting, assume_unique=True)]
+            rows = rows.astype(np.int64)
+        if self.base_map is not None:
+            rows = self.base_map[rows]
+            rows = rows[rows >= 0]
+        if len(self.extra_rows) and term:
+            extra = [row for row in self.extra_rows if any(term in self.texts[field][row] for field in SEARCH_FIELDS)]
+            rows = np.concatenate([rows, np.asarray(extra, dtype=np.int64)])
+        return np.sort(rows)
+
+    def term_frequencies(self, term: str, rows: np.ndarray) -> np.ndarray:
+        """各行中该词的加权出现次数（二元组候选行在这里做最终的子串校验）"""
+        tf = np.zeros(len(rows), dtype=np.float64)
+        for field, weight in SEARCH_FIELDS.items():
+            texts = self.texts[field]
+            tf += weight * np.fromiter((texts[row].count(term) for row in rows), dtype=np.float64, count=len(rows))
+        return tf
+
+    def search(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (命中行号升序, BM25得分)；组内各词都要出现，组之间取并集、得分取最高"""
+        result_rows = np.empty(0, dtype=np.int64)
+        result_scores = np.empty(0, dtype=np.float64)
+        for terms in parse_query(query):
+            rows = None
+            for term in sorted(terms, key=len, reverse=True):
+                candidates = self.candidates(term)
+                rows = candidates if rows is None else rows[np.isin(rows, candidates, assume_unique=True)]
+                if len(rows) == 0:
+                    break
+            if rows is None or len(rows) == 0:
+                continue
+
+            scores = np.zeros(len(rows), dtype=np.float64)
+            keep = np.ones(len(rows), dtype=bool)
+            norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[rows] / (self.avg_length or 1.0))
+            for term in terms:
+                tf = self.term_frequencies(term, rows)
+                keep &= tf > 0
+                document_frequency = max(int(np.count_nonzero(tf)), 1)
+                idf = math.log(1 + (self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+                scores += idf * tf * (self.K1 + 1) / (tf + norm)
+            rows, scores = rows[keep], scores[keep]
+
+            # 与之前各组的结果合并，同一行取最高得分
+            merged_rows = np.concatenate([result_rows, rows])
+            merged_scores = np.concatenate([result_scores, scores])
+            order = np.lexsort((-merged_scores, merged_rows))
+            merged_rows, merged_scores = merged_rows[order], merged_scores[order]
+            first = np.ones(len(merged_rows), dtype=bool)
+            first[1:] = merged_rows[1:] != merged_rows[:-1]
+            result_rows, result_scores = merged_rows[first], merged_scores[first]
+        return result_rows, result_scores
+
+    def patched(self, records: List[Dict], removed: np.ndarray, changed: np.ndarray, structural: bool) -> "TextIndex":
+        """增量更新（参数同 CatalogIndex.patched）：倒排表共享，变化的行改为逐行检查"""
+        texts = {}
+        for field in SEARCH_FIELDS:
+            values = self.texts[field]
+            new_texts = [lower_text(records[row].get(field)) for row in changed]
+            if not structural and all(values[row] == text for row, text in zip(changed, new_texts)):
+                texts[field] = values
+                continue
+            values = list(values)
+            for row in sorted(removed, reverse=True):
+                del values[row]
+            values.extend([""] * (len(records) - len(values)))
+            for row, text in zip(changed, new_texts):
+                values[row] = text
+            texts[field] = values
+
+        if all(texts[field] is self.texts[field] for field in SEARCH_FIELDS):
+            return self
+
+        index = object.__new__(TextIndex)
+        index.texts = texts
+        index.size = len(records)
+        index.charset, index.keys, index.offsets, index.postings = self.charset, self.keys, self.offsets, self.postings
+
+        # 旧行号 -> 新行号（被删除或被修改的行为-1，它们不再使用倒排表中的旧文本）
+        remap = np.arange(self.size, dtype=np.int64)
+        if structural:
+            keep = np.ones(self.size, dtype=bool)
+            keep[removed] = False
+            remap = np.where(keep, np.cumsum(keep) - 1, -1)
+        stale = np.isin(remap, changed)
+        remap[stale] = -1
+        if self.base_map is None:
+            index.base_map = remap
+        else:
+            index.base_map = np.where(self.base_map >= 0, remap[np.maximum(self.base_map, 0)], -1)
+        # 之前未入表的行重新编号，已删除的行丢弃
+        extra = remap[self.extra_rows] if len(self.extra_rows) else self.extra_rows
+        index.extra_rows = np.union1d(extra[extra >= 0], changed).astype(np.int64)
+
+        doc_lengths = np.zeros(index.size, dtype=np.float64)
+        if structural:
+            kept_lengths = self.doc_lengths[keep]
+            doc_lengths[:len(kept_lengths)] = kept_lengths
+        else:
+            doc_lengths[:] = self.doc_lengths
+        doc_lengths[changed] = index._doc_lengths(changed)
+        index.doc_lengths = doc_lengths
+        index.avg_length = float(doc_lengths.mean()) if index.size else 0.0
+
+        # 未入表的行太多时，整体重建倒排表
+        if len(index.extra_rows) > max(1000, REBUILD_RATIO * index.size):
+            return TextIndex(texts)
+        return index